@@ -0,0 +1,243 @@
+"""
+Streaming anomaly detection on room telemetry
+Consumes sensors/+/telemetry and keeps a few numbers of online state per
+room, so thousands of rooms fit in one process:
+
+- current spike: z-score of `amps` against an exponentially weighted
+  mean/variance (EW Welford update)
+- temperature rise: °C/min measured over at least RATE_WINDOW_MS,
+  smoothed with an EWMA
+- idle load: fan or lamp left on while the room reads vacant for
+  IDLE_LOAD_MS
+
+Alerts are published to alerts/<room>/anomaly (the topics the hubs and
+dashboard already use), at most once per ALERT_COOLDOWN_MS per room and
+kind.
+
+    python anomaly_detector.py   (uses MQTT_* env vars)
+"""
+
+import json
+import logging
+import math
+import time
+from threading import Lock
+
+from batch_control import OCCUPIED_MAX_CM, OCCUPIED_MIN_CM
+from mqtt_publisher import mqtt_client_from_env
+from telemetry_ingest import TELEMETRY_TOPIC
+
+logger = logging.getLogger(__name__)
+
+ALERT_TOPIC = 'alerts/{room}/anomaly'
+
+AMPS_ALPHA = 0.05            # EW weight, roughly a 40-sample window
+AMPS_WARMUP = 30             # samples before a room's current is scored
+AMPS_Z = 4.0
+AMPS_MIN_DELTA = 0.25        # A; ignore "spikes" on a near-constant load
+RATE_WINDOW_MS = 60 * 1000
+RATE_ALPHA = 0.5
+RATE_MAX_GAP_MS = 10 * 60 * 1000
+TEMP_RISE_PER_MIN = 0.5      # °C/min
+IDLE_LOAD_MS = 10 * 60 * 1000
+ALERT_COOLDOWN_MS = 5 * 60 * 1000
+
+
+class RoomState:
+    """Online statistics for one room"""
+
+    __slots__ = ('samples', 'amps_mean', 'amps_var', 'ref_temp', 'ref_millis',
+                 'temp_rate', 'idle_since', 'alerted')
+
+    def __init__(self):
+        self.samples = 0
+        self.amps_mean = 0.0
+        self.amps_var = 0.0
+        self.ref_temp = None
+        self.ref_millis = 0
+        self.temp_rate = None
+        self.idle_since = None
+        self.alerted = None          # kind -> millis of the last alert
+
+
+def _number(data, key):
+    value = data.get(key)
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if math.isfinite(value) else None
+
+
+class AnomalyDetector:
+    """Per-room online detectors; `publish(topic, alert)` is called for each alert"""
+
+    def __init__(self, publish=None):
+        self.publish = publish
+        self.rooms = {}
+        self.processed = 0
+        self.rejected = 0
+        self.alerts = {}
+        self._lock = Lock()
+
+    def handle_message(self, topic, payload, millis=None):
+        """Parse a sensors/<room>/telemetry message; returns the alerts it raised"""
+        parts = topic.split('/')
+        if len(parts) != 3 or parts[0] != 'sensors' or parts[2] != 'telemetry':
+            self.rejected += 1
+            return []
+        try:
+            data = json.loads(payload)
+        except (ValueError, UnicodeDecodeError):
+            self.rejected += 1
+            return []
+        if not isinstance(data, dict):
+            self.rejected += 1
+            return []
+        if millis is None:
+            millis = int(time.time() * 1000)
+        return self.process(parts[1], data, millis)
+
+    def process(self, room, data, millis):
+        """
+        Update a room's state with one telemetry dict and return new alerts
+        Same signature as TelemetryIngestor listeners, so it can also run
+        inside the ingest worker.
+        """
+        with self._lock:
+            state = self.rooms.get(room)
+            if state is None:
+                state = self.rooms[room] = RoomState()
+            self.processed += 1
+            alerts = []
+            self._check_amps(room, state, data, millis, alerts)
+            self._check_temp(room, state, data, millis, alerts)
+            self._check_idle_load(room, state, data, millis, alerts)
+            for alert in alerts:
+                self.alerts[alert['type']] = self.alerts.get(alert['type'], 0) + 1
+
+        if self.publish is not None:
+            for alert in alerts:
+                try:
+                    self.publish(ALERT_TOPIC.format(room=room), alert)
+                except Exception as e:
+                    logger.error(f"Publishing {alert['type']} alert for {room} failed: {e}")
+        return alerts
+
+    def _alert(self, room, state, kind, millis, message, value, alerts, severity='warning'):
+        if state.alerted is None:
+            state.alerted = {}
+        last = state.alerted.get(kind)
+        if last is not None and millis - last < ALERT_COOLDOWN_MS:
+            return
+        state.alerted[kind] = millis
+        alerts.append({
+            'room': room,
+            'type': kind,
+            'severity': severity,
+            'message': message,
+            'value': round(value, 3),
+            'millisUTC': millis,
+            'source': 'anomaly_detector'
+        })
+
+    def _check_amps(self, room, state, data, millis, alerts):
+        amps = _number(data, 'amps')
+        if amps is None:
+            return
+        diff = amps - state.amps_mean
+        if state.samples >= AMPS_WARMUP and diff > AMPS_MIN_DELTA:
+            z = diff / math.sqrt(state.amps_var) if state.amps_var > 0 else math.inf
+            if z >= AMPS_Z:
+                self._alert(room, state, 'amps_spike', millis,
+                            f"Room {room}: current {amps:.2f} A is {min(z, 99):.1f}σ above "
+                            f"its {state.amps_mean:.2f} A average", amps, alerts)
+        if state.samples == 0:
+            state.amps_mean = amps
+        else:
+            incr = AMPS_ALPHA * diff
+            state.amps_mean += incr
+            state.amps_var = (1 - AMPS_ALPHA) * (state.amps_var + diff * incr)
+        state.samples += 1
+
+    def _check_temp(self, room, state, data, millis, alerts):
+        temp = _number(data, 'tC')
+        if temp is None:
+            return
+        elapsed = millis - state.ref_millis
+        if state.ref_temp is None or elapsed > RATE_MAX_GAP_MS or elapsed < 0:
+            state.ref_temp, state.ref_millis, state.temp_rate = temp, millis, None
+            return
+        if elapsed < RATE_WINDOW_MS:
+            return
+        rate = (temp - state.ref_temp) / (elapsed / 60000)
+        state.temp_rate = rate if state.temp_rate is None else \
+            state.temp_rate + RATE_ALPHA * (rate - state.temp_rate)
+        state.ref_temp, state.ref_millis = temp, millis
+        if state.temp_rate >= TEMP_RISE_PER_MIN:
+            self._alert(room, state, 'temp_rise', millis,
+                        f"Room {room}: temperature rising {state.temp_rate:.1f} °C/min (now {temp:.1f} °C)",
+                        state.temp_rate, alerts, severity='critical')
+
+    def _check_idle_load(self, room, state, data, millis, alerts):
+        loads = [name for name in ('fan', 'lamp') if data.get(name)]
+        dist = _number(data, 'dist')
+        occupied = bool(data.get('pir')) or (dist is not None and OCCUPIED_MIN_CM <= dist <= OCCUPIED_MAX_CM)
+        if not loads or occupied:
+            state.idle_since = None
+            return
+        if state.idle_since is None:
+            state.idle_since = millis
+            return
+        idle = millis - state.idle_since
+        if idle >= IDLE_LOAD_MS:
+            self._alert(room, state, 'idle_load', millis,
+                        f"Room {room}: {' and '.join(loads)} on with nobody present for {idle // 60000} min",
+                        idle / 60000, alerts)
+
+    def metrics(self):
+        """Counters and tracked room count"""
+        with self._lock:
+            return {
+                'rooms': len(self.rooms),
+                'processed': self.processed,
+                'rejected': self.rejected,
+                'alerts': dict(self.alerts)
+            }
+
+    def connect_mqtt(self, client, qos=1):
+        """Subscribe a paho-style client to telemetry and publish alerts with it"""
+        def on_connect(client, userdata, flags, reason_code, properties=None):
+            client.subscribe(TELEMETRY_TOPIC, qos=0)
+            logger.info(f"Anomaly detector subscribed to {TELEMETRY_TOPIC}")
+
+        def on_message(client, userdata, message):
+            self.handle_message(message.topic, message.payload)
+
+        def publish(topic, alert):
+            client.publish(topic, json.dumps(alert, separators=(',', ':')), qos=qos)
+
+        self.publish = publish
+        client.on_connect = on_connect
+        client.on_message = on_message
+        client.loop_start()
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    detector = AnomalyDetector()
+    client = mqtt_client_from_env('anomaly-detector')
+    detector.connect_mqtt(client)
+    try:
+        while True:
+            time.sleep(60)
+            logger.info(f"Anomaly detector: {detector.metrics()}")
+    except KeyboardInterrupt:
+        client.disconnect()
+        client.loop_stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""
+Backfill price history from the ComEd 5-minute feed
+Pulls ?type=5minutefeed over a date range in day-sized chunks, parses each
+response as a stream and bulk upserts the rows, so gaps after downtime are
+filled and re-imports don't create duplicates.
+
+    python backfill.py --start 2024-01-01 --end 2024-04-01 [--db comed_prices.db]
+"""
+
+import argparse
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+logger = logging.getLogger(__name__)
+
+# ComEd expects local (Central) time as YYYYMMDDhhmm
+DATE_FORMAT = '%Y%m%d%H%M'
+CHICAGO = ZoneInfo('America/Chicago')
+
+
+def iter_feed_rows(chunks):
+    """Yield objects from a JSON array given as an iterable of text chunks"""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    for chunk in chunks:
+        buffer += chunk
+        pos = 0
+        while True:
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n[,':
+                pos += 1
+            if pos >= len(buffer) or buffer[pos] == ']':
+                break
+            try:
+                obj, pos_end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                break   # Object continues in the next chunk
+            yield obj
+            pos = pos_end
+        buffer = buffer[pos:]
+
+
+def fetch_feed(fetcher, start, end):
+    """Stream (millisUTC, price) pairs from the 5-minute feed for [start, end)"""
+    response = fetcher.open_stream({
+        'type': '5minutefeed',
+        'datestart': start.strftime(DATE_FORMAT),
+        'dateend': end.strftime(DATE_FORMAT)
+    })
+    try:
+        if response.encoding is None:
+            response.encoding = 'utf-8'
+        for row in iter_feed_rows(response.iter_content(chunk_size=64 * 1024, decode_unicode=True)):
+            yield int(row['millisUTC']), float(row['price'])
+    finally:
+        response.close()
+
+
+def backfill(db, fetcher, start, end, tier_fn, chunk=timedelta(days=1)):
+    """
+    Import the 5-minute feed between two Central-time datetimes
+    Each chunk is written with one executemany transaction, so a long
+    import never holds the write lock for more than a day's worth of rows.
+    Returns the number of rows upserted.
+    """
+    total = 0
+    chunk_start = start
+    while chunk_start < end:
+        chunk_end = min(chunk_start + chunk, end)
+        rows = [
+            (datetime.fromtimestamp(millis / 1000.0).isoformat(), price, tier_fn(price), millis)
+            for millis, price in fetch_feed(fetcher, chunk_start, chunk_end)
+        ]
+        if rows:
+            total += db.insert_prices(rows)
+        logger.info(f"Backfilled {len(rows)} prices for {chunk_start:%Y-%m-%d %H:%M} - {chunk_end:%Y-%m-%d %H:%M}")
+        chunk_start = chunk_end
+    return total
+
+
+def fill_gap(db, fetcher, tier_fn, max_hours=168):
+    """Backfill from the newest stored price (at most max_hours ago) up to now"""
+    # Both bounds in Central time, whatever the server's zone
+    now = datetime.now(CHICAGO)
+    start = now - timedelta(hours=max_hours)
+    with db.pool.connection() as conn:
+        newest = conn.execute('SELECT MAX(millisUTC) FROM prices').fetchone()[0]
+    if newest:
+        start = max(start, datetime.fromtimestamp(newest / 1000.0, tz=CHICAGO))
+    if now - start < timedelta(minutes=10):
+        return 0
+    return backfill(db, fetcher, start, now, tier_fn)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import ComEd 5-minute price history')
+    parser.add_argument('--start', required=True, help='start date, YYYY-MM-DD (Central time)')
+    parser.add_argument('--end', help='end date, YYYY-MM-DD (default: now)')
+    parser.add_argument('--db', default=os.environ.get('PRICE_DB_PATH', 'comed_prices.db'))
+    parser.add_argument('--chunk-days', type=int, default=1)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    # Point the API module's database at the same file before importing it
+    os.environ['PRICE_DB_PATH'] = args.db
+    from comed_pricing_api import COMED_API_URL, db, determine_price_tier
+    from price_fetcher import ComEdFetcher
+
+    start = datetime.strptime(args.start, '%Y-%m-%d').replace(tzinfo=CHICAGO)
+    end = datetime.strptime(args.end, '%Y-%m-%d').replace(tzinfo=CHICAGO) if args.end else datetime.now(CHICAGO)
+    count = backfill(db, ComEdFetcher(COMED_API_URL), start, end, determine_price_tier,
+                     chunk=timedelta(days=args.chunk_days))
+    print(f"Imported {count} prices into {args.db}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""
+Vectorized eco-mode fan/lamp decisions for many rooms at once
+Applies the control hub's rules (esp32_control_hub.ino) to arrays of room
+telemetry so one gateway request per cycle can drive a whole building:
+
+- critical pricing: everything off
+- very high / high pricing: on only if occupied and above 28 / 26 °C
+- otherwise: on if occupied
+- high-or-worse pricing while the room draws more than SHED_WATTS: off
+- the lamp follows the fan, and rooms in manual mode are left alone
+"""
+
+import numpy as np
+
+TIERS = ['very_low', 'low', 'normal', 'high', 'very_high', 'critical']
+TIER_HIGH = TIERS.index('high')
+TIER_CRITICAL = TIERS.index('critical')
+
+# Tiers where the fan also needs a warm room (control hub thresholds)
+FAN_MIN_TEMP = {'high': 26.0, 'very_high': 28.0}
+_MIN_TEMP_BY_TIER = np.array([FAN_MIN_TEMP.get(t, np.nan) for t in TIERS])
+SHED_WATTS = 500
+
+# Ultrasonic distance counts as occupied within this range (cm)
+OCCUPIED_MIN_CM = 2
+OCCUPIED_MAX_CM = 10
+
+
+def _column(rooms, key, default=np.nan, alt=None):
+    values = []
+    for room in rooms:
+        value = room.get(key, room.get(alt) if alt else None)
+        values.append(default if value is None else value)
+    return np.array(values, dtype=float)
+
+
+def price_rules(tier_index, temp, power):
+    """
+    (warm_enough, shed, critical) boolean arrays; arguments broadcast, so
+    tier_index may be a scalar or a per-time-step column
+    """
+    min_temp = _MIN_TEMP_BY_TIER[tier_index]
+    warm_enough = np.isnan(min_temp) | (temp > min_temp)
+    shed = (tier_index >= TIER_HIGH) & (power > SHED_WATTS)
+    critical = np.broadcast_to(tier_index >= TIER_CRITICAL, np.shape(warm_enough))
+    return warm_enough, shed, critical
+
+
+def switch_on(tier_index, temp, occupied, power):
+    """Eco-mode fan (and lamp) state for broadcastable arrays of room readings"""
+    warm_enough, shed, critical = price_rules(tier_index, temp, power)
+    return occupied & warm_enough & ~shed & ~critical
+
+
+def decide(rooms, tier):
+    """
+    Decisions for a list of room telemetry dicts at the given price tier
+    Each room may carry tC, pir (or motion), dist, power (or amps and
+    voltage), ecoMode and its current fan/lamp state.
+    """
+    if not isinstance(rooms, list):
+        raise ValueError("'rooms' must be a list")
+    if not all(isinstance(room, dict) for room in rooms):
+        raise ValueError("Each room must be an object")
+    if tier not in TIERS:
+        tier = 'normal'
+    tier_index = TIERS.index(tier)
+
+    temp = _column(rooms, 'tC', alt='temp')
+    motion = _column(rooms, 'pir', 0, alt='motion') > 0
+    dist = _column(rooms, 'dist')
+    power = _column(rooms, 'power')
+    power = np.where(np.isnan(power), _column(rooms, 'amps') * _column(rooms, 'voltage'), power)
+    eco = _column(rooms, 'ecoMode', 1) > 0
+
+    occupied = motion | ((dist >= OCCUPIED_MIN_CM) & (dist <= OCCUPIED_MAX_CM))
+    warm_enough, shed, critical = price_rules(tier_index, temp, power)
+    on = eco & occupied & warm_enough & ~shed & ~critical
+
+    # First matching reason wins, in priority order
+    reason = np.select(
+        [~eco, critical, ~occupied, ~warm_enough, shed],
+        ['manual', 'critical', 'vacant', 'too_cool', 'shed_power'],
+        default='occupied'
+    )
+
+    fan_now = _column(rooms, 'fan', np.nan)
+    lamp_now = _column(rooms, 'lamp', np.nan)
+    changed = eco & ((fan_now != on) | (lamp_now != on))
+
+    return [
+        {
+            'room': room.get('room', i),
+            'fan': None if not eco[i] else bool(on[i]),
+            'lamp': None if not eco[i] else bool(on[i]),
+            'changed': bool(changed[i]),
+            'reason': str(reason[i])
+        }
+        for i, room in enumerate(rooms)
+    ]
@@ -5,13 +5,38 @@ Fetches real-time electricity prices and serves them via REST API
 
 import requests
 import json
-from flask import Flask, jsonify, request
+from flask import Flask, Response, g, jsonify, redirect, request
 from flask_cors import CORS
 from datetime import datetime, timedelta
+from functools import wraps
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 import logging
 import time
-from threading import Thread, Lock
-import sqlite3
+from threading import Thread
+import os
+
+import numpy as np
+
+from batch_control import decide
+from db_pool import ConnectionPool
+from history_encoding import lttb, to_columnar
+import price_archive
+from price_analytics import PriceAnalytics
+from price_forecast import PriceForecaster
+from price_rollup import RollingPriceStats
+from price_snapshot import INITIAL_STATE, PriceSnapshot
+from response_cache import ResponseCache
+from price_stream import PriceBroadcaster, StreamSlots
+from stream_server import StreamServer
+from mqtt_publisher import PricePublisher, mqtt_client_from_env
+from price_fetcher import NOT_MODIFIED, seconds_until_next_poll
+from price_providers import load_markets
+from price_scheduler import PollScheduler
+from leader_lock import LeaderLock
+from load_scheduler import ScheduleError, optimize
+from metrics import CONTENT_TYPE, InstrumentedLock, Registry, RequestProfiler
+from telemetry_ingest import TelemetryIngestor, TelemetryStore
+from tier_policy import PolicyStore
 
 app = Flask(__name__)
 CORS(app)
@@ -20,265 +45,919 @@ CORS(app)
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Global variables for price caching
-current_price_data = {
-    'price_cents_per_kwh': 0.0,
-    'timestamp': None,
-    'status': 'initializing',
-    'tier': 'unknown',
-    'recommendation': 'normal'
-}
-price_lock = Lock()
+# Prometheus-style metrics for this worker, served at /metrics
+metrics = Registry({'pid': os.getpid()})
+REQUEST_SECONDS = metrics.histogram(
+    'comed_api_request_seconds', 'HTTP request latency by route', ('method', 'route', 'status'))
+DB_SECONDS = metrics.histogram(
+    'comed_api_db_seconds', 'PriceDatabase method latency', ('method',))
+FETCH_SECONDS = metrics.histogram(
+    'comed_api_upstream_fetch_seconds', 'Provider price fetch latency, retries included', ('market', 'result'))
+LOCK_WAIT_SECONDS = metrics.histogram(
+    'comed_api_lock_wait_seconds', 'Time spent waiting for a contended lock', ('lock',),
+    buckets=(0.00001, 0.0001, 0.001, 0.01, 0.1, 1.0))
+LOOP_LAG_SECONDS = metrics.histogram(
+    'comed_api_loop_lag_seconds', 'How late background loops woke up', ('loop',),
+    buckets=(0.001, 0.01, 0.1, 0.5, 1.0, 5.0, 30.0))
+LOOP_LAST_RUN = metrics.gauge(
+    'comed_api_loop_last_run_timestamp_seconds', 'When each background loop last ran', ('loop',))
+
+# cProfile a PROFILE_SAMPLE_RATE fraction of requests and keep reports for
+# those slower than PROFILE_SLOW_MS (off by default)
+request_profiler = RequestProfiler(
+    sample_rate=float(os.environ.get('PROFILE_SAMPLE_RATE', 0)),
+    slow_seconds=float(os.environ.get('PROFILE_SLOW_MS', 500)) / 1000
+)
+
+# Each market's current price state is an immutable PriceSnapshot with
+# pre-serialized responses. Updates build a new snapshot and swap the
+# reference; readers never lock. price_lock only serializes writers (the
+# fetcher and the shared-state sync)
+price_lock = InstrumentedLock(LOCK_WAIT_SECONDS, 'price')
+
+# Seconds between price updates from ComEd
+UPDATE_INTERVAL = 300
+# Re-check a market a few times if a poll didn't bring the new interval
+# (published late, or the provider failed)
+RECHECK_DELAY = 15
+RECHECK_ATTEMPTS = 3
+
+# Serialized price endpoint responses, invalidated on every price update
+response_cache = ResponseCache()
+
+# Retained MQTT price messages for the hubs (enabled when MQTT_BROKER is set)
+price_publisher = PricePublisher.from_env()
+
+# Multi-worker mode: one process fetches prices, the rest poll the shared
+# state row every SYNC_INTERVAL seconds and retry the election
+fetcher_lock = LeaderLock(os.environ.get(
+    'FETCHER_LOCK_PATH',
+    os.environ.get('PRICE_DB_PATH', 'comed_prices.db') + '.fetcher.lock'
+))
+SYNC_INTERVAL = 2
+ELECTION_INTERVAL = 30
+
+# Room telemetry, written by telemetry_ingest.py or, with TELEMETRY_INGEST=1,
+# by an ingestor running in the elected fetcher process
+telemetry_store = TelemetryStore(os.environ.get('TELEMETRY_DB_PATH', 'telemetry.db'))
+telemetry_ingestor = None
 
 # ComEd 5-Minute Price API endpoint
-COMED_API_URL = "https://hourlypricing.comed.com/api"
-PRICE_ENDPOINT = f"{COMED_API_URL}?type=5minutefeed"
-CURRENT_PRICE_ENDPOINT = f"{COMED_API_URL}?type=currenthouraverage"
-
-# Price tier thresholds (cents per kWh)
-PRICE_TIERS = {
-    'very_low': 3.0,    # Below 3¢ - best time to use energy
-    'low': 5.0,         # 3-5¢ - good time
-    'normal': 8.0,      # 5-8¢ - normal usage
-    'high': 12.0,       # 8-12¢ - reduce usage
-    'very_high': 15.0   # Above 15¢ - critical, minimize usage
-}
+COMED_API_URL = os.environ.get('COMED_API_URL', "https://hourlypricing.comed.com/api")
+
+# Price markets and their providers (see price_providers.py): just ComEd
+# unless PRICE_MARKETS_PATH points at a markets config
+DEFAULT_MARKET, providers = load_markets(os.environ.get('PRICE_MARKETS_PATH'), COMED_API_URL)
+
+# Price tier thresholds and recommendations per building/room group,
+# re-read when the file changes
+tier_policies = PolicyStore(os.environ.get(
+    'TIER_POLICY_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tier_policy.json')
+))
+
+def now_millis():
+    """Current time as milliseconds since the epoch (UTC)"""
+    return int(time.time() * 1000)
+
+def millis_ago(hours):
+    """Epoch milliseconds for N hours before now"""
+    return now_millis() - int(hours * 3600 * 1000)
 
 class PriceDatabase:
     """SQLite database for price history"""
     
-    def __init__(self, db_path='comed_prices.db'):
+    def __init__(self, db_path='comed_prices.db', pool_size=8, pragmas=None, archive_dir=None):
         self.db_path = db_path
+        self.archive_dir = archive_dir or price_archive.default_archive_dir(db_path)
+        self.pool = ConnectionPool(db_path, max_size=pool_size, pragmas=pragmas)
+        self.rollup = RollingPriceStats(max_hours=168)
+        self.forecaster = PriceForecaster()
+        self.forecaster.stale = True  # Fitted on first use
         self.init_db()
+        self.load_rollup()
+    
+    # Schema migrations, applied in order and tracked with PRAGMA user_version.
+    # Each entry is a list of statements run in a single transaction.
+    MIGRATIONS = [
+        # 1: backfill epoch times for rows that only have an ISO timestamp
+        #    (stored as local time) and index them for range queries
+        [
+            '''
+            UPDATE prices
+            SET millisUTC = CAST(strftime('%s', timestamp, 'utc') AS INTEGER) * 1000
+            WHERE millisUTC IS NULL OR millisUTC = 0
+            ''',
+            'CREATE INDEX IF NOT EXISTS idx_prices_millis ON prices(millisUTC)'
+        ],
+        # 2: one row per millisUTC so restarts and backfills can upsert;
+        #    keeps the most recently written duplicate
+        [
+            '''
+            DELETE FROM prices
+            WHERE millisUTC IS NOT NULL AND id NOT IN (
+                SELECT MAX(id) FROM prices WHERE millisUTC IS NOT NULL GROUP BY millisUTC
+            )
+            ''',
+            'DROP INDEX IF EXISTS idx_prices_millis',
+            'CREATE UNIQUE INDEX idx_prices_millis ON prices(millisUTC)'
+        ],
+        # 3: current price state, written by the elected fetcher process and
+        #    read by the other workers
+        [
+            '''
+            CREATE TABLE IF NOT EXISTS price_state (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                version INTEGER NOT NULL,
+                data TEXT NOT NULL
+            )
+            '''
+        ],
+        # 4: hourly/daily aggregates of prices compacted out of the live
+        #    table (see price_archive.py); sums so late rows can merge in
+        [
+            f'''
+            CREATE TABLE IF NOT EXISTS {table} (
+                bucket_millis INTEGER PRIMARY KEY,
+                samples INTEGER NOT NULL,
+                sum_price REAL NOT NULL,
+                min_price REAL NOT NULL,
+                max_price REAL NOT NULL
+            ) WITHOUT ROWID
+            '''
+            for table in ('prices_hourly', 'prices_daily')
+        ]
+    ]
+    
+    UPSERT_SQL = '''
+        INSERT INTO prices (timestamp, price_cents_per_kwh, tier, millisUTC)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT(millisUTC) DO UPDATE SET
+            timestamp = excluded.timestamp,
+            price_cents_per_kwh = excluded.price_cents_per_kwh,
+            tier = excluded.tier
+    '''
     
     def init_db(self):
         """Initialize database schema"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS prices (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp TEXT NOT NULL,
-                price_cents_per_kwh REAL NOT NULL,
-                tier TEXT,
-                millisUTC INTEGER
-            )
-        ''')
-        conn.commit()
-        conn.close()
+        with self.pool.transaction() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS prices (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    timestamp TEXT NOT NULL,
+                    price_cents_per_kwh REAL NOT NULL,
+                    tier TEXT,
+                    millisUTC INTEGER
+                )
+            ''')
+        self.migrate()
     
+    def migrate(self):
+        """Apply pending schema migrations, returns the resulting version"""
+        with self.pool.connection() as conn:
+            version = conn.execute('PRAGMA user_version').fetchone()[0]
+            for target, statements in enumerate(self.MIGRATIONS[version:], start=version + 1):
+                try:
+                    for sql in statements:
+                        conn.execute(sql)
+                    conn.execute(f'PRAGMA user_version = {target}')
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+                logger.info(f"Migrated price database to schema v{target}")
+                version = target
+        return version
+    
+    @DB_SECONDS.time('insert_price')
     def insert_price(self, timestamp, price, tier, millis_utc):
-        """Insert price record"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO prices (timestamp, price_cents_per_kwh, tier, millisUTC)
-            VALUES (?, ?, ?, ?)
-        ''', (timestamp, price, tier, millis_utc))
-        conn.commit()
-        conn.close()
+        """Insert price record, replacing any existing row for millis_utc"""
+        with self.pool.transaction() as conn:
+            conn.execute(self.UPSERT_SQL, (timestamp, price, tier, millis_utc))
+        self.rollup.add(millis_utc, price)
+        self.forecaster.update(millis_utc, price)
+    
+    @DB_SECONDS.time('insert_prices')
+    def insert_prices(self, rows):
+        """Bulk upsert (timestamp, price, tier, millisUTC) rows in one transaction"""
+        with self.pool.transaction() as conn:
+            count = conn.executemany(self.UPSERT_SQL, rows).rowcount
+        # Bulk rows can land anywhere in the rolling window
+        self.rollup.stale = True
+        self.forecaster.stale = True
+        return count
+    
+    @DB_SECONDS.time('save_price_state')
+    def save_price_state(self, state_json):
+        """Store the serialized current price state, returns its new version"""
+        with self.pool.transaction() as conn:
+            conn.execute('''
+                INSERT INTO price_state (id, version, data) VALUES (1, 1, ?)
+                ON CONFLICT(id) DO UPDATE SET version = version + 1, data = excluded.data
+            ''', (state_json,))
+            return conn.execute('SELECT version FROM price_state WHERE id = 1').fetchone()[0]
+    
+    @DB_SECONDS.time('load_price_state')
+    def load_price_state(self, since_version=0):
+        """(version, state dict) if the stored state is newer than since_version, else None"""
+        with self.pool.connection() as conn:
+            row = conn.execute(
+                'SELECT version, data FROM price_state WHERE id = 1 AND version > ?',
+                (since_version,)
+            ).fetchone()
+        if row is None:
+            return None
+        return row[0], json.loads(row[1])
+    
+    @DB_SECONDS.time('load_rollup')
+    def load_rollup(self):
+        """Rebuild the in-memory rolling stats from the last week of rows"""
+        with self.pool.connection() as conn:
+            rows = conn.execute('''
+                SELECT millisUTC, price_cents_per_kwh
+                FROM prices
+                WHERE millisUTC > ?
+                ORDER BY millisUTC
+            ''', (millis_ago(self.rollup.max_hours),)).fetchall()
+        self.rollup.reset(rows)
+    
+    FORECAST_HISTORY_DAYS = 56
+    
+    @DB_SECONDS.time('load_forecaster')
+    def load_forecaster(self):
+        """Refit the forecast model on the last FORECAST_HISTORY_DAYS of prices"""
+        with self.pool.connection() as conn:
+            rows = conn.execute('''
+                SELECT millisUTC, price_cents_per_kwh
+                FROM prices
+                WHERE millisUTC > ?
+                ORDER BY millisUTC
+            ''', (millis_ago(self.FORECAST_HISTORY_DAYS * 24),)).fetchall()
+        self.forecaster.fit([r[0] for r in rows], [r[1] for r in rows])
     
     def get_recent_prices(self, hours=24):
         """Get price history for last N hours"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT timestamp, price_cents_per_kwh, tier, millisUTC
-            FROM prices
-            WHERE timestamp > datetime('now', '-' || ? || ' hours')
-            ORDER BY timestamp DESC
-        ''', (hours,))
-        results = cursor.fetchall()
-        conn.close()
-        return results
+        return self.get_prices_between(millis_ago(hours))
+    
+    @DB_SECONDS.time('get_prices_between')
+    def get_prices_between(self, start_millis, end_millis=None):
+        """Get prices with start_millis < millisUTC <= end_millis, newest first"""
+        if end_millis is None:
+            end_millis = now_millis()
+        with self.pool.connection() as conn:
+            return conn.execute('''
+                SELECT timestamp, price_cents_per_kwh, tier, millisUTC
+                FROM prices
+                WHERE millisUTC > ? AND millisUTC <= ?
+                ORDER BY millisUTC DESC
+            ''', (start_millis, end_millis)).fetchall()
     
+    @DB_SECONDS.time('get_price_stats')
     def get_price_stats(self, hours=24):
         """Get statistical summary of recent prices"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT 
-                AVG(price_cents_per_kwh) as avg_price,
-                MIN(price_cents_per_kwh) as min_price,
-                MAX(price_cents_per_kwh) as max_price,
-                COUNT(*) as sample_count
-            FROM prices
-            WHERE timestamp > datetime('now', '-' || ? || ' hours')
-        ''', (hours,))
-        result = cursor.fetchone()
-        conn.close()
+        if self.rollup.supports(hours):
+            if self.rollup.stale:
+                self.load_rollup()
+            return self.rollup.stats(hours)
+        return self.query_price_stats(hours)
+    
+    @DB_SECONDS.time('query_price_stats')
+    def query_price_stats(self, hours=24):
+        """Compute price stats with an aggregate query over the prices table"""
+        with self.pool.connection() as conn:
+            result = conn.execute('''
+                SELECT 
+                    AVG(price_cents_per_kwh) as avg_price,
+                    MIN(price_cents_per_kwh) as min_price,
+                    MAX(price_cents_per_kwh) as max_price,
+                    COUNT(*) as sample_count
+                FROM prices
+                WHERE millisUTC > ?
+            ''', (millis_ago(hours),)).fetchone()
         return {
             'avg_price': result[0] if result[0] else 0,
             'min_price': result[1] if result[1] else 0,
             'max_price': result[2] if result[2] else 0,
             'sample_count': result[3]
         }
+    
+    @DB_SECONDS.time('get_price_aggregates')
+    def get_price_aggregates(self, resolution, start_millis, end_millis):
+        """
+        (bucket millis, samples, avg, min, max) per UTC hour or day in
+        [start, end), from the aggregate tables for compacted history and
+        the live table for the rest. Live rows in an already compacted
+        bucket are re-imports waiting for the next compaction to fold them
+        in, so they're left out rather than counted twice.
+        """
+        table, bucket_ms = price_archive.AGGREGATES[resolution]
+        with self.pool.connection() as conn:
+            rows = conn.execute(f'''
+                SELECT bucket_millis, samples, sum_price / samples, min_price, max_price
+                FROM {table}
+                WHERE bucket_millis >= ? AND bucket_millis < ?
+                UNION ALL
+                SELECT * FROM (
+                    SELECT (millisUTC / {bucket_ms}) * {bucket_ms} AS bucket, COUNT(*),
+                           AVG(price_cents_per_kwh), MIN(price_cents_per_kwh), MAX(price_cents_per_kwh)
+                    FROM prices
+                    WHERE millisUTC >= ? AND millisUTC < ?
+                    GROUP BY 1
+                ) live
+                WHERE NOT EXISTS (SELECT 1 FROM {table} WHERE bucket_millis = live.bucket)
+                ORDER BY 1
+            ''', (start_millis, end_millis, start_millis, end_millis)).fetchall()
+        return rows
+    
+    @DB_SECONDS.time('get_price_columns')
+    def get_price_columns(self, start_millis, end_millis):
+        """(millis, prices) arrays with start <= millisUTC < end, oldest first"""
+        with self.pool.connection() as conn:
+            rows = conn.execute('''
+                SELECT millisUTC, price_cents_per_kwh FROM prices
+                WHERE millisUTC >= ? AND millisUTC < ?
+                ORDER BY millisUTC
+            ''', (start_millis, end_millis)).fetchall()
+        return np.array([r[0] for r in rows], dtype=np.int64), np.array([r[1] for r in rows], dtype=float)
+    
+    def get_price_range_version(self, start_millis, end_millis):
+        """(row count, newest millisUTC) in [start, end), answered from the index alone"""
+        with self.pool.connection() as conn:
+            return conn.execute('''
+                SELECT COUNT(*), MAX(millisUTC) FROM prices
+                WHERE millisUTC >= ? AND millisUTC < ?
+            ''', (start_millis, end_millis)).fetchone()
+    
+    @DB_SECONDS.time('compact')
+    def compact(self, retention_days, full_vacuum=False, now=None):
+        """Archive prices older than retention_days and reclaim the freed pages"""
+        # The forecaster and rolling stats read from the live table
+        retention_days = max(retention_days, self.FORECAST_HISTORY_DAYS, self.rollup.max_hours // 24)
+        archived = price_archive.compact(self.pool, self.archive_dir, retention_days,
+                                         now if now is not None else now_millis())
+        pages_freed = price_archive.vacuum(self.pool, full=full_vacuum)
+        return {
+            'archived': archived,
+            'pages_freed': pages_freed,
+            'retention_days': retention_days,
+            'archive_dir': self.archive_dir
+        }
+    
+    def close(self):
+        """Close pooled connections"""
+        self.pool.close()
+
+class Market:
+    """A price market: its provider, history database and current snapshot"""
+    
+    def __init__(self, provider, db):
+        self.id = provider.market
+        self.provider = provider
+        self.db = db
+        # Memoized long-range analytics over the archive plus live rows
+        self.analytics = PriceAnalytics(db)
+        # Pushes each new compact price payload to SSE / long-poll subscribers
+        self.stream = PriceBroadcaster()
+        self.snapshot = PriceSnapshot(INITIAL_STATE)
+        # group -> (snapshot, policy, reclassified snapshot), see group_snapshot
+        self.group_snapshots = {}
+        self.state_version = 0
+        self.backfilled = False
+
+def market_db_path(market):
+    """PRICE_DB_PATH for the default market, <name>-<market>.db next to it for the others"""
+    path = os.environ.get('PRICE_DB_PATH', 'comed_prices.db')
+    if market == DEFAULT_MARKET or path == ':memory:':
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}-{market}{ext or '.db'}"
+
+def market_archive_dir(market):
+    """PRICE_ARCHIVE_DIR (or the database's default) for the default market, a subdirectory for the others"""
+    base = os.environ.get('PRICE_ARCHIVE_DIR')
+    if market == DEFAULT_MARKET:
+        return base
+    return os.path.join(base or price_archive.default_archive_dir(market_db_path(DEFAULT_MARKET)), market)
+
+def add_market(provider):
+    """Open a market's history database and serve it (call before polling starts)"""
+    market = Market(provider, PriceDatabase(
+        market_db_path(provider.market),
+        pool_size=int(os.environ.get('PRICE_DB_POOL_SIZE', 8)),
+        archive_dir=market_archive_dir(provider.market)
+    ))
+    markets[market.id] = market
+    return market
+
+# Initialize one database per market
+markets = {}
+for provider in providers.values():
+    add_market(provider)
+
+# The default market's history, analytics and stream (what the CLIs and
+# requests without ?market= use)
+db = markets[DEFAULT_MARKET].db
+price_analytics = markets[DEFAULT_MARKET].analytics
+price_stream = markets[DEFAULT_MARKET].stream
 
-# Initialize database
-db = PriceDatabase()
+# With PRICE_STREAM_PORT set (gunicorn.conf.py does) each worker runs the
+# evented stream_server.py there and /api/price/stream redirects to it;
+# PRICE_STREAM_URL overrides the redirect base behind a proxy
+stream_server = None
+PRICE_STREAM_URL = os.environ.get('PRICE_STREAM_URL')
 
-def determine_price_tier(price_cents):
+# Streams served by Flask itself (the dev server) hold a worker thread
+# each; past this many per worker they are turned away with 503
+stream_slots = StreamSlots(int(os.environ.get('MAX_PRICE_STREAMS', 12)))
+STREAM_RETRY_AFTER = 30
+
+# Live price rows are kept this many days, older ones are archived
+# (see price_archive.py) by the fetcher process every COMPACTION_INTERVAL s
+PRICE_RETENTION_DAYS = int(os.environ.get('PRICE_RETENTION_DAYS', 90))
+COMPACTION_INTERVAL = 6 * 3600
+
+def determine_price_tier(price_cents, group=None):
     """Determine price tier based on current price"""
-    if price_cents < PRICE_TIERS['very_low']:
-        return 'very_low'
-    elif price_cents < PRICE_TIERS['low']:
-        return 'low'
-    elif price_cents < PRICE_TIERS['normal']:
-        return 'normal'
-    elif price_cents < PRICE_TIERS['high']:
-        return 'high'
-    elif price_cents < PRICE_TIERS['very_high']:
-        return 'very_high'
-    else:
-        return 'critical'
+    return tier_policies.policy(group).classify(price_cents)
 
-def get_recommendation(tier, stats):
+def get_recommendation(tier, stats, group=None, price=None):
     """Generate energy usage recommendation based on price tier"""
-    recommendations = {
-        'very_low': {
-            'action': 'maximize',
-            'message': 'Excellent time to run high-energy appliances',
-            'control_mode': 'aggressive_cooling',
-            'suggested_temp_offset': -2  # Can cool more
-        },
-        'low': {
-            'action': 'normal_plus',
-            'message': 'Good time for normal to high energy use',
-            'control_mode': 'normal',
-            'suggested_temp_offset': -1
-        },
-        'normal': {
-            'action': 'normal',
-            'message': 'Standard energy pricing',
-            'control_mode': 'normal',
-            'suggested_temp_offset': 0
-        },
-        'high': {
-            'action': 'reduce',
-            'message': 'Reduce non-essential energy use',
-            'control_mode': 'eco',
-            'suggested_temp_offset': 1
-        },
-        'very_high': {
-            'action': 'minimize',
-            'message': 'Minimize energy consumption',
-            'control_mode': 'aggressive_eco',
-            'suggested_temp_offset': 2
-        },
-        'critical': {
-            'action': 'critical',
-            'message': 'CRITICAL: Extreme pricing - disable non-essential loads',
-            'control_mode': 'emergency',
-            'suggested_temp_offset': 3
-        }
-    }
-    
-    rec = recommendations.get(tier, recommendations['normal'])
-    
+    # Copy, the policy's recommendations are shared and read-only
+    rec = dict(tier_policies.policy(group).recommendation(tier))
     
     if stats and stats['sample_count'] > 0:
-        rec['vs_24h_avg'] = current_price_data['price_cents_per_kwh'] - stats['avg_price']
+        if price is None:
+            price = current_snapshot().data['price_cents_per_kwh']
+        rec['vs_24h_avg'] = price - stats['avg_price']
     
     return rec
 
-def fetch_comed_price():
-    """Fetch current price from ComEd API"""
+def classify_snapshot(snapshot, policy):
+    """`snapshot` with its tier and recommendation re-derived from `policy` (same object if unchanged)"""
+    data = snapshot.data
+    if data.get('millisUTC') is None:
+        return snapshot   # No price yet
+    tier = policy.classify(data['price_cents_per_kwh'])
+    rec = dict(policy.recommendation(tier))
+    if isinstance(data['recommendation'], dict) and 'vs_24h_avg' in data['recommendation']:
+        rec['vs_24h_avg'] = data['recommendation']['vs_24h_avg']
+    if tier == data['tier'] and rec == data['recommendation']:
+        return snapshot
+    return snapshot.replace(tier=tier, recommendation=rec)
+
+def group_snapshot(market, group=None):
+    """
+    A market's snapshot as a tier group sees it (?group=); unknown groups
+    get the default policy. Reclassified snapshots are kept until the
+    market's snapshot or the group's policy changes.
+    """
+    snapshot = market.snapshot
+    if group is None:
+        return snapshot
+    policy = tier_policies.policy(group)
+    if policy is tier_policies.policy(market.provider.tier_group):
+        return snapshot
+    cached = market.group_snapshots.get(group)
+    if cached and cached[0] is snapshot and cached[1] is policy:
+        return cached[2]
+    reclassified = classify_snapshot(snapshot, policy)
+    # Only configured groups are cached, so arbitrary ?group= values can't grow it
+    if group in tier_policies.groups():
+        market.group_snapshots[group] = (snapshot, policy, reclassified)
+    return reclassified
+
+def current_snapshot(market=None):
+    """Current PriceSnapshot of a market (default market if None)"""
+    return markets[market or DEFAULT_MARKET].snapshot
+
+def publish_snapshot(snapshot, market=None):
+    """Make `snapshot` a market's current price state (caller holds price_lock)"""
+    markets[market or DEFAULT_MARKET].snapshot = snapshot
+    return snapshot
+
+def publish_mqtt(market, snapshot):
+    """
+    Retained MQTT price messages; markets other than the default get a
+    /<market> subtopic and each tier group a /groups/<group> one below that
+    """
+    if price_publisher:
+        topic = price_publisher.topic if market.id == DEFAULT_MARKET else f"{price_publisher.topic}/{market.id}"
+        price_publisher.publish(dict(snapshot.esp32), topic)
+        for group in tier_policies.groups():
+            price_publisher.publish(dict(group_snapshot(market, group).esp32), f"{topic}/groups/{group}")
+
+def reclassify_markets():
+    """Tier policy reloaded: re-derive every market's tier and republish it"""
+    for market in markets.values():
+        with price_lock:
+            current = market.snapshot
+            snapshot = classify_snapshot(current, tier_policies.policy(market.provider.tier_group))
+            if snapshot is not current:
+                publish_snapshot(snapshot, market.id)
+        if snapshot is not current:
+            market.stream.publish(snapshot.esp32['ts'], dict(snapshot.esp32))
+        if fetcher_lock.held:
+            # Followers adopt the new state; group topics may change even if this tier didn't
+            if snapshot is not current:
+                market.db.save_price_state(snapshot.json.decode())
+            publish_mqtt(market, snapshot)
+        logger.info(f"Reclassified {market.id} price under the reloaded tier policy (tier: {snapshot.data['tier']})")
+    response_cache.invalidate()
+
+tier_policies.on_reload = reclassify_markets
+
+def fetch_market_price(market_id=None):
+    """Fetch a market's latest price from its provider (default market if None)"""
+    market = markets[market_id or DEFAULT_MARKET]
+    provider = market.provider
     try:
-        # Try current hour average first
-        response = requests.get(CURRENT_PRICE_ENDPOINT, timeout=10)
-        response.raise_for_status()
+        start = time.perf_counter()
+        try:
+            data = provider.fetch()
+        except requests.exceptions.RequestException:
+            FETCH_SECONDS.observe(time.perf_counter() - start, market.id, 'error')
+            raise
+        latest = None if data is NOT_MODIFIED else provider.latest(data)
+        result = 'not_modified' if data is NOT_MODIFIED else 'ok' if latest else 'empty'
+        FETCH_SECONDS.observe(time.perf_counter() - start, market.id, result)
         
-        data = response.json()
+        if data is NOT_MODIFIED:
+            logger.debug(f"{market.id} price not modified")
+            return True
         
-        if data and len(data) > 0:
-            latest = data[0]
-            price_cents = float(latest.get('price', 0))
-            millis_utc = int(latest.get('millisUTC', 0))
+        if latest:
+            millis_utc, price_cents = latest
+            
+            current = market.snapshot
+            unchanged = millis_utc == current.data.get('millisUTC')
+            if unchanged and current.data['status'] == 'active':
+                # Same publication as last poll - nothing to store or push
+                return True
             
             # Convert millisUTC to readable timestamp
             timestamp = datetime.fromtimestamp(millis_utc / 1000.0).isoformat()
             
-            # Determine tier and recommendation
-            tier = determine_price_tier(price_cents)
-            stats = db.get_price_stats(24)
-            recommendation = get_recommendation(tier, stats)
+            # Determine tier and recommendation with the market's tariff mapping
+            tier = determine_price_tier(price_cents, provider.tier_group)
+            stats = market.db.get_price_stats(24)
+            recommendation = get_recommendation(tier, stats, provider.tier_group, price_cents)
             
             # Update global cache
             with price_lock:
-                current_price_data.update({
-                    'price_cents_per_kwh': price_cents,
-                    'timestamp': timestamp,
-                    'millisUTC': millis_utc,
-                    'status': 'active',
-                    'tier': tier,
-                    'recommendation': recommendation
-                })
+                snapshot = publish_snapshot(market.snapshot.replace(
+                    price_cents_per_kwh=price_cents,
+                    timestamp=timestamp,
+                    millisUTC=millis_utc,
+                    status='active',
+                    tier=tier,
+                    recommendation=recommendation
+                ), market.id)
             
-            # Store in database
-            db.insert_price(timestamp, price_cents, tier, millis_utc)
+            # Store in database (unless only the status is recovering)
+            if not unchanged:
+                market.db.insert_price(timestamp, price_cents, tier, millis_utc)
+            market.db.save_price_state(snapshot.json.decode())
+            response_cache.invalidate(next_update_in=seconds_until_next_poll(provider.interval, provider.publication_delay))
+            market.stream.publish(millis_utc, dict(snapshot.esp32))
+            publish_mqtt(market, snapshot)
             
-            logger.info(f"Updated price: {price_cents}¢/kWh (tier: {tier})")
+            logger.info(f"Updated {market.id} price: {price_cents}¢/kWh (tier: {tier})")
             return True
         else:
-            logger.warning("No data received from ComEd API")
+            logger.warning(f"No price data received for {market.id}")
             return False
             
     except requests.exceptions.RequestException as e:
-        logger.error(f"Error fetching ComEd price: {e}")
+        logger.error(f"Error fetching {market.id} price: {e}")
         with price_lock:
-            current_price_data['status'] = 'error'
+            snapshot = publish_snapshot(market.snapshot.replace(status='error'), market.id)
+        market.db.save_price_state(snapshot.json.decode())
+        response_cache.invalidate(next_update_in=seconds_until_next_poll(provider.interval, provider.publication_delay))
+        market.stream.publish(snapshot.esp32['ts'], dict(snapshot.esp32))
         return False
     except Exception as e:
-        logger.error(f"Unexpected error: {e}")
+        logger.error(f"Unexpected error fetching {market.id} price: {e}")
         return False
 
-def price_update_loop():
-    """Background thread to update prices every 5 minutes"""
-    logger.info("Starting price update loop...")
+def poll_market(market_id):
+    """Scheduler callback: True once the market has a newer price than before"""
+    market = markets[market_id]
+    if not market.backfilled:
+        # Fill any history gap left by downtime before the first live update
+        market.backfilled = True
+        try:
+            market.provider.backfill(market.db, lambda price: determine_price_tier(price, market.provider.tier_group))
+        except Exception as e:
+            logger.error(f"History backfill for {market_id} failed: {e}")
+    previous = market.snapshot.data.get('millisUTC')
+    fetch_market_price(market_id)
+    return market.snapshot.data.get('millisUTC') != previous
+
+# Polls every market from one thread (plus a small shared fetch pool)
+price_scheduler = PollScheduler(
+    poll_market,
+    max_workers=min(4, len(markets)),
+    recheck_delay=RECHECK_DELAY,
+    recheck_attempts=RECHECK_ATTEMPTS,
+    on_poll=lambda market, due: record_loop_run('price_poll', due)
+)
+
+def record_loop_run(loop, wake_at):
+    """Note that a background loop woke up, `wake_at` being when it meant to"""
+    now = time.time()
+    LOOP_LAG_SECONDS.observe(max(0.0, now - wake_at), loop)
+    LOOP_LAST_RUN.set(now, loop)
+
+def sync_shared_state(market_id=None):
+    """Adopt a market's price state written by the fetcher process; True if it changed"""
+    market = markets[market_id or DEFAULT_MARKET]
+    state = market.db.load_price_state(market.state_version)
+    if state is None:
+        return False
     
-    # Initial fetch
-    fetch_comed_price()
+    version, data = state
+    with price_lock:
+        snapshot = publish_snapshot(PriceSnapshot(data), market.id)
+    market.state_version = version
     
+    # The fetcher's inserts bypassed this process's rolling stats and forecaster
+    market.db.load_rollup()
+    market.db.forecaster.stale = True
+    provider = market.provider
+    response_cache.invalidate(next_update_in=seconds_until_next_poll(provider.interval, provider.publication_delay))
+    market.stream.publish(snapshot.esp32['ts'], dict(snapshot.esp32))
+    return True
+
+def follower_loop():
+    """Mirror the fetcher's state until this process wins the fetcher election"""
+    logger.info(f"Following shared price state (pid {os.getpid()})")
+    last_election = time.time()
+    wake_at = time.time()
+    while True:
+        record_loop_run('follower', wake_at)
+        try:
+            for market_id in markets:
+                sync_shared_state(market_id)
+            if time.time() - last_election >= ELECTION_INTERVAL:
+                last_election = time.time()
+                if fetcher_lock.try_acquire():
+                    logger.info(f"Took over as price fetcher (pid {os.getpid()})")
+                    start_fetcher()
+                    return
+        except Exception as e:
+            logger.error(f"Error syncing shared price state: {e}")
+        wake_at = time.time() + SYNC_INTERVAL
+        time.sleep(SYNC_INTERVAL)
+
+def policy_watch_loop():
+    """Notice tier policy edits even while no request or poll looks a policy up"""
     while True:
+        wake_at = time.time() + SYNC_INTERVAL
+        time.sleep(SYNC_INTERVAL)
+        record_loop_run('policy_watch', wake_at)
         try:
-            time.sleep(300)  # 5 minutes
-            fetch_comed_price()
+            tier_policies.check()
         except Exception as e:
-            logger.error(f"Error in update loop: {e}")
-            time.sleep(60)  # Retry after 1 minute on error
+            logger.error(f"Tier policy check failed: {e}")
+
+def compaction_loop():
+    """Background thread archiving old price rows and vacuuming the database"""
+    while True:
+        for market in markets.values():
+            try:
+                result = market.db.compact(PRICE_RETENTION_DAYS)
+                if result['archived'] or result['pages_freed']:
+                    logger.info(f"Compacted {market.id} price history: {result}")
+            except Exception as e:
+                logger.error(f"{market.id} price history compaction failed: {e}")
+        wake_at = time.time() + COMPACTION_INTERVAL
+        time.sleep(COMPACTION_INTERVAL)
+        record_loop_run('compaction', wake_at)
+
+def start_fetcher():
+    """Run the price updater (and MQTT publisher / telemetry ingest) in this process"""
+    global telemetry_ingestor
+    if price_publisher:
+        price_publisher.start()
+    if os.environ.get('TELEMETRY_INGEST', '').lower() in ('1', 'true', 'yes'):
+        telemetry_ingestor = TelemetryIngestor(telemetry_store)
+        telemetry_ingestor.start()
+        telemetry_ingestor.connect_mqtt(mqtt_client_from_env(f"telemetry-ingest-{os.getpid()}"))
+    for market in markets.values():
+        price_scheduler.add(market.id, market.provider.interval, market.provider.publication_delay)
+    price_scheduler.start()
+    Thread(target=compaction_loop, daemon=True).start()
+
+def start_background_workers():
+    """
+    Start background work for this process
+    Exactly one process (per lock file) becomes the price fetcher; any
+    other workers follow the state it writes to the database.
+    """
+    if fetcher_lock.try_acquire():
+        logger.info(f"Elected price fetcher (pid {os.getpid()})")
+        start_fetcher()
+    else:
+        Thread(target=follower_loop, daemon=True).start()
+    Thread(target=policy_watch_loop, daemon=True).start()
+    if os.environ.get('PRICE_STREAM_PORT'):
+        start_stream_server(int(os.environ['PRICE_STREAM_PORT']))
+
+def start_stream_server(port, host='0.0.0.0'):
+    """Serve price streams from this worker's evented server (the port is shared by all workers)"""
+    global stream_server
+    server = StreamServer({market.id: market.stream for market in markets.values()}, DEFAULT_MARKET,
+                          host=host, port=port, reuse_port=True)
+    server.start()
+    stream_server = server
+    logger.info(f"Serving price streams on port {server.port} (pid {os.getpid()})")
+    return server
+
+def _cache_hit_ratio():
+    total = response_cache.hits + response_cache.misses
+    return response_cache.hits / total if total else None
+
+def _telemetry_counts():
+    if telemetry_ingestor is None:
+        return None
+    m = telemetry_ingestor.metrics()
+    return {(state,): m[state] for state in ('received', 'written', 'rejected')}
+
+metrics.callback('comed_api_response_cache_hits_total', 'Response cache hits',
+                 lambda: response_cache.hits, kind='counter')
+metrics.callback('comed_api_response_cache_misses_total', 'Response cache misses',
+                 lambda: response_cache.misses, kind='counter')
+metrics.callback('comed_api_response_cache_hit_ratio', 'Response cache hits / lookups', _cache_hit_ratio)
+metrics.callback('comed_api_upstream_retries_total', 'Provider request retries', lambda: {
+    (market.id, endpoint): retries
+    for market in markets.values() for endpoint, retries in market.provider.retries().items()
+}, kind='counter', labelnames=('market', 'endpoint'))
+metrics.callback('comed_api_lock_acquisitions_total', 'Lock acquisitions',
+                 lambda: {('price',): price_lock.acquisitions}, kind='counter', labelnames=('lock',))
+metrics.callback('comed_api_lock_contended_total', 'Lock acquisitions that had to wait',
+                 lambda: {('price',): price_lock.contended}, kind='counter', labelnames=('lock',))
+metrics.callback('comed_api_price_streams', 'Open SSE / long-poll price streams in this worker',
+                 lambda: stream_slots.active + (stream_server.active if stream_server else 0))
+metrics.callback('comed_api_price_streams_rejected_total', 'Streams refused because the worker was at its cap',
+                 lambda: stream_slots.rejected + (stream_server.rejected if stream_server else 0),
+                 kind='counter')
+metrics.callback('comed_api_telemetry_samples_total', 'Telemetry samples by ingest state',
+                 _telemetry_counts, kind='counter', labelnames=('state',))
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    g.profile = request_profiler.start() if request_profiler.enabled else None
+
+@app.after_request
+def record_request(response):
+    elapsed = time.perf_counter() - g.request_started
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    REQUEST_SECONDS.observe(elapsed, request.method, route, str(response.status_code))
+    if g.profile is not None:
+        profile, g.profile = g.profile, None
+        request_profiler.finish(profile, f"{request.method} {route}", elapsed)
+    return response
+
+@app.teardown_request
+def stop_request_profile(exc):
+    # after_request is skipped if a handler before it raised
+    profile = g.pop('profile', None)
+    if profile is not None:
+        request_profiler.finish(profile, request.path, time.perf_counter() - g.request_started)
+
+def snapshot_response(body, etag, mimetype='application/json'):
+    """
+    Serve a pre-serialized snapshot body with the same ETag/max-age
+    revalidation as response_cache, minus its lookup and lock
+    """
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype=mimetype)
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = response_cache.max_age()
+    return response
+
+def market_view(view):
+    """Pass the ?market= Market (default market if omitted) to the view; 404 if unknown"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        market = markets.get(request.args.get('market', DEFAULT_MARKET))
+        if market is None:
+            return jsonify({'error': 'Unknown market', 'markets': list(markets)}), 404
+        return view(market, *args, **kwargs)
+    return wrapper
 
 # API Routes
 
+@app.route('/api/markets', methods=['GET'])
+def list_markets():
+    """Configured markets with their provider and current price"""
+    return jsonify({
+        'default': DEFAULT_MARKET,
+        'markets': [
+            dict(market.provider.describe(),
+                 price_cents_per_kwh=market.snapshot.data['price_cents_per_kwh'],
+                 tier=market.snapshot.data['tier'],
+                 status=market.snapshot.data['status'])
+            for market in markets.values()
+        ]
+    })
+
 @app.route('/api/price/current', methods=['GET'])
-def get_current_price():
-    """Get current electricity price"""
-    with price_lock:
-        return jsonify(current_price_data)
+@market_view
+def get_current_price(market):
+    """Get current electricity price (tier and recommendation per ?group= policy)"""
+    snapshot = group_snapshot(market, request.args.get('group'))
+    return snapshot_response(snapshot.json, snapshot.etag)
 
 @app.route('/api/price/esp32', methods=['GET'])
-def get_price_for_esp32():
+@market_view
+def get_price_for_esp32(market):
     """
     Optimized endpoint for ESP32 - minimal JSON payload
-    Returns only essential data in a compact format
+    Returns only essential data in a compact format; ?group= picks the
+    tier policy of the device's building/room group
     """
-    with price_lock:
-        esp32_data = {
-            'p': round(current_price_data['price_cents_per_kwh'], 2),  # price
-            't': current_price_data['tier'],                           # tier
-            'a': current_price_data['recommendation'].get('action', 'normal'),  # action
-            'o': current_price_data['recommendation'].get('suggested_temp_offset', 0),  # temp offset
-            'ts': current_price_data['millisUTC'],                     # timestamp
-            's': current_price_data['status']                          # status
-        }
-    return jsonify(esp32_data)
+    snapshot = group_snapshot(market, request.args.get('group'))
+    return snapshot_response(snapshot.esp32_json, snapshot.esp32_etag)
+
+@app.route('/api/price/esp32.bin', methods=['GET'])
+@market_view
+def get_price_for_esp32_binary(market):
+    """Same payload as /api/price/esp32 in the fixed 11-byte layout of esp32_binary.py"""
+    snapshot = group_snapshot(market, request.args.get('group'))
+    return snapshot_response(snapshot.esp32_bin, snapshot.esp32_bin_etag, 'application/octet-stream')
+
+@app.route('/api/price/stream', methods=['GET'])
+@market_view
+def stream_prices(market):
+    """
+    Push price updates instead of polling
+    Without arguments this is a Server-Sent Events stream of the compact
+    ESP32 payload. With ?since=<millisUTC> it long-polls: the request is
+    held until a newer price is stored (up to ?timeout=30 seconds) and
+    returns 204 if none arrives in time. When the evented stream server
+    runs, clients are redirected there instead of holding a thread.
+    """
+    if stream_server is not None:
+        base = PRICE_STREAM_URL or f"{request.scheme}://{request.host.rsplit(':', 1)[0]}:{stream_server.port}"
+        query = request.query_string.decode()
+        return redirect(f"{base}{request.path}{'?' + query if query else ''}", code=307)
+
+    if not stream_slots.acquire():
+        response = jsonify({'error': 'Too many open price streams, poll /api/price/esp32 instead'})
+        response.headers['Retry-After'] = str(STREAM_RETRY_AFTER)
+        return response, 503
+
+    since = request.args.get('since', type=int)
+    if since is None:
+        events = market.stream.sse_events(last_event_id=request.headers.get('Last-Event-ID'))
+        response = Response(events, mimetype='text/event-stream', headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'  # Don't let reverse proxies buffer the stream
+        })
+        # Held until the client goes away, even if the body never starts
+        response.call_on_close(stream_slots.release)
+        return response
+    
+    timeout = max(0, min(request.args.get('timeout', default=30, type=int), 60))
+    try:
+        payload = market.stream.wait_newer_than(since, timeout)
+    finally:
+        stream_slots.release()
+    if payload is None:
+        return '', 204
+    return Response(payload, mimetype='application/json')
 
 @app.route('/api/price/history', methods=['GET'])
-def get_price_history():
-    """Get historical price data"""
+@response_cache.cached
+@market_view
+def get_price_history(market):
+    """
+    Get historical price data, newest first
+    ?points=N downsamples to N points with LTTB (spikes are kept) and
+    ?format=columnar returns parallel arrays with delta-encoded times
+    (oldest first, so the deltas are positive).
+    """
     hours = request.args.get('hours', default=24, type=int)
     hours = min(hours, 168)  # Cap at 1 week
+    points = request.args.get('points', type=int)
+    columnar = request.args.get('format') == 'columnar'
+    
+    history = market.db.get_recent_prices(hours)
+    
+    if points is not None:
+        # LTTB walks the series oldest first; keep the rows newest first
+        history.reverse()
+        keep = lttb([row[3] for row in history], [row[1] for row in history], max(3, points))
+        history = [history[i] for i in reversed(keep)]
     
-    history = db.get_recent_prices(hours)
+    if columnar:
+        history.reverse()  # Oldest first for the time deltas
+        return jsonify(dict(to_columnar(history), count=len(history), hours=hours, format='columnar'))
     
     result = {
         'count': len(history),
@@ -296,14 +975,83 @@ def get_price_history():
     
     return jsonify(result)
 
+@app.route('/api/price/aggregates', methods=['GET'])
+@response_cache.cached
+@market_view
+def get_price_aggregates(market):
+    """
+    Hourly or daily price aggregates over long ranges, archive included
+    ?resolution=hour|day and ?days=30 back from now (at most 3650)
+    """
+    resolution = request.args.get('resolution', default='day')
+    if resolution not in price_archive.AGGREGATES:
+        return jsonify({'error': 'resolution must be hour or day'}), 400
+    days = max(1, min(request.args.get('days', default=30, type=int), 3650))
+    end = now_millis()
+    rows = market.db.get_price_aggregates(resolution, end - days * 86400000, end)
+    return jsonify({
+        'resolution': resolution,
+        'days': days,
+        'count': len(rows),
+        'data': [
+            {'millisUTC': r[0], 'samples': r[1], 'avg_price': round(r[2], 3),
+             'min_price': r[3], 'max_price': r[4]}
+            for r in rows
+        ]
+    })
+
+def parse_range_bound(value, tz, next_day=False):
+    """millisUTC or a YYYY-MM-DD date in tz (the following midnight if next_day)"""
+    if value.isdigit():
+        return int(value)
+    day = datetime.strptime(value, '%Y-%m-%d')
+    if next_day:
+        day += timedelta(days=1)
+    return int(day.replace(tzinfo=tz).timestamp() * 1000)
+
+@app.route('/api/price/analytics', methods=['GET'])
+@response_cache.cached
+@market_view
+def get_price_analytics(market):
+    """
+    Day-of-week x hour heatmap, percentiles and tier durations for any range
+    ?start=&end= as millisUTC or YYYY-MM-DD in ?tz=America/Chicago (end
+    date inclusive), otherwise the last ?days=30; ?group= picks the tier
+    policy (default: the market's)
+    """
+    try:
+        tz = ZoneInfo(request.args.get('tz', 'America/Chicago'))
+    except (ZoneInfoNotFoundError, ValueError):
+        return jsonify({'error': 'Unknown time zone'}), 400
+    try:
+        end = request.args.get('end')
+        end = parse_range_bound(end, tz, next_day=True) if end else now_millis()
+        start = request.args.get('start')
+        if start:
+            start = parse_range_bound(start, tz)
+        else:
+            start = end - max(1, request.args.get('days', default=30, type=int)) * 86400000
+    except ValueError:
+        return jsonify({'error': 'start/end must be millisUTC or YYYY-MM-DD'}), 400
+    if start >= end:
+        return jsonify({'error': 'start must be before end'}), 400
+    if end - start > 3660 * 86400000:
+        return jsonify({'error': 'Range is limited to 10 years'}), 400
+    
+    group = request.args.get('group', market.provider.tier_group)
+    result = market.analytics.get(start, end, tier_policies.policy(group), tz)
+    if result is None:
+        return jsonify({'error': 'No prices in that range'}), 404
+    return jsonify(dict(result, start=start, end=end, tz=str(tz), group=group))
+
 @app.route('/api/price/stats', methods=['GET'])
-def get_price_statistics():
+@response_cache.cached
+@market_view
+def get_price_statistics(market):
     """Get statistical summary of prices"""
     hours = request.args.get('hours', default=24, type=int)
-    stats = db.get_price_stats(hours)
-    
-    with price_lock:
-        current = current_price_data['price_cents_per_kwh']
+    stats = market.db.get_price_stats(hours)
+    current = market.snapshot.data['price_cents_per_kwh']
     
     result = {
         'period_hours': hours,
@@ -319,36 +1067,193 @@ def get_price_statistics():
     return jsonify(result)
 
 @app.route('/api/price/forecast', methods=['GET'])
-def get_price_forecast():
+@response_cache.cached
+@market_view
+def get_price_forecast(market):
     """
-    Simple forecast based on historical patterns
-    Note: ComEd doesn't provide future prices, this is based on typical patterns
+    Price forecast at 5-minute resolution for the next ?hours=24
+    Note: ComEd doesn't publish future real-time prices, this is a
+    seasonal model of the stored history with 10th/90th percentile bands
     """
-    stats = db.get_price_stats(24)
-    history = db.get_recent_prices(24)
+    hours = max(1, min(request.args.get('hours', default=24, type=int), 24))
+    if market.db.forecaster.stale:
+        market.db.load_forecaster()
+    forecast = market.db.forecaster.forecast(steps=hours * 12, now=now_millis())
+    if forecast is None:
+        return jsonify({'error': 'Not enough price history to forecast'}), 503
     
-    # Simple forecast: assume similar pattern to yesterday
-    forecast = {
+    next_hour = float(forecast['point'][:12].mean())
+    # A week of data covers every weekly slot once
+    confidence = 'high' if forecast['samples'] >= 4 * 2016 else 'medium' if forecast['samples'] >= 2016 else 'low'
+    return jsonify({
         'disclaimer': 'Forecast based on historical patterns, not official ComEd data',
-        'next_hour_estimate': round(stats['avg_price'], 2),
-        'confidence': 'low',
+        'next_hour_estimate': round(next_hour, 2),
+        'next_hour_tier': determine_price_tier(next_hour, market.provider.tier_group),
+        'confidence': confidence,
+        'horizon_hours': hours,
+        'start': forecast['start'],
+        'step_ms': forecast['step_ms'],
+        'point': [round(p, 2) for p in forecast['point'].tolist()],
+        'p10': [round(p, 2) for p in forecast['p10'].tolist()],
+        'p90': [round(p, 2) for p in forecast['p90'].tolist()],
         'recommendation': 'Check actual prices before making decisions'
-    }
+    })
+
+def price_curve(market, hours):
+    """(start millis, per-5-minute prices) from a market's current price followed by its forecast"""
+    if market.db.forecaster.stale:
+        market.db.load_forecaster()
+    forecast = market.db.forecaster.forecast(steps=hours * 12 - 1, now=now_millis())
+    if forecast is None:
+        return None
+    current = market.snapshot.data['price_cents_per_kwh']
+    return forecast['start'] - forecast['step_ms'], [current] + forecast['point'].tolist()
+
+@app.route('/api/schedule', methods=['POST'])
+@response_cache.cached
+@market_view
+def get_schedule(market):
+    """
+    Minimum-cost on/off schedule for a set of devices over the forecast
+    Body: {"devices": [...], "horizon_hours": 24}. See load_scheduler.py
+    for the shiftable and thermal device fields.
+    """
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        return jsonify({'error': 'Expected a JSON object body'}), 400
+    try:
+        hours = max(1, min(int(body.get('horizon_hours', 24)), 24))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'horizon_hours must be an integer'}), 400
     
-    return jsonify(forecast)
+    curve = price_curve(market, hours)
+    if curve is None:
+        return jsonify({'error': 'Not enough price history to schedule'}), 503
+    start, prices = curve
+    try:
+        result = optimize(body.get('devices'), prices, start)
+    except ScheduleError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(dict(result, horizon_hours=hours, price_source='forecast'))
+
+@app.route('/api/control/batch', methods=['POST'])
+@market_view
+def control_batch(market):
+    """
+    Eco-mode fan/lamp decisions for many rooms in one call
+    Body: {"rooms": [{"room": "a101", "tC": 26.5, "pir": 1, "dist": 80,
+    "power": 120, "ecoMode": 1, "fan": false, "lamp": false}, ...],
+    "group": "dorm-east"}; the tier comes from the group's policy (body
+    "group" or ?group=), and a room with its own "group" gets that one's.
+    """
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        return jsonify({'error': 'Expected a JSON object body'}), 400
+    group = body.get('group', request.args.get('group'))
+    try:
+        snapshot = group_snapshot(market, group)
+        decisions = group_decisions(market, body.get('rooms', []), group)
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'tier': snapshot.data['tier'], 'price': snapshot.data['price_cents_per_kwh'],
+                    'group': group, 'count': len(decisions), 'rooms': decisions})
+
+def group_decisions(market, rooms, group):
+    """decide() once per tier group; rooms carrying a "group" also get their tier back"""
+    if (not isinstance(rooms, list) or not all(isinstance(room, dict) for room in rooms)
+            or not any('group' in room for room in rooms)):
+        return decide(rooms, group_snapshot(market, group).data['tier'])
+    by_group = {}
+    for i, room in enumerate(rooms):
+        by_group.setdefault(room.get('group', group), []).append(i)
+    decisions = [None] * len(rooms)
+    for room_group, index in by_group.items():
+        tier = group_snapshot(market, room_group).data['tier']
+        for i, decision in zip(index, decide([rooms[i] for i in index], tier)):
+            decisions[i] = dict(decision, room=rooms[i].get('room', i), tier=tier)
+    return decisions
+
+@app.route('/api/tiers/policy', methods=['GET'])
+def get_tier_policy():
+    """Thresholds and recommendations in force for ?group= (default policy if omitted)"""
+    group = request.args.get('group')
+    policy = tier_policies.policy(group)
+    return jsonify({
+        'group': group if group in tier_policies.groups() else None,
+        'groups': tier_policies.groups(),
+        'tiers': policy.describe()
+    })
+
+@app.route('/api/tiers/classify', methods=['POST'])
+def classify_prices():
+    """
+    Tier for each of many prices in one call
+    Body: {"prices": [2.1, 7.4, ...], "group": "dorm-east"}
+    """
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict) or not isinstance(body.get('prices'), list):
+        return jsonify({'error': "Expected a JSON object with a 'prices' list"}), 400
+    policy = tier_policies.policy(body.get('group'))
+    try:
+        index = policy.classify_many(body['prices'])
+    except (TypeError, ValueError):
+        return jsonify({'error': 'prices must be numbers'}), 400
+    return jsonify({'count': len(index), 'tiers': [policy.names[i] for i in index.tolist()]})
+
+@app.route('/api/telemetry/metrics', methods=['GET'])
+def get_telemetry_metrics():
+    """Ingest rate and queue depth of the in-process telemetry ingestor"""
+    if telemetry_ingestor is None:
+        return jsonify({'status': 'disabled'})
+    return jsonify(dict(telemetry_ingestor.metrics(), status='active'))
+
+@app.route('/api/telemetry/<room>/history', methods=['GET'])
+def get_telemetry_history(room):
+    """
+    Downsampled room history for dashboards
+    Range is ?hours=24 back from now or ?start=&end= in millisUTC; the
+    resolution is picked so at most ?points=500 buckets come back.
+    """
+    end = request.args.get('end', default=now_millis(), type=int)
+    start = request.args.get('start', type=int)
+    if start is None:
+        start = end - request.args.get('hours', default=24, type=int) * 3600 * 1000
+    points = max(1, min(request.args.get('points', default=500, type=int), 5000))
+    if start >= end:
+        return jsonify({'error': 'start must be before end'}), 400
+
+    history = telemetry_store.get_history(room, start, end, max_points=points)
+    return jsonify(dict(history, room=room, start=start, end=end, count=len(history['points'])))
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus text exposition of this worker's metrics"""
+    return Response(metrics.render(), content_type=CONTENT_TYPE)
+
+@app.route('/metrics/profiles', methods=['GET'])
+def get_profiles():
+    """cProfile reports of recent slow sampled requests"""
+    return jsonify({
+        'enabled': request_profiler.enabled,
+        'sample_rate': request_profiler.sample_rate,
+        'slow_ms': request_profiler.slow_seconds * 1000,
+        'profiles': list(request_profiler.reports)
+    })
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
-    """Health check endpoint"""
-    with price_lock:
-        status = current_price_data['status']
-        last_update = current_price_data['timestamp']
+    """Health check endpoint; degraded if any market's provider isn't active"""
+    snapshot = markets[DEFAULT_MARKET].snapshot
+    status = snapshot.data['status']
+    last_update = snapshot.data['timestamp']
+    market_status = {market.id: market.snapshot.data['status'] for market in markets.values()}
     
     return jsonify({
-        'status': 'healthy' if status == 'active' else 'degraded',
+        'status': 'healthy' if all(s == 'active' for s in market_status.values()) else 'degraded',
         'service': 'comed-pricing-api',
         'last_update': last_update,
-        'api_status': status
+        'api_status': status,
+        'markets': market_status
     })
 
 @app.route('/', methods=['GET'])
@@ -358,11 +1263,27 @@ def index():
         'service': 'ComEd 5-Minute Pricing API for ESP32',
         'version': '1.0',
         'endpoints': {
+            '/api/markets': 'Configured price markets (price endpoints take ?market=<id>)',
             '/api/price/current': 'Get current price with full details',
             '/api/price/esp32': 'Optimized endpoint for ESP32 (compact JSON)',
+            '/api/price/esp32?group=': 'Same, with the tier from a building/room group policy',
+            '/api/price/esp32.bin': 'ESP32 payload as fixed-layout binary (see esp32_binary.py)',
             '/api/price/history?hours=24': 'Get price history',
+            '/api/price/history?hours=168&points=500&format=columnar': 'Downsampled, compact price history',
             '/api/price/stats?hours=24': 'Get price statistics',
-            '/api/price/forecast': 'Get simple price forecast',
+            '/api/price/aggregates?resolution=day&days=30': 'Hourly/daily aggregates, archived history included',
+            '/api/price/analytics?start=2024-06-01&end=2024-08-31': 'Hour/weekday heatmap, percentiles and tier durations',
+            '/api/price/forecast?hours=24': '5-minute price forecast with 10th/90th percentile bands',
+            '/api/price/stream': 'Server-Sent Events stream of ESP32 payloads',
+            '/api/price/stream?since=<millisUTC>': 'Long-poll for a price newer than since',
+            '/api/schedule (POST)': 'Minimum-cost device schedule over the price forecast',
+            '/api/control/batch (POST)': 'Fan/lamp decisions for many rooms from their telemetry',
+            '/api/tiers/policy?group=': 'Tier thresholds and recommendations in force',
+            '/api/tiers/classify (POST)': 'Tiers for a list of prices',
+            '/api/telemetry/metrics': 'Telemetry ingest rate and queue depth',
+            '/api/telemetry/<room>/history?hours=24&points=500': 'Downsampled room telemetry',
+            '/metrics': 'Prometheus metrics for the worker serving the request',
+            '/metrics/profiles': 'Profiles of slow sampled requests (PROFILE_SAMPLE_RATE)',
             '/api/health': 'Health check'
         },
         'update_interval': '5 minutes',
@@ -370,11 +1291,10 @@ def index():
     })
 
 if __name__ == '__main__':
-    import os
+    # Development server; production runs gunicorn (see gunicorn.conf.py)
     port = int(os.environ.get('PORT', 5000))
     
-    update_thread = Thread(target=price_update_loop, daemon=True)
-    update_thread.start()
+    start_background_workers()
     
     logger.info("Starting ComEd Pricing API server...")
     app.run(host='0.0.0.0', port=port, debug=False)
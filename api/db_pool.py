@@ -0,0 +1,138 @@
+"""
+Pooled SQLite connections for the pricing API
+Keeps a bounded set of open connections in WAL mode so request handlers
+and the background price updater stop paying connect/schema costs per call
+"""
+
+import sqlite3
+import logging
+from contextlib import contextmanager
+from queue import Queue, Empty, Full
+from threading import Lock
+
+logger = logging.getLogger(__name__)
+
+# Applied to every new connection, in order. WAL lets the price update
+# writer commit without blocking readers on the history/stats endpoints.
+DEFAULT_PRAGMAS = {
+    'auto_vacuum': 'INCREMENTAL',   # Only takes effect on a new, empty file
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',    # Safe with WAL, avoids fsync per commit
+    'busy_timeout': 5000,       # ms to wait on a locked database
+    'cache_size': -8000,        # Negative = KiB, ~8 MB page cache per conn
+    'temp_store': 'MEMORY'
+}
+
+
+class ConnectionPool:
+    """Bounded, thread-safe pool of SQLite connections"""
+
+    def __init__(self, db_path, max_size=8, timeout=10.0, pragmas=None,
+                 cached_statements=128):
+        self.db_path = db_path
+        # Every ':memory:' connection is a separate database, so share one
+        if db_path == ':memory:':
+            max_size = 1
+        self.max_size = max_size
+        self.timeout = timeout
+        self.cached_statements = cached_statements
+        self.pragmas = dict(DEFAULT_PRAGMAS)
+        if pragmas:
+            self.pragmas.update(pragmas)
+
+        self._idle = Queue(maxsize=max_size)
+        self._created = 0
+        self._lock = Lock()
+        self._closed = False
+
+    def _connect(self):
+        """Open and configure a new connection"""
+        # cached_statements keeps compiled statements per connection, so the
+        # fixed queries in PriceDatabase are prepared once and reused
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.timeout,
+            check_same_thread=False,
+            cached_statements=self.cached_statements
+        )
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name}={value}")
+        return conn
+
+    def acquire(self):
+        """Take an idle connection, opening a new one while under max_size"""
+        if self._closed:
+            raise RuntimeError("Connection pool is closed")
+
+        try:
+            return self._idle.get_nowait()
+        except Empty:
+            pass
+
+        with self._lock:
+            if self._created < self.max_size:
+                self._created += 1
+                create = True
+            else:
+                create = False
+
+        if create:
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except Empty:
+            raise TimeoutError(
+                f"No SQLite connection available after {self.timeout}s"
+            )
+
+    def release(self, conn):
+        """Return a connection to the pool"""
+        if conn.in_transaction:
+            conn.rollback()
+        if self._closed:
+            conn.close()
+            return
+        try:
+            self._idle.put_nowait(conn)
+        except Full:
+            conn.close()
+            with self._lock:
+                self._created -= 1
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection for the duration of a with-block"""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    @contextmanager
+    def transaction(self):
+        """Borrow a connection and commit on success, roll back on error"""
+        with self.connection() as conn:
+            try:
+                yield conn
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    def close(self):
+        """Close all idle connections; in-use ones close on release"""
+        self._closed = True
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except Empty:
+                break
+            conn.close()
+        with self._lock:
+            self._created = 0
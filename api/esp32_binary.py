@@ -0,0 +1,64 @@
+"""
+Fixed-layout binary encoding of the ESP32 price payload
+Served at /api/price/esp32.bin so the firmware can memcpy the response
+into a packed struct instead of parsing JSON. All fields little-endian:
+
+    offset size  field
+    0      1     uint8   schema version (SCHEMA_VERSION)
+    1      2     int16   price, 0.01 ¢/kWh (clamped to int16)
+    3      1     uint8   tier index into TIERS
+    4      1     uint8   action index into ACTIONS
+    5      1     int8    suggested temperature offset, °C
+    6      4     uint32  price timestamp, seconds since the Unix epoch (0 = none)
+    10     1     uint8   status index into STATUSES
+
+Enum tables only ever grow at the end; changing the layout bumps the
+version so older firmware can reject payloads it doesn't understand.
+"""
+
+import struct
+
+SCHEMA_VERSION = 1
+LAYOUT = struct.Struct('<BhBBbIB')
+SIZE = LAYOUT.size  # 11 bytes
+
+TIERS = ['very_low', 'low', 'normal', 'high', 'very_high', 'critical']
+ACTIONS = ['maximize', 'normal_plus', 'normal', 'reduce', 'minimize', 'critical']
+STATUSES = ['initializing', 'active', 'error']
+
+
+def _index(table, value, default):
+    try:
+        return table.index(value)
+    except ValueError:
+        return table.index(default)
+
+
+def encode(payload):
+    """Compact ESP32 dict (p/t/a/o/ts/s) -> bytes"""
+    price = max(-32768, min(32767, int(round((payload['p'] or 0) * 100))))
+    millis = payload.get('ts') or 0
+    return LAYOUT.pack(
+        SCHEMA_VERSION,
+        price,
+        _index(TIERS, payload['t'], 'normal'),
+        _index(ACTIONS, payload['a'], 'normal'),
+        max(-128, min(127, int(payload['o']))),
+        max(0, min(0xFFFFFFFF, millis // 1000)),
+        _index(STATUSES, payload['s'], 'error')
+    )
+
+
+def decode(data):
+    """bytes -> compact ESP32 dict; raises ValueError on an unknown version or size"""
+    if len(data) != SIZE or data[0] != SCHEMA_VERSION:
+        raise ValueError(f"Unsupported ESP32 price payload (version {data[:1].hex() or 'none'}, {len(data)} bytes)")
+    _, price, tier, action, offset, seconds, status = LAYOUT.unpack(data)
+    return {
+        'p': price / 100,
+        't': TIERS[tier],
+        'a': ACTIONS[action],
+        'o': offset,
+        'ts': seconds * 1000 if seconds else None,
+        's': STATUSES[status]
+    }
@@ -0,0 +1,26 @@
+"""
+Gunicorn settings for running the pricing API with multiple workers
+Each worker imports the app on its own; post_worker_init then elects a
+single price fetcher and turns the others into followers of its state.
+"""
+
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+workers = int(os.environ.get('WEB_CONCURRENCY', min(multiprocessing.cpu_count() * 2 + 1, 8)))
+
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 16))
+
+# SSE streams and long-polls are served by each worker's evented
+# stream_server.py on the next port (shared via SO_REUSEPORT), so idle
+# subscribers cost a socket rather than one of the threads above
+os.environ.setdefault('PRICE_STREAM_PORT', str(int(os.environ.get('PORT', 5000)) + 1))
+timeout = 120
+keepalive = 75
+
+
+def post_worker_init(worker):
+    from comed_pricing_api import start_background_workers
+    start_background_workers()
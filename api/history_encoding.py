@@ -0,0 +1,58 @@
+"""
+Compact encodings for price history responses
+Largest-Triangle-Three-Buckets downsampling keeps the visual shape of a
+series (spikes included) with far fewer points, and the columnar form
+replaces repeated per-row keys with parallel arrays and delta-encoded
+timestamps.
+"""
+
+TIERS = ['very_low', 'low', 'normal', 'high', 'very_high', 'critical']
+
+
+def lttb(xs, ys, threshold):
+    """Indices of the points LTTB keeps when reducing (xs, ys) to `threshold` points"""
+    n = len(xs)
+    if threshold >= n:
+        return list(range(n))
+    if threshold < 3:
+        return [0, n - 1][:max(threshold, 0)]
+
+    kept = [0]
+    every = (n - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        # Average of the next bucket is the third triangle vertex
+        next_start = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        span = next_end - next_start
+        avg_x = sum(xs[next_start:next_end]) / span
+        avg_y = sum(ys[next_start:next_end]) / span
+
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        ax, ay = xs[a], ys[a]
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            area = abs((ax - avg_x) * (ys[j] - ay) - (ax - xs[j]) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = j, area
+        kept.append(best)
+        a = best
+    kept.append(n - 1)
+    return kept
+
+
+def to_columnar(rows):
+    """
+    (timestamp, price, tier, millisUTC) rows in ascending time -> parallel arrays
+    Timestamps are t0 plus per-point deltas (dt[0] == 0), tiers are indices into `tiers`
+    """
+    t0 = rows[0][3] if rows else None
+    previous = t0
+    dt, price, tier = [], [], []
+    for _, p, tier_name, millis in rows:
+        dt.append(millis - previous)
+        previous = millis
+        price.append(p)
+        tier.append(TIERS.index(tier_name) if tier_name in TIERS else -1)
+    return {'t0': t0, 'dt': dt, 'price': price, 'tier': tier, 'tiers': TIERS}
@@ -0,0 +1,42 @@
+"""
+Single-fetcher election for multi-worker deployments
+Worker processes race for an exclusive flock on a shared lock file; the
+holder runs the price updater. The OS drops the lock when the holder
+exits, so another worker can take over on its next attempt.
+"""
+
+import fcntl
+import os
+
+
+class LeaderLock:
+    """Non-blocking exclusive file lock"""
+
+    def __init__(self, path):
+        self.path = path
+        self._fd = None
+
+    @property
+    def held(self):
+        return self._fd is not None
+
+    def try_acquire(self):
+        """Take the lock if nobody holds it; returns True if this process is leader"""
+        if self._fd is not None:
+            return True
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode())
+        self._fd = fd
+        return True
+
+    def release(self):
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
@@ -0,0 +1,206 @@
+"""
+Price-aware load scheduling
+Turns a per-slot price curve (current price followed by the forecast)
+into minimum-cost on/off schedules for two kinds of device:
+
+- shiftable: must run `runtime_minutes` in total between `start_minutes`
+  and `deadline_minutes` (fan, lamp, charger). Costs are independent per
+  slot, so picking the cheapest allowed slots is optimal.
+- thermal: has a room temperature that falls by `cooling_per_hour` while
+  on and rises by `warming_per_hour` while off, and must stay within
+  [comfort_min, comfort_max] (AC). Solved by dynamic programming over a
+  discretized temperature grid.
+
+All devices of a kind are solved together as NumPy arrays, so hundreds of
+devices cost a few hundred vectorized steps rather than per-device loops.
+"""
+
+import numpy as np
+
+SLOT_MINUTES = 5
+TEMP_STEP = 0.02  # °C per DP state
+
+# Request size limits: the thermal DP keeps a slots x devices x states
+# decision table, so a wide band or many devices would exhaust memory
+MAX_DEVICES = 500
+MAX_COMFORT_BAND = 10.0   # °C
+MAX_DP_CELLS = 20_000_000
+
+
+class ScheduleError(ValueError):
+    """Invalid device description"""
+
+
+def _number(device, key, default=None, minimum=None):
+    value = device.get(key, default)
+    if value is None:
+        raise ScheduleError(f"Device {device.get('id')!r} is missing '{key}'")
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        raise ScheduleError(f"Device {device.get('id')!r}: '{key}' must be a number")
+    if minimum is not None and value < minimum:
+        raise ScheduleError(f"Device {device.get('id')!r}: '{key}' must be >= {minimum}")
+    return value
+
+
+def _runs(on, start_millis, slot_ms):
+    """Boolean slot array -> [[start, end), ...] in millis"""
+    edges = np.flatnonzero(np.diff(np.r_[0, on.astype(np.int8), 0]))
+    return [[start_millis + int(a) * slot_ms, start_millis + int(b) * slot_ms]
+            for a, b in zip(edges[::2], edges[1::2])]
+
+
+def schedule_shiftable(devices, prices):
+    """
+    (on matrix, baseline matrix, feasible) for shiftable devices
+    Baseline runs as early as allowed, which is what a plain timer would do
+    """
+    slots = len(prices)
+    count = len(devices)
+    needed = np.empty(count, dtype=np.int64)
+    first = np.empty(count, dtype=np.int64)
+    last = np.empty(count, dtype=np.int64)
+    for i, d in enumerate(devices):
+        needed[i] = int(np.ceil(_number(d, 'runtime_minutes', minimum=0) / SLOT_MINUTES))
+        first[i] = int(_number(d, 'start_minutes', 0, minimum=0) // SLOT_MINUTES)
+        last[i] = min(slots, int(_number(d, 'deadline_minutes', slots * SLOT_MINUTES, minimum=0) // SLOT_MINUTES))
+
+    index = np.arange(slots)
+    allowed = (index >= first[:, None]) & (index < last[:, None])
+    available = allowed.sum(axis=1)
+    feasible = needed <= available
+    take = np.minimum(needed, available)
+
+    # Rank allowed slots by price (stable, so ties go to the earliest slot)
+    masked = np.where(allowed, prices, np.inf)
+    order = np.argsort(masked, axis=1, kind='stable')
+    ranks = np.empty_like(order)
+    np.put_along_axis(ranks, order, index[None, :].repeat(count, axis=0), axis=1)
+    on = allowed & (ranks < take[:, None])
+
+    baseline = allowed & (np.cumsum(allowed, axis=1) <= take[:, None])
+    return on, baseline, feasible
+
+
+def schedule_thermal(devices, prices, kwh_per_slot):
+    """
+    (on matrix, baseline matrix, feasible) for thermal devices
+    Baseline is a thermostat that only switches on when staying off would
+    leave the comfort band
+    """
+    slots = len(prices)
+    count = len(devices)
+    low = np.empty(count)
+    high = np.empty(count)
+    temp = np.empty(count)
+    cool = np.empty(count, dtype=np.int64)
+    warm = np.empty(count, dtype=np.int64)
+    for i, d in enumerate(devices):
+        low[i] = _number(d, 'comfort_min')
+        high[i] = _number(d, 'comfort_max')
+        if high[i] < low[i]:
+            raise ScheduleError(f"Device {d.get('id')!r}: comfort_max is below comfort_min")
+        if high[i] - low[i] > MAX_COMFORT_BAND:
+            raise ScheduleError(f"Device {d.get('id')!r}: comfort band is wider than {MAX_COMFORT_BAND:g} °C")
+        temp[i] = _number(d, 'temp', (low[i] + high[i]) / 2)
+        cool[i] = max(1, round(_number(d, 'cooling_per_hour', minimum=0) * SLOT_MINUTES / 60 / TEMP_STEP))
+        warm[i] = round(_number(d, 'warming_per_hour', 0, minimum=0) * SLOT_MINUTES / 60 / TEMP_STEP)
+
+    # State s is comfort_min + s * TEMP_STEP; rows are padded to the widest band
+    width = np.round((high - low) / TEMP_STEP).astype(np.int64)
+    states = int(width.max()) + 1
+    if slots * count * states > MAX_DP_CELLS:
+        raise ScheduleError(f"Too many thermal devices ({count}) for a {slots}-slot horizon with "
+                            f"{(states - 1) * TEMP_STEP:g} °C bands, split the request")
+    grid = np.arange(states)
+    rows = np.arange(count)[:, None]
+    valid = grid[None, :] <= width[:, None]
+    on_next = grid[None, :] - cool[:, None]
+    off_next = grid[None, :] + warm[:, None]
+    on_ok = valid & (on_next >= 0)
+    off_ok = valid & (off_next <= width[:, None])
+    on_next = np.clip(on_next, 0, states - 1)
+    off_next = np.clip(off_next, 0, states - 1)
+    slot_cost = prices[:, None] * kwh_per_slot[None, :]
+
+    # Backward pass: value[d, s] = cheapest cost from here to the horizon end
+    value = np.where(valid, 0.0, np.inf)
+    decisions = np.empty((slots, count, states), dtype=bool)
+    for t in range(slots - 1, -1, -1):
+        cost_on = np.where(on_ok, slot_cost[t][:, None] + value[rows, on_next], np.inf)
+        cost_off = np.where(off_ok, value[rows, off_next], np.inf)
+        decisions[t] = cost_on < cost_off
+        value = np.minimum(cost_on, cost_off)
+
+    # Forward pass from each room's current temperature
+    state = np.clip(np.round((temp - low) / TEMP_STEP).astype(np.int64), 0, width)
+    feasible = np.isfinite(value[np.arange(count), state])
+    on = np.empty((count, slots), dtype=bool)
+    baseline = np.empty((count, slots), dtype=bool)
+    base_state = state.copy()
+    for t in range(slots):
+        on[:, t] = decisions[t, np.arange(count), state]
+        state = np.clip(np.where(on[:, t], state - cool, state + warm), 0, width)
+        baseline[:, t] = base_state + warm > width
+        base_state = np.clip(np.where(baseline[:, t], base_state - cool, base_state + warm), 0, width)
+    return on, baseline, feasible
+
+
+def optimize(devices, prices, start_millis, slot_ms=SLOT_MINUTES * 60 * 1000):
+    """
+    Minimum-cost schedules for `devices` over the `prices` curve (¢/kWh per slot)
+    Returns per-device on-intervals with cost against the naive baseline
+    """
+    prices = np.asarray(prices, dtype=float)
+    if not isinstance(devices, list) or not devices:
+        raise ScheduleError("'devices' must be a non-empty list")
+    if len(devices) > MAX_DEVICES:
+        raise ScheduleError(f"At most {MAX_DEVICES} devices per request")
+    for i, d in enumerate(devices):
+        if not isinstance(d, dict):
+            raise ScheduleError(f"Device {i} must be an object")
+
+    kinds = {'shiftable': [], 'thermal': []}
+    for i, d in enumerate(devices):
+        kind = d.get('type', 'thermal' if 'comfort_min' in d else 'shiftable')
+        if kind not in kinds:
+            raise ScheduleError(f"Device {d.get('id', i)!r}: unknown type {kind!r}")
+        kinds[kind].append(i)
+
+    kwh = np.array([_number(d, 'watts', minimum=0) for d in devices]) * SLOT_MINUTES / 60 / 1000
+    on = np.zeros((len(devices), len(prices)), dtype=bool)
+    baseline = np.zeros_like(on)
+    feasible = np.ones(len(devices), dtype=bool)
+    for kind, index in kinds.items():
+        if not index:
+            continue
+        subset = [devices[i] for i in index]
+        if kind == 'shiftable':
+            result = schedule_shiftable(subset, prices)
+        else:
+            result = schedule_thermal(subset, prices, kwh[index])
+        on[index], baseline[index], feasible[index] = result
+
+    cost = (on * prices[None, :]).sum(axis=1) * kwh
+    base_cost = (baseline * prices[None, :]).sum(axis=1) * kwh
+    results = [
+        {
+            'id': d.get('id', i),
+            'room': d.get('room'),
+            'feasible': bool(feasible[i]),
+            'on': _runs(on[i], start_millis, slot_ms),
+            'energy_kwh': round(float(on[i].sum() * kwh[i]), 4),
+            'cost_cents': round(float(cost[i]), 3),
+            'baseline_cost_cents': round(float(base_cost[i]), 3)
+        }
+        for i, d in enumerate(devices)
+    ]
+    return {
+        'start': start_millis,
+        'step_ms': slot_ms,
+        'slots': len(prices),
+        'devices': results,
+        'total_cost_cents': round(float(cost.sum()), 3),
+        'total_savings_cents': round(float((base_cost - cost).sum()), 3)
+    }
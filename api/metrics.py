@@ -0,0 +1,288 @@
+"""
+In-process metrics in the Prometheus text exposition format
+Counters and fixed-bucket histograms are plain dicts updated under one
+short lock, so an observation costs about a microsecond and the registry
+can stay on in production. Values that other objects already count (cache
+hits, ingest totals) are read through callbacks at scrape time instead of
+being mirrored.
+
+Each gunicorn worker keeps its own registry; /metrics reports the worker
+that served the scrape, labelled with its pid. Fetch and loop metrics
+only move in the elected fetcher process.
+"""
+
+import cProfile
+import io
+import logging
+import pstats
+import random
+import time
+from bisect import bisect_left
+from collections import deque
+from functools import wraps
+from threading import Lock
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Seconds; spans a cached response (~100 µs) to a slow upstream fetch
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    pairs += [f'{n}="{v}"' for n, v in extra]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic count per label set"""
+
+    kind = 'counter'
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+
+    def samples(self):
+        with self._lock:
+            values = list(self._values.items())
+        return [(self.name, _labels(self.labelnames, k), v) for k, v in values]
+
+
+class Gauge(Counter):
+    """Point-in-time value per label set"""
+
+    kind = 'gauge'
+
+    def set(self, value, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Callback:
+    """
+    Metric read from `fn` at scrape time; fn returns a number, or a dict of
+    label value tuples -> numbers when labelnames are given
+    """
+
+    def __init__(self, name, help, fn, kind='gauge', labelnames=()):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.labelnames = tuple(labelnames)
+        self.fn = fn
+
+    def samples(self):
+        value = self.fn()
+        if value is None:
+            return []
+        if not self.labelnames:
+            return [(self.name, '', value)]
+        return [(self.name, _labels(self.labelnames, k), v) for k, v in value.items()]
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label set"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self._series = {}
+        self._lock = Lock()
+
+    def observe(self, value, *labels):
+        # Buckets are upper-inclusive (le), so the first bound >= value
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def time(self, *labels):
+        """Decorator recording each call's duration"""
+        def decorator(fn):
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self.observe(time.perf_counter() - start, *labels)
+            return wrapper
+        return decorator
+
+    def count(self, *labels):
+        series = self._series.get(labels)
+        return series[2] if series else 0
+
+    def samples(self):
+        with self._lock:
+            series = [(k, list(counts), total, n) for k, (counts, total, n) in self._series.items()]
+        out = []
+        for key, counts, total, n in series:
+            cumulative = 0
+            for bound, c in zip(self.buckets, counts):
+                cumulative += c
+                out.append((f'{self.name}_bucket', _labels(self.labelnames, key, [('le', _number(bound))]), cumulative))
+            out.append((f'{self.name}_sum', _labels(self.labelnames, key), total))
+            out.append((f'{self.name}_count', _labels(self.labelnames, key), n))
+        return out
+
+
+class Registry:
+    """Named metrics rendered together in the text exposition format"""
+
+    def __init__(self, const_labels=None):
+        self.const_labels = dict(const_labels or {})
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self.register(Counter(name, help, labelnames))
+
+    def gauge(self, name, help, labelnames=()):
+        return self.register(Gauge(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def callback(self, name, help, fn, kind='gauge', labelnames=()):
+        return self.register(Callback(name, help, fn, kind, labelnames))
+
+    def render(self):
+        const = ','.join(f'{k}="{_escape(v)}"' for k, v in self.const_labels.items())
+        lines = []
+        for metric in self._metrics:
+            try:
+                samples = metric.samples()
+            except Exception as e:
+                logger.warning(f"Skipping metric {metric.name}: {e}")
+                continue
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, labels, value in samples:
+                if const:
+                    labels = '{' + const + (',' + labels[1:] if labels else '}')
+                lines.append(f'{name}{labels} {_number(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+class InstrumentedLock:
+    """
+    threading.Lock that records how long callers waited for it
+    The uncontended path is a single non-blocking acquire, so only
+    contended acquisitions pay for timing.
+    """
+
+    def __init__(self, wait_histogram, name):
+        self._lock = Lock()
+        self._wait = wait_histogram
+        self.name = name
+        self.acquisitions = 0
+        self.contended = 0
+
+    def acquire(self, blocking=True, timeout=-1):
+        # Counters are only touched while holding the lock
+        if self._lock.acquire(False):
+            self.acquisitions += 1
+            return True
+        if not blocking:
+            return False
+        start = time.perf_counter()
+        acquired = self._lock.acquire(True, timeout)
+        self._wait.observe(time.perf_counter() - start, self.name)
+        if acquired:
+            self.acquisitions += 1
+            self.contended += 1
+        return acquired
+
+    def release(self):
+        self._lock.release()
+
+    def locked(self):
+        return self._lock.locked()
+
+    __enter__ = acquire
+
+    def __exit__(self, *exc):
+        self._lock.release()
+
+
+class RequestProfiler:
+    """
+    Profiles a random `sample_rate` fraction of requests with cProfile and
+    keeps the report for those slower than `slow_seconds`
+    Only one request is profiled at a time, so the cost is bounded even
+    at a high sample rate.
+    """
+
+    def __init__(self, sample_rate=0.0, slow_seconds=0.5, keep=20, top=25):
+        self.sample_rate = sample_rate
+        self.slow_seconds = slow_seconds
+        self.top = top
+        self.reports = deque(maxlen=keep)
+        self._busy = Lock()
+
+    @property
+    def enabled(self):
+        return self.sample_rate > 0
+
+    def start(self):
+        """A running profiler for this request, or None if it isn't sampled"""
+        if random.random() >= self.sample_rate or not self._busy.acquire(False):
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler (a debugger, say) is active
+            self._busy.release()
+            return None
+        return profile
+
+    def finish(self, profile, label, seconds):
+        """Stop `profile`; keeps and returns the report if the request was slow"""
+        profile.disable()
+        self._busy.release()
+        if seconds < self.slow_seconds:
+            return None
+        out = io.StringIO()
+        pstats.Stats(profile, stream=out).sort_stats('cumulative').print_stats(self.top)
+        report = {'route': label, 'seconds': round(seconds, 4), 'at': time.time(), 'stats': out.getvalue()}
+        self.reports.append(report)
+        logger.warning(f"Slow request {label} took {seconds * 1000:.0f} ms (profile kept)")
+        return report
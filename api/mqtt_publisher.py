@@ -0,0 +1,136 @@
+"""
+MQTT publisher for price updates
+Publishes each new compact ESP32 payload (p/t/a/o/ts/s) as a retained
+message so hubs get the current price on subscribe instead of polling
+/api/price/esp32. Keeps a bounded queue while the broker is unreachable
+and lets the MQTT client handle reconnects with backoff.
+"""
+
+import json
+import logging
+import os
+from collections import deque
+from threading import Condition, Event, Thread
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TOPIC = 'pricing/current'
+
+
+def mqtt_client_from_env(client_id):
+    """
+    paho client configured from MQTT_BROKER/MQTT_PORT/MQTT_USERNAME/
+    MQTT_PASSWORD/MQTT_TLS; connects (and reconnects) once its loop starts
+    """
+    import paho.mqtt.client as mqtt
+
+    client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=client_id)
+    if os.environ.get('MQTT_USERNAME'):
+        client.username_pw_set(os.environ['MQTT_USERNAME'], os.environ.get('MQTT_PASSWORD'))
+    if os.environ.get('MQTT_TLS', '').lower() in ('1', 'true', 'yes'):
+        client.tls_set()
+    client.reconnect_delay_set(min_delay=1, max_delay=60)
+    client.connect_async(os.environ.get('MQTT_BROKER', 'localhost'),
+                         int(os.environ.get('MQTT_PORT', 1883)), keepalive=60)
+    return client
+
+
+class PricePublisher:
+    """Background publisher of retained price messages"""
+
+    def __init__(self, client, topic=DEFAULT_TOPIC, qos=1, max_queue=32):
+        self.client = client
+        self.topic = topic
+        self.qos = qos
+        self.connected = False
+        self.published = 0
+        self.dropped = 0
+
+        self._queue = deque()
+        self._max_queue = max_queue
+        self._cond = Condition()
+        self._stop = Event()
+        self._thread = None
+
+        client.on_connect = self._on_connect
+        client.on_disconnect = self._on_disconnect
+
+    @classmethod
+    def from_env(cls):
+        """Build a publisher from MQTT_* environment variables, or None if MQTT_BROKER is unset"""
+        if not os.environ.get('MQTT_BROKER'):
+            return None
+        client = mqtt_client_from_env(os.environ.get('MQTT_CLIENT_ID', 'comed-pricing-api'))
+        return cls(client, topic=os.environ.get('MQTT_PRICE_TOPIC', DEFAULT_TOPIC))
+
+    def _on_connect(self, client, userdata, flags, reason_code, properties=None):
+        if getattr(reason_code, 'is_failure', False):
+            logger.warning(f"MQTT connect refused: {reason_code}")
+            return
+        logger.info("MQTT price publisher connected")
+        with self._cond:
+            self.connected = True
+            self._cond.notify_all()
+
+    def _on_disconnect(self, client, userdata, flags, reason_code, properties=None):
+        logger.warning(f"MQTT price publisher disconnected: {reason_code}")
+        with self._cond:
+            self.connected = False
+
+    def start(self):
+        """Start the network loop and publish thread"""
+        self.client.loop_start()
+        self._thread = Thread(target=self._run, name='mqtt-price-publisher', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop publishing and disconnect"""
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout=5)
+        self.client.disconnect()
+        self.client.loop_stop()
+
+    def publish(self, payload, topic=None):
+        """
+        Queue a payload dict for `topic` (default: the publisher's); oldest
+        entries are dropped once the queue is full
+        """
+        entry = (topic or self.topic, json.dumps(payload, separators=(',', ':')))
+        with self._cond:
+            if len(self._queue) >= self._max_queue:
+                self._queue.popleft()
+                self.dropped += 1
+            self._queue.append(entry)
+            self._cond.notify_all()
+
+    def pending(self):
+        """Number of queued messages not yet handed to the broker"""
+        with self._cond:
+            return len(self._queue)
+
+    def _run(self):
+        while not self._stop.is_set():
+            with self._cond:
+                self._cond.wait_for(
+                    lambda: self._stop.is_set() or (self.connected and self._queue),
+                    timeout=1.0
+                )
+                if self._stop.is_set() or not (self.connected and self._queue):
+                    continue
+                entry = self._queue[0]
+
+            topic, data = entry
+            info = self.client.publish(topic, data, qos=self.qos, retain=True)
+            if info.rc != 0:
+                # Leave it queued and retry shortly
+                logger.warning(f"MQTT publish failed (rc={info.rc}), will retry")
+                self._stop.wait(1.0)
+                continue
+
+            with self._cond:
+                if self._queue and self._queue[0] is entry:
+                    self._queue.popleft()
+                self.published += 1
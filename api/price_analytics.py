@@ -0,0 +1,231 @@
+"""
+Long-range price analytics over archived and live history
+Archived months are decompressed once into .npy column files and memory
+mapped, so a multi-year range costs a binary search per month plus the
+pages actually touched; only the live window comes from SQLite, in a
+single range query. On those arrays:
+
+- heatmap: mean price by local day of week x hour of day
+- distribution: overall and per-hour percentiles
+- tier durations: how long each tier lasted once entered, as a histogram
+
+Results are memoized per (range, time zone, tier policy) and reused until
+the archive files or the live rows in the range change.
+"""
+
+import os
+from collections import OrderedDict
+from datetime import datetime, timezone
+from threading import Lock
+
+import numpy as np
+
+from price_archive import archive_files, latest_unique, month_bounds, read_archive_file
+
+SLOT_MS = 5 * 60 * 1000
+HOUR_MS = 3600 * 1000
+DAY_MS = 24 * HOUR_MS
+# Readings further apart than this end a tier run
+MAX_GAP_MS = 2 * SLOT_MS
+PERCENTILES = (1, 5, 10, 25, 50, 75, 90, 95, 99)
+# Upper bounds (minutes) of the tier duration histogram bins
+DURATION_BINS = (5, 15, 30, 60, 120, 240, 480, 1440)
+WEEKDAYS = ('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun')
+
+
+class ArchiveColumns:
+    """Memory-mapped millisUTC/price columns for each archived month"""
+
+    def __init__(self, archive_dir, cache_dir=None):
+        self.archive_dir = archive_dir
+        self.cache_dir = cache_dir or os.path.join(archive_dir, 'columns')
+        self._months = {}            # path -> (source stat, millis, prices)
+        self._lock = Lock()
+
+    def signature(self):
+        """Changes whenever an archive file is added or appended to"""
+        return tuple((path, os.stat(path).st_mtime_ns) for _, path in archive_files(self.archive_dir))
+
+    def _load(self, path):
+        stat = os.stat(path)
+        source = (stat.st_mtime_ns, stat.st_size)
+        cached = self._months.get(path)
+        if cached is not None and cached[0] == source:
+            return cached[1], cached[2]
+
+        base = os.path.join(self.cache_dir, os.path.basename(path).split('.')[0])
+        files = (f'{base}.millis.npy', f'{base}.price.npy')
+        if not all(os.path.exists(f) and os.stat(f).st_mtime_ns >= stat.st_mtime_ns for f in files):
+            os.makedirs(self.cache_dir, exist_ok=True)
+            millis, prices, _ = read_archive_file(path)
+            for name, column in zip(files, (millis, prices)):
+                with open(name + '.tmp', 'wb') as f:
+                    np.save(f, column)
+                os.replace(name + '.tmp', name)
+        millis, prices = (np.load(f, mmap_mode='r') for f in files)
+        self._months[path] = (source, millis, prices)
+        return millis, prices
+
+    def columns(self, start_millis, end_millis):
+        """(millis, prices) archived in [start, end), oldest first"""
+        millis_parts, price_parts = [], []
+        with self._lock:
+            for month_start, path in archive_files(self.archive_dir):
+                if month_start >= end_millis or month_bounds(month_start)[1] <= start_millis:
+                    continue
+                millis, prices = self._load(path)
+                lo, hi = np.searchsorted(millis, [start_millis, end_millis])
+                millis_parts.append(millis[lo:hi])
+                price_parts.append(prices[lo:hi])
+        if not millis_parts:
+            return np.empty(0, np.int64), np.empty(0)
+        return np.concatenate(millis_parts), np.concatenate(price_parts)
+
+
+def _utc_offset_ms(tz, hour):
+    return int(datetime.fromtimestamp(hour * 3600, tz=timezone.utc).astimezone(tz).utcoffset().total_seconds() * 1000)
+
+
+def local_time(millis, tz):
+    """(day of week Mon=0, hour of day) arrays in time zone `tz`"""
+    hours = millis // HOUR_MS
+    first = int(hours.min()) // 24 * 24
+    days = (int(hours.max()) - first) // 24 + 1
+    # Offsets change at most a couple of times a year, so look them up per
+    # UTC day and only go hour by hour on days where they differ
+    start = np.array([_utc_offset_ms(tz, first + 24 * d) for d in range(days)], dtype=np.int64)
+    end = np.array([_utc_offset_ms(tz, first + 24 * d + 23) for d in range(days)], dtype=np.int64)
+    by_hour = np.repeat(start, 24)
+    for d in np.flatnonzero(start != end):
+        by_hour[d * 24:(d + 1) * 24] = [_utc_offset_ms(tz, first + 24 * int(d) + h) for h in range(24)]
+    local = millis + by_hour[hours - first]
+    # Epoch day 0 (1970-01-01) was a Thursday
+    return (local // DAY_MS + 3) % 7, (local // HOUR_MS) % 24
+
+
+def _round(values, digits=3):
+    return [None if np.isnan(v) else round(float(v), digits) for v in values]
+
+
+def heatmap(prices, weekday, hour):
+    """Mean price and sample count per (day of week, hour of day)"""
+    cell = weekday * 24 + hour
+    counts = np.bincount(cell, minlength=7 * 24)
+    sums = np.bincount(cell, weights=prices, minlength=7 * 24)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = (sums / counts).reshape(7, 24)
+    by_hour = np.bincount(hour, weights=prices, minlength=24) / np.maximum(np.bincount(hour, minlength=24), 1)
+    present = np.bincount(hour, minlength=24) > 0
+    order = [int(h) for h in np.argsort(np.where(present, by_hour, np.inf)) if present[h]]
+    return {
+        'days': list(WEEKDAYS),
+        'mean': [_round(row) for row in means],
+        'samples': counts.reshape(7, 24).tolist(),
+        'cheapest_hours': order[:3],
+        'priciest_hours': order[::-1][:3]
+    }
+
+
+def distribution(prices, hour):
+    """Overall and per-hour-of-day percentiles"""
+    # Radix sort on the small integer hours
+    order = np.argsort(hour.astype(np.int8), kind='stable')
+    sorted_hours = hour[order]
+    bounds = np.searchsorted(sorted_hours, np.arange(25))
+    by_hour = []
+    for h in range(24):
+        group = prices[order[bounds[h]:bounds[h + 1]]]
+        by_hour.append(_round(np.percentile(group, (10, 50, 90))) if len(group) else [None] * 3)
+    return {
+        'percentiles': dict(zip((f'p{p}' for p in PERCENTILES), _round(np.percentile(prices, PERCENTILES)))),
+        'mean': round(float(prices.mean()), 3),
+        'min': round(float(prices.min()), 3),
+        'max': round(float(prices.max()), 3),
+        'by_hour': {'percentiles': ['p10', 'p50', 'p90'], 'values': by_hour}
+    }
+
+
+def tier_durations(millis, tier_index, names):
+    """Per tier: number of runs, total hours, longest run and a run length histogram"""
+    breaks = np.flatnonzero((tier_index[1:] != tier_index[:-1]) | (np.diff(millis) > MAX_GAP_MS)) + 1
+    starts = np.r_[0, breaks]
+    ends = np.r_[breaks, len(millis)]
+    minutes = (millis[ends - 1] - millis[starts] + SLOT_MS) / 60000
+    run_tier = tier_index[starts]
+    bins = np.searchsorted(DURATION_BINS, minutes, side='left')
+    counts = np.zeros((len(names), len(DURATION_BINS) + 1), dtype=np.int64)
+    np.add.at(counts, (run_tier, bins), 1)
+    totals = np.bincount(run_tier, weights=minutes, minlength=len(names))
+    longest = np.zeros(len(names))
+    np.maximum.at(longest, run_tier, minutes)
+    return {
+        'bins_minutes': list(DURATION_BINS) + [None],
+        'tiers': {
+            name: {
+                'runs': int(counts[i].sum()),
+                'hours': round(float(totals[i]) / 60, 2),
+                'longest_minutes': float(longest[i]),
+                'histogram': counts[i].tolist()
+            }
+            for i, name in enumerate(names)
+        }
+    }
+
+
+def analyze(millis, prices, policy, tz):
+    """Heatmap, distribution and tier durations for sorted millis/price arrays"""
+    prices = np.asarray(prices, dtype=float)
+    weekday, hour = local_time(millis, tz)
+    return {
+        'samples': len(millis),
+        'first': int(millis[0]),
+        'last': int(millis[-1]),
+        'heatmap': heatmap(prices, weekday, hour),
+        'distribution': distribution(prices, hour),
+        'tier_durations': tier_durations(millis, policy.classify_many(prices), policy.names)
+    }
+
+
+class PriceAnalytics:
+    """Memoized analytics over the archive columns plus the live price table"""
+
+    def __init__(self, db, max_entries=32):
+        self.db = db
+        self.archive = ArchiveColumns(db.archive_dir)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._memo = OrderedDict()
+        self._lock = Lock()
+
+    def columns(self, start_millis, end_millis):
+        """(millis, prices) in [start, end) from the archive and the live table"""
+        archived_millis, archived_prices = self.archive.columns(start_millis, end_millis)
+        live_millis, live_prices = self.db.get_price_columns(start_millis, end_millis)
+        millis = np.concatenate([archived_millis, live_millis])
+        prices = np.concatenate([archived_prices, live_prices])
+        # A backfill can re-insert archived times until the next compaction
+        if len(archived_millis) and len(live_millis) and live_millis[0] <= archived_millis[-1]:
+            millis, prices = latest_unique(millis, prices)
+        return millis, prices
+
+    def get(self, start_millis, end_millis, policy, tz):
+        """Analytics for [start, end) or None if there are no prices in it"""
+        key = (start_millis, end_millis, policy.bounds, policy.names, str(tz))
+        version = (self.archive.signature(), self.db.get_price_range_version(start_millis, end_millis))
+        with self._lock:
+            entry = self._memo.get(key)
+            if entry is not None and entry[0] == version:
+                self._memo.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        millis, prices = self.columns(start_millis, end_millis)
+        result = analyze(millis, prices, policy, tz) if len(millis) else None
+        with self._lock:
+            self._memo[key] = (version, result)
+            self._memo.move_to_end(key)
+            while len(self._memo) > self.max_entries:
+                self._memo.popitem(last=False)
+        return result
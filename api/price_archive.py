@@ -0,0 +1,278 @@
+"""
+Price history compaction and archival
+Rows older than the retention window are rolled into hourly and daily
+aggregate tables, appended to a compressed columnar archive file per
+month and deleted from the live table, which keeps the hot database (and
+its page cache) to the few weeks the API and forecaster actually read.
+
+Archive files are concatenated gzip members, one per compaction run, each
+holding a chunk of
+
+    b'PRC1' | rows (uint32) | millisUTC int64[rows] | price float64[rows] | tier uint8[rows]
+
+Existing members are never rewritten. A crash between archiving and the
+delete, or a backfill re-importing an archived range, can archive a row
+twice; readers keep the last copy of each millisUTC, and the aggregate
+buckets a compaction touches are rebuilt from those de-duplicated rows.
+
+    python price_archive.py --db comed_prices.db [--retention-days 90] [--full-vacuum]
+"""
+
+import argparse
+import gzip
+import logging
+import os
+import re
+import struct
+from datetime import datetime, timezone
+
+import numpy as np
+
+from tier_policy import KNOWN_TIERS
+
+logger = logging.getLogger(__name__)
+
+CHUNK_MAGIC = b'PRC1'
+CHUNK_HEADER = struct.Struct('<4sI')
+
+# Tier stored per row as its KNOWN_TIERS index (255 = unknown)
+_TIER_INDEX = {name: i for i, name in enumerate(KNOWN_TIERS)}
+
+# resolution -> (table, bucket size in ms); buckets are UTC
+AGGREGATES = {
+    'hour': ('prices_hourly', 3600 * 1000),
+    'day': ('prices_daily', 24 * 3600 * 1000)
+}
+
+_FILE_RE = re.compile(r'^prices-(\d{4})-(\d{2})\.bin\.gz$')
+
+
+def default_archive_dir(db_path):
+    """archive/ next to the database file"""
+    return os.path.join(os.path.dirname(os.path.abspath(db_path)), 'archive')
+
+
+def month_bounds(millis):
+    """[start, end) of the UTC month containing millis"""
+    t = datetime.fromtimestamp(millis / 1000, tz=timezone.utc)
+    start = datetime(t.year, t.month, 1, tzinfo=timezone.utc)
+    end = datetime(t.year + t.month // 12, t.month % 12 + 1, 1, tzinfo=timezone.utc)
+    return int(start.timestamp() * 1000), int(end.timestamp() * 1000)
+
+
+def archive_path(archive_dir, millis):
+    t = datetime.fromtimestamp(millis / 1000, tz=timezone.utc)
+    return os.path.join(archive_dir, f'prices-{t.year:04d}-{t.month:02d}.bin.gz')
+
+
+def encode_chunk(millis, prices, tiers):
+    millis = np.asarray(millis, dtype='<i8')
+    return (CHUNK_HEADER.pack(CHUNK_MAGIC, len(millis)) + millis.tobytes() +
+            np.asarray(prices, dtype='<f8').tobytes() + np.asarray(tiers, dtype=np.uint8).tobytes())
+
+
+def decode_chunks(data):
+    """Raw (decompressed) archive bytes -> (millis, prices, tiers) arrays"""
+    millis, prices, tiers = [], [], []
+    offset = 0
+    while offset < len(data):
+        magic, rows = CHUNK_HEADER.unpack_from(data, offset)
+        if magic != CHUNK_MAGIC:
+            raise ValueError(f"Bad archive chunk at byte {offset}")
+        offset += CHUNK_HEADER.size
+        millis.append(np.frombuffer(data, '<i8', rows, offset))
+        offset += 8 * rows
+        prices.append(np.frombuffer(data, '<f8', rows, offset))
+        offset += 8 * rows
+        tiers.append(np.frombuffer(data, np.uint8, rows, offset))
+        offset += rows
+    if not millis:
+        return np.empty(0, np.int64), np.empty(0), np.empty(0, np.uint8)
+    return np.concatenate(millis), np.concatenate(prices), np.concatenate(tiers)
+
+
+def append_chunk(path, millis, prices, tiers):
+    """Append one compressed chunk; the file is swapped in atomically"""
+    member = gzip.compress(encode_chunk(millis, prices, tiers), compresslevel=9, mtime=0)
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as out:
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                out.write(f.read())
+        out.write(member)
+        out.flush()
+        os.fsync(out.fileno())
+    os.replace(tmp, path)
+
+
+def archive_files(archive_dir):
+    """[(month start millis, path)] of the archive, oldest first"""
+    if not os.path.isdir(archive_dir):
+        return []
+    files = []
+    for name in os.listdir(archive_dir):
+        match = _FILE_RE.match(name)
+        if match:
+            start = datetime(int(match[1]), int(match[2]), 1, tzinfo=timezone.utc)
+            files.append((int(start.timestamp() * 1000), os.path.join(archive_dir, name)))
+    return sorted(files)
+
+
+def latest_unique(millis, *columns):
+    """Sort by millis, keeping the last occurrence of each (later rows were written later)"""
+    order = np.argsort(millis, kind='stable')
+    millis = millis[order]
+    keep = np.ones(len(millis), dtype=bool)
+    keep[:-1] = millis[1:] != millis[:-1]
+    return (millis[keep],) + tuple(c[order][keep] for c in columns)
+
+
+def read_archive_file(path):
+    """(millis, prices, tiers) of one month file, sorted and de-duplicated"""
+    with open(path, 'rb') as f:
+        return latest_unique(*decode_chunks(gzip.decompress(f.read())))
+
+
+def read_archive(archive_dir, start_millis=None, end_millis=None):
+    """(millis, prices, tiers) with start <= millisUTC < end, sorted and de-duplicated"""
+    parts = []
+    for month_start, path in archive_files(archive_dir):
+        month_end = month_bounds(month_start)[1]
+        if (end_millis is not None and month_start >= end_millis) or \
+                (start_millis is not None and month_end <= start_millis):
+            continue
+        parts.append(read_archive_file(path))
+    if not parts:
+        return np.empty(0, np.int64), np.empty(0), np.empty(0, np.uint8)
+    # Months don't overlap, so per-file order is global order
+    millis, prices, tiers = (np.concatenate(c) for c in zip(*parts))
+    keep = np.ones(len(millis), dtype=bool)
+    if start_millis is not None:
+        keep &= millis >= start_millis
+    if end_millis is not None:
+        keep &= millis < end_millis
+    return millis[keep], prices[keep], tiers[keep]
+
+
+def bucket_aggregates(millis, prices, bucket_ms):
+    """[(bucket millis, samples, sum, min, max)] of sorted, de-duplicated prices"""
+    if not len(millis):
+        return []
+    buckets = millis // bucket_ms * bucket_ms
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    counts = np.diff(np.r_[starts, len(millis)])
+    return list(zip(buckets[starts].tolist(), counts.tolist(),
+                    np.add.reduceat(prices, starts).tolist(),
+                    np.minimum.reduceat(prices, starts).tolist(),
+                    np.maximum.reduceat(prices, starts).tolist()))
+
+
+def aggregate_sql(table):
+    """Upsert of one rebuilt bucket, replacing what the bucket held before"""
+    return f'''
+        INSERT INTO {table} (bucket_millis, samples, sum_price, min_price, max_price)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(bucket_millis) DO UPDATE SET
+            samples = excluded.samples,
+            sum_price = excluded.sum_price,
+            min_price = excluded.min_price,
+            max_price = excluded.max_price
+    '''
+
+
+def rebuild_aggregates(conn, archived, millis, prices):
+    """
+    Recompute every bucket that rows (millis, prices) fall in from those
+    rows plus the month's `archived` (millis, prices), each millisUTC
+    counted once, so re-imported rows don't add to the totals again
+    """
+    all_millis, all_prices = latest_unique(np.concatenate([archived[0], millis]),
+                                           np.concatenate([archived[1], prices]))
+    for table, bucket_ms in AGGREGATES.values():
+        touched = np.unique(millis // bucket_ms * bucket_ms)
+        keep = np.isin(all_millis // bucket_ms * bucket_ms, touched)
+        conn.executemany(aggregate_sql(table), bucket_aggregates(all_millis[keep], all_prices[keep], bucket_ms))
+
+
+def compact(pool, archive_dir, retention_days, now_millis):
+    """
+    Aggregate, archive and delete prices older than retention_days (cut at
+    a UTC midnight so every rolled-up day is complete); returns the number
+    of rows moved
+    """
+    day_ms = AGGREGATES['day'][1]
+    cutoff = (now_millis - retention_days * day_ms) // day_ms * day_ms
+    os.makedirs(archive_dir, exist_ok=True)
+    moved = 0
+    while True:
+        with pool.transaction() as conn:
+            # Hold the write lock from read to delete so a concurrent
+            # backfill can't slip rows in that would be deleted unarchived
+            conn.execute('BEGIN IMMEDIATE')
+            oldest = conn.execute('SELECT MIN(millisUTC) FROM prices WHERE millisUTC < ?',
+                                  (cutoff,)).fetchone()[0]
+            if oldest is None:
+                break
+            # One month (one archive file) per step
+            start, end = month_bounds(oldest)
+            end = min(end, cutoff)
+            rows = conn.execute('''
+                SELECT millisUTC, price_cents_per_kwh, tier FROM prices
+                WHERE millisUTC >= ? AND millisUTC < ? ORDER BY millisUTC
+            ''', (start, end)).fetchall()
+            millis = np.array([r[0] for r in rows], dtype=np.int64)
+            prices = np.array([r[1] for r in rows], dtype=float)
+            # UTC day and hour buckets never straddle a month, so the
+            # month's file holds everything archived in the touched buckets
+            path = archive_path(archive_dir, start)
+            archived = read_archive_file(path) if os.path.exists(path) else (np.empty(0, np.int64), np.empty(0))
+            rebuild_aggregates(conn, archived[:2], millis, prices)
+            conn.execute('DELETE FROM prices WHERE millisUTC >= ? AND millisUTC < ?', (start, end))
+            # Archive before committing the delete
+            append_chunk(path, millis, prices, [_TIER_INDEX.get(r[2], 255) for r in rows])
+        moved += len(rows)
+        logger.info(f"Archived {len(rows)} prices from {datetime.fromtimestamp(start / 1000, tz=timezone.utc):%Y-%m}")
+    return moved
+
+
+def vacuum(pool, full=False):
+    """
+    Return free pages to the filesystem; returns the number reclaimed
+    The first call converts the file to incremental auto-vacuum (which
+    needs one full VACUUM); after that only free pages are released unless
+    full=True also defragments.
+    """
+    with pool.connection() as conn:
+        before = conn.execute('PRAGMA page_count').fetchone()[0]
+        if full or conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+            conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            conn.execute('VACUUM')
+        else:
+            # execute() steps the pragma once (one page); executescript runs it to completion
+            conn.executescript('PRAGMA incremental_vacuum;')
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)').fetchall()
+        return before - conn.execute('PRAGMA page_count').fetchone()[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--db', default=os.environ.get('PRICE_DB_PATH', 'comed_prices.db'))
+    parser.add_argument('--archive-dir', default=os.environ.get('PRICE_ARCHIVE_DIR'),
+                        help='default: archive/ next to the database')
+    parser.add_argument('--retention-days', type=int, default=int(os.environ.get('PRICE_RETENTION_DAYS', 90)))
+    parser.add_argument('--full-vacuum', action='store_true', help='also defragment the database file')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    # Point the API module's database at the same file before importing it
+    os.environ['PRICE_DB_PATH'] = args.db
+    os.environ['PRICE_ARCHIVE_DIR'] = args.archive_dir or default_archive_dir(args.db)
+    from comed_pricing_api import db
+
+    result = db.compact(args.retention_days, full_vacuum=args.full_vacuum)
+    print(f"Archived {result['archived']} prices to {result['archive_dir']}, "
+          f"reclaimed {result['pages_freed']} pages")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+Upstream ComEd price fetcher
+Reuses one keep-alive HTTP session, retries transient failures with
+exponential backoff and full jitter, sends conditional request headers
+when the upstream provides validators, and schedules polls just after
+each 5-minute publication boundary.
+"""
+
+import logging
+import random
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Marker returned when the upstream answers 304 Not Modified
+NOT_MODIFIED = object()
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def seconds_until_next_poll(interval=300, delay=5, now=None):
+    """Seconds until `delay` seconds past the next multiple of `interval`"""
+    if now is None:
+        now = time.time()
+    remaining = interval - (now % interval) + delay
+    # Already inside the post-boundary delay of the current slot
+    if remaining > interval:
+        remaining -= interval
+    return remaining
+
+
+class ComEdFetcher:
+    """Session-pooled GET with retries for a ComEd pricing endpoint"""
+
+    def __init__(self, url, timeout=10, max_retries=4, backoff_base=1.0,
+                 backoff_max=30.0, session=None):
+        self.url = url
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=4)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+        self.session = session
+
+        self._etag = None
+        self._last_modified = None
+        self.retries = 0
+
+    def backoff(self, attempt):
+        """Full-jitter exponential backoff delay for a retry attempt"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def fetch(self, params=None):
+        """
+        GET the endpoint and return the decoded JSON, or NOT_MODIFIED
+        Raises requests.exceptions.RequestException once retries run out
+        """
+        headers = {}
+        if self._etag:
+            headers['If-None-Match'] = self._etag
+        if self._last_modified:
+            headers['If-Modified-Since'] = self._last_modified
+
+        response = self._get(params, headers)
+        if response.status_code == 304:
+            return NOT_MODIFIED
+        data = response.json()
+        self._etag = response.headers.get('ETag')
+        self._last_modified = response.headers.get('Last-Modified')
+        return data
+
+    def open_stream(self, params=None):
+        """GET with a streamed body; the caller reads and closes the response"""
+        return self._get(params, {}, stream=True)
+
+    def _get(self, params, headers, stream=False):
+        attempt = 0
+        while True:
+            try:
+                response = self.session.get(self.url, params=params, headers=headers,
+                                            timeout=self.timeout, stream=stream)
+                if response.status_code in RETRY_STATUSES:
+                    response.close()
+                    raise requests.exceptions.HTTPError(
+                        f"{response.status_code} from ComEd", response=response)
+                response.raise_for_status()
+                return response
+            except (requests.exceptions.ConnectionError,
+                    requests.exceptions.Timeout,
+                    requests.exceptions.HTTPError) as e:
+                status = getattr(e.response, 'status_code', None)
+                retryable = status is None or status in RETRY_STATUSES
+                if not retryable or attempt >= self.max_retries:
+                    raise
+                delay = self.backoff(attempt)
+                attempt += 1
+                self.retries += 1
+                logger.warning(f"ComEd request failed ({e}), retry {attempt} in {delay:.1f}s")
+                time.sleep(delay)
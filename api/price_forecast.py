@@ -0,0 +1,171 @@
+"""
+Seasonal exponential-smoothing price forecaster
+Prices are modelled as a week-of-5-minute-slots seasonal profile (shrunk
+towards the time-of-day profile where a weekly slot has little data) plus
+a short-term deviation that decays back to the profile over the horizon.
+Both parts are exponentially weighted: fit() computes them in closed form
+over the stored history with NumPy, and update() applies the equivalent
+recursive step for each new price, so requests never refit from scratch.
+Quantile bands come from the empirical distribution of recent residuals.
+Slots follow local (by default Central) time, like ComEd's prices, so the
+profile doesn't shift by an hour across DST changes.
+"""
+
+from datetime import datetime
+from threading import Lock
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+SLOT_MS = 5 * 60 * 1000
+HOUR_MS = 3600 * 1000
+DAY_SLOTS = 288
+WEEK_SLOTS = 7 * DAY_SLOTS
+QUANTILES = (0.1, 0.9)
+LOCAL_TZ = ZoneInfo('America/Chicago')
+
+
+def slots_of(millis, tz=LOCAL_TZ):
+    """5-minute slot index within the local week for epoch millis"""
+    millis = np.atleast_1d(np.asarray(millis, dtype=np.int64))
+    # UTC offsets only change on the hour, so look them up once per hour
+    hours, index = np.unique(millis // HOUR_MS, return_inverse=True)
+    offsets = np.array([datetime.fromtimestamp(int(h) * 3600, tz).utcoffset().total_seconds() * 1000
+                        for h in hours], dtype=np.int64)
+    return ((millis + offsets[index]) // SLOT_MS) % WEEK_SLOTS
+
+
+class PriceForecaster:
+    """
+    Incrementally maintained forecast model fed by PriceDatabase.insert_price
+    Like the rolling stats, samples must arrive in time order; anything
+    not newer than the last sample marks the model stale so the owner can
+    refit it from the database.
+    """
+
+    def __init__(self, week_decay=0.75, day_decay=0.9, shrinkage=2.0, alpha=0.8, phi=0.97,
+                 residual_window=2 * WEEK_SLOTS, tz=LOCAL_TZ):
+        self.week_decay = week_decay    # Per-sample decay of a weekly slot (~4 weeks memory)
+        self.day_decay = day_decay      # Per-sample decay of a time-of-day slot (~10 days)
+        self.shrinkage = shrinkage      # Pseudo-samples pulling weekly slots towards time-of-day
+        self.alpha = alpha              # Smoothing of the short-term deviation
+        self.phi = phi                  # Per-step decay of the deviation over the horizon
+        self.residual_window = residual_window
+        self.tz = tz
+        self._lock = Lock()
+        self.stale = False
+        self._reset()
+
+    def _reset(self):
+        self._week_sum = np.zeros(WEEK_SLOTS)
+        self._week_weight = np.zeros(WEEK_SLOTS)
+        self._day_sum = np.zeros(DAY_SLOTS)
+        self._day_weight = np.zeros(DAY_SLOTS)
+        self._residuals = np.zeros(self.residual_window)
+        self._residual_count = 0
+        self._deviation = 0.0
+        self.last_millis = None
+        self.samples = 0
+
+    @staticmethod
+    def _decay_weights(slots, decay):
+        """decay ** (number of later samples in the same slot), for time-ordered slots"""
+        order = np.lexsort((np.arange(len(slots)), slots))
+        sorted_slots = slots[order]
+        starts = np.flatnonzero(np.r_[True, sorted_slots[1:] != sorted_slots[:-1]])
+        counts = np.diff(np.r_[starts, len(slots)])
+        rank = np.arange(len(slots)) - np.repeat(starts, counts)
+        weights = np.empty(len(slots))
+        weights[order] = decay ** (np.repeat(counts, counts) - 1 - rank)
+        return weights
+
+    def _profile(self, week_slots):
+        """Seasonal expectation for an array of weekly slots"""
+        day_slots = week_slots % DAY_SLOTS
+        day_weight = self._day_weight[day_slots]
+        day_mean = np.divide(self._day_sum[day_slots], day_weight,
+                             out=np.zeros(len(day_slots)), where=day_weight > 0)
+        return ((self._week_sum[week_slots] + self.shrinkage * day_mean) /
+                (self._week_weight[week_slots] + self.shrinkage))
+
+    def fit(self, millis, prices):
+        """Fit from scratch on (millisUTC, price) arrays in ascending time order"""
+        millis = np.asarray(millis, dtype=np.int64)
+        prices = np.asarray(prices, dtype=float)
+        with self._lock:
+            self._reset()
+            self.stale = False
+            if len(millis) == 0:
+                return
+            week_slots = slots_of(millis, self.tz)
+            day_slots = week_slots % DAY_SLOTS
+
+            w = self._decay_weights(week_slots, self.week_decay)
+            self._week_sum = np.bincount(week_slots, w * prices, WEEK_SLOTS)
+            self._week_weight = np.bincount(week_slots, w, WEEK_SLOTS)
+            w = self._decay_weights(day_slots, self.day_decay)
+            self._day_sum = np.bincount(day_slots, w * prices, DAY_SLOTS)
+            self._day_weight = np.bincount(day_slots, w, DAY_SLOTS)
+
+            residuals = (prices - self._profile(week_slots))[-self.residual_window:]
+            self._residuals[:len(residuals)] = residuals
+            self._residual_count = len(residuals)
+
+            # Deviation as the recursive EWMA would leave it, including
+            # the extra decay across gaps between samples
+            steps = np.diff(millis[-64:]) // SLOT_MS
+            age = np.r_[np.cumsum(steps[::-1])[::-1], 0]
+            weights = self.alpha * (1 - self.alpha) ** np.arange(len(age))[::-1] * self.phi ** age
+            self._deviation = float(np.dot(weights, residuals[-len(age):]))
+
+            self.last_millis = int(millis[-1])
+            self.samples = len(millis)
+
+    def update(self, millis, price):
+        """Fold one new price into the model"""
+        with self._lock:
+            if self.last_millis is not None and millis <= self.last_millis:
+                self.stale = True
+                return
+            week_slot = int(slots_of(millis, self.tz)[0])
+            day_slot = week_slot % DAY_SLOTS
+            residual = price - float(self._profile(np.array([week_slot]))[0])
+
+            if self.last_millis is not None:
+                self._deviation *= self.phi ** ((millis - self.last_millis) // SLOT_MS)
+            self._deviation = self.alpha * residual + (1 - self.alpha) * self._deviation
+            self._residuals[self._residual_count % self.residual_window] = residual
+            self._residual_count += 1
+
+            self._week_sum[week_slot] = self._week_sum[week_slot] * self.week_decay + price
+            self._week_weight[week_slot] = self._week_weight[week_slot] * self.week_decay + 1
+            self._day_sum[day_slot] = self._day_sum[day_slot] * self.day_decay + price
+            self._day_weight[day_slot] = self._day_weight[day_slot] * self.day_decay + 1
+            self.last_millis = millis
+            self.samples += 1
+
+    def forecast(self, steps=DAY_SLOTS, now=None):
+        """
+        Point forecast and quantile bands for the `steps` 5-minute slots
+        after the later of the last sample and `now` (epoch millis), or
+        None before any data has been seen
+        """
+        with self._lock:
+            if self.last_millis is None:
+                return None
+            last_slot = self.last_millis // SLOT_MS
+            start = (max(last_slot, (now or 0) // SLOT_MS) + 1) * SLOT_MS
+            millis = start + SLOT_MS * np.arange(steps, dtype=np.int64)
+            # The deviation keeps decaying across a gap since the last sample
+            decay = self.phi ** np.arange(start // SLOT_MS - last_slot, start // SLOT_MS - last_slot + steps)
+            point = self._profile(slots_of(millis, self.tz)) + self._deviation * decay
+
+            residuals = self._residuals[:min(self._residual_count, self.residual_window)]
+            if len(residuals) > 1:
+                spread = np.quantile(residuals, QUANTILES) - np.median(residuals)
+            else:
+                spread = np.zeros(len(QUANTILES))
+            # Uncertainty grows from the one-step error towards the full residual spread
+            scale = np.sqrt(1 - decay ** 2)
+            bands = {f'p{int(q * 100)}': point + s * scale for q, s in zip(QUANTILES, spread)}
+            return dict(bands, start=int(start), step_ms=SLOT_MS, point=point, samples=self.samples)
@@ -0,0 +1,233 @@
+"""
+Price providers: one plugin per utility / market
+A provider knows how to fetch a market's latest price, parse it into
+(millisUTC, ¢/kWh) rows and which tier_policy.json group maps its tariff
+onto tiers. ComEd's real-time pricing and fixed time-of-use tariffs are
+built in; other providers are referenced as "module:Class" and must
+subclass PriceProvider.
+
+Markets are configured in a JSON file (PRICE_MARKETS_PATH); without one
+there is a single "comed" market:
+
+    {
+      "default": "comed",
+      "markets": {
+        "comed": {"provider": "comed"},
+        "west-campus": {"provider": "time_of_use", "tier_group": "west-campus",
+                        "tz": "America/New_York", "default_price": 7.2,
+                        "rates": [{"from": "00:00", "to": "07:00", "price": 3.4},
+                                  {"from": "14:00", "to": "19:00", "price": 16.0,
+                                   "days": ["mon", "tue", "wed", "thu", "fri"]}]},
+        "partner": {"provider": "partner_feed:PartnerProvider", "url": "..."}
+      }
+    }
+"""
+
+import importlib
+import json
+import re
+import time
+from datetime import datetime
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from backfill import fill_gap
+from price_fetcher import ComEdFetcher
+
+SLOT_MS = 5 * 60 * 1000
+WEEKDAYS = ('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun')
+
+# Market ids end up in file names and query strings
+_MARKET_RE = re.compile(r'^[a-z0-9][a-z0-9_-]{0,63}$')
+
+PROVIDERS = {}
+
+
+class ProviderError(ValueError):
+    """Invalid market / provider config"""
+
+
+def register_provider(cls):
+    """Class decorator making a provider available by its `kind` name"""
+    PROVIDERS[cls.kind] = cls
+    return cls
+
+
+class PriceProvider:
+    """
+    Base class for market price sources
+    Subclasses implement fetch() and parse(); backfill() is optional.
+    interval/publication_delay say when new prices appear (polls happen
+    publication_delay seconds after each multiple of interval).
+    """
+
+    kind = None
+    interval = 300
+    publication_delay = 5
+
+    def __init__(self, market, tier_group=None, label=None):
+        self.market = market
+        self.tier_group = tier_group
+        self.label = label or market
+
+    def fetch(self):
+        """
+        Raw latest-price data, or price_fetcher.NOT_MODIFIED
+        Raises requests.exceptions.RequestException on transport errors
+        """
+        raise NotImplementedError
+
+    def parse(self, raw):
+        """Raw data -> [(millisUTC, price ¢/kWh)]"""
+        raise NotImplementedError
+
+    def latest(self, raw):
+        """Newest (millisUTC, price) in the raw data, or None"""
+        rows = self.parse(raw)
+        return max(rows) if rows else None
+
+    def backfill(self, db, tier_fn):
+        """Fill history missed while nothing was polling; returns rows stored"""
+        return 0
+
+    def retries(self):
+        """Upstream retries so far, by endpoint"""
+        return {}
+
+    def describe(self):
+        return {
+            'market': self.market,
+            'label': self.label,
+            'provider': self.kind or f"{type(self).__module__}:{type(self).__name__}",
+            'tier_group': self.tier_group,
+            'interval_seconds': self.interval
+        }
+
+
+@register_provider
+class ComEdProvider(PriceProvider):
+    """ComEd hourly pricing API: current hour average, 5-minute feed for backfill"""
+
+    kind = 'comed'
+
+    def __init__(self, market, url='https://hourlypricing.comed.com/api', tier_group=None, label=None):
+        super().__init__(market, tier_group, label or 'ComEd Hourly Pricing')
+        self.url = url
+        self.fetcher = ComEdFetcher(f"{url}?type=currenthouraverage")
+        self.feed_fetcher = ComEdFetcher(url)
+
+    def fetch(self):
+        return self.fetcher.fetch()
+
+    def parse(self, raw):
+        return [(int(row.get('millisUTC', 0)), float(row.get('price', 0))) for row in raw or []]
+
+    def backfill(self, db, tier_fn):
+        return fill_gap(db, self.feed_fetcher, tier_fn)
+
+    def retries(self):
+        return {'current': self.fetcher.retries, 'feed': self.feed_fetcher.retries}
+
+
+def _minutes(value):
+    hours, minutes = (int(part) for part in str(value).split(':'))
+    if not (0 <= hours <= 24 and 0 <= minutes < 60) or hours * 60 + minutes > 1440:
+        raise ValueError(f"Bad time of day {value!r}")
+    return hours * 60 + minutes
+
+
+@register_provider
+class TimeOfUseProvider(PriceProvider):
+    """
+    Fixed time-of-use tariff evaluated locally for each 5-minute slot
+    Rates are checked in order and the first whose days and [from, to)
+    local time window match wins (windows may wrap past midnight);
+    otherwise default_price applies.
+    """
+
+    kind = 'time_of_use'
+    publication_delay = 0
+
+    def __init__(self, market, rates, default_price, tz='America/Chicago', tier_group=None,
+                 label=None, clock=time.time):
+        super().__init__(market, tier_group, label)
+        try:
+            self.tz = ZoneInfo(tz)
+        except (ZoneInfoNotFoundError, ValueError):
+            raise ProviderError(f"Market {market!r}: unknown time zone {tz!r}")
+        self.default_price = float(default_price)
+        self.clock = clock
+        self.rates = []
+        for rate in rates:
+            try:
+                days = frozenset(WEEKDAYS.index(day) for day in rate.get('days', WEEKDAYS))
+                self.rates.append((_minutes(rate['from']), _minutes(rate['to']), days, float(rate['price'])))
+            except (KeyError, TypeError, ValueError) as e:
+                raise ProviderError(f"Market {market!r}: bad rate {rate!r} ({e})")
+
+    def price_at(self, millis):
+        local = datetime.fromtimestamp(millis / 1000, tz=self.tz)
+        minute = local.hour * 60 + local.minute
+        for start, end, days, price in self.rates:
+            if local.weekday() not in days:
+                continue
+            if (start <= minute < end) if start <= end else (minute >= start or minute < end):
+                return price
+        return self.default_price
+
+    def fetch(self):
+        return int(self.clock() * 1000) // SLOT_MS * SLOT_MS
+
+    def parse(self, raw):
+        return [(raw, self.price_at(raw))]
+
+
+def provider_class(name):
+    """Registered provider kind or a "module:Class" plugin"""
+    if name in PROVIDERS:
+        return PROVIDERS[name]
+    if ':' not in name:
+        raise ProviderError(f"Unknown provider {name!r} (built in: {', '.join(sorted(PROVIDERS))})")
+    module, attr = name.split(':', 1)
+    try:
+        cls = getattr(importlib.import_module(module), attr)
+    except (ImportError, AttributeError) as e:
+        raise ProviderError(f"Can't load provider {name!r}: {e}")
+    if not (isinstance(cls, type) and issubclass(cls, PriceProvider)):
+        raise ProviderError(f"{name!r} is not a PriceProvider")
+    return cls
+
+
+def build_provider(market, config):
+    """Provider for one market entry of the config"""
+    if not _MARKET_RE.match(market):
+        raise ProviderError(f"Bad market id {market!r} (lowercase letters, digits, '-' and '_')")
+    if not isinstance(config, dict):
+        raise ProviderError(f"Market {market!r} must be an object")
+    options = dict(config)
+    cls = provider_class(options.pop('provider', 'comed'))
+    try:
+        return cls(market, **options)
+    except TypeError as e:
+        raise ProviderError(f"Market {market!r}: {e}")
+
+
+def load_markets(path=None, comed_url=None):
+    """(default market id, {market id: provider}) from a config file, or just ComEd"""
+    if path is None:
+        config = {'markets': {'comed': {'provider': 'comed'}}}
+    else:
+        with open(path) as f:
+            config = json.load(f)
+    markets = config.get('markets')
+    if not isinstance(markets, dict) or not markets:
+        raise ProviderError("Config needs a non-empty 'markets' object")
+
+    providers = {}
+    for market, options in markets.items():
+        if comed_url and isinstance(options, dict) and options.get('provider', 'comed') == 'comed':
+            options = dict(options, url=options.get('url', comed_url))
+        providers[market] = build_provider(market, options)
+    default = config.get('default', next(iter(providers)))
+    if default not in providers:
+        raise ProviderError(f"Default market {default!r} is not configured")
+    return default, providers
@@ -0,0 +1,119 @@
+"""
+Incrementally maintained rolling price statistics
+Answers AVG/MIN/MAX/COUNT over the last N hours (N up to a week) without
+scanning the prices table, using monotonic deques per window length
+"""
+
+from collections import deque
+from threading import Lock
+import time
+
+HOUR_MS = 3600 * 1000
+
+
+class _Window:
+    """Sliding window over (millisUTC, price) samples with O(1) min/max/avg"""
+
+    def __init__(self, span_ms):
+        self.span_ms = span_ms
+        self.samples = deque()
+        self.mins = deque()     # Prices non-decreasing from the left
+        self.maxs = deque()     # Prices non-increasing from the left
+        self.total = 0.0
+
+    def push(self, millis, price):
+        self.samples.append((millis, price))
+        self.total += price
+        while self.mins and self.mins[-1][1] > price:
+            self.mins.pop()
+        self.mins.append((millis, price))
+        while self.maxs and self.maxs[-1][1] < price:
+            self.maxs.pop()
+        self.maxs.append((millis, price))
+
+    def evict(self, now_ms):
+        cutoff = now_ms - self.span_ms
+        while self.samples and self.samples[0][0] <= cutoff:
+            self.total -= self.samples.popleft()[1]
+        while self.mins and self.mins[0][0] <= cutoff:
+            self.mins.popleft()
+        while self.maxs and self.maxs[0][0] <= cutoff:
+            self.maxs.popleft()
+        if not self.samples:
+            self.total = 0.0    # Drop accumulated float error
+
+    def stats(self):
+        count = len(self.samples)
+        if count == 0:
+            return {'avg_price': 0, 'min_price': 0, 'max_price': 0, 'sample_count': 0}
+        return {
+            'avg_price': self.total / count,
+            'min_price': self.mins[0][1],
+            'max_price': self.maxs[0][1],
+            'sample_count': count
+        }
+
+
+class RollingPriceStats:
+    """
+    Per-window rolling aggregates fed by PriceDatabase.insert_price
+    Windows are created lazily for each whole number of hours requested
+    and kept up to date on every insert. Samples must arrive in time
+    order; anything not newer than the latest sample (including upserts
+    of an existing timestamp) marks the rollup stale so the owner can
+    rebuild it from the database.
+    """
+
+    def __init__(self, max_hours=168):
+        self.max_hours = max_hours
+        self._lock = Lock()
+        self._base = _Window(max_hours * HOUR_MS)
+        self._windows = {}
+        self._last_millis = None
+        self.stale = False
+
+    def supports(self, hours):
+        """True if stats for this window can be served from memory"""
+        return isinstance(hours, int) and 0 < hours <= self.max_hours
+
+    def reset(self, rows):
+        """Rebuild from (millisUTC, price) rows in ascending time order"""
+        with self._lock:
+            self._base = _Window(self.max_hours * HOUR_MS)
+            self._windows = {}
+            self._last_millis = None
+            self.stale = False
+            for millis, price in rows:
+                self._push(millis, price)
+
+    def add(self, millis, price):
+        """Record a newly inserted price"""
+        with self._lock:
+            if self._last_millis is not None and millis <= self._last_millis:
+                self.stale = True
+                return
+            self._push(millis, price)
+
+    def _push(self, millis, price):
+        self._last_millis = millis
+        # Evicting on push bounds memory even for windows nobody queries
+        for window in (self._base, *self._windows.values()):
+            window.push(millis, price)
+            window.evict(millis)
+
+    def stats(self, hours, now_ms=None):
+        """Summary of prices with millisUTC within the last `hours` hours"""
+        if not self.supports(hours):
+            raise ValueError(f"Window of {hours}h not supported (max {self.max_hours}h)")
+        if now_ms is None:
+            now_ms = int(time.time() * 1000)
+
+        with self._lock:
+            window = self._windows.get(hours)
+            if window is None:
+                window = _Window(hours * HOUR_MS)
+                for millis, price in self._base.samples:
+                    window.push(millis, price)
+                self._windows[hours] = window
+            window.evict(now_ms)
+            return window.stats()
@@ -0,0 +1,110 @@
+"""
+One scheduler for every market's price polls
+A single thread keeps a heap of (next poll time, market) and hands due
+polls to a small shared worker pool, so markets are polled concurrently
+and a slow or failing provider never delays the others. Adding a market
+adds a heap entry, not a thread. Each market is polled just after its
+provider's publication boundary and re-checked a few times if the poll
+didn't bring a new price (late publication or an error).
+"""
+
+import heapq
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import count
+from threading import Condition, Event, Thread
+
+from price_fetcher import seconds_until_next_poll
+
+logger = logging.getLogger(__name__)
+
+
+class PollScheduler:
+    """
+    Calls `poll(market)` for each added market on its schedule; poll
+    returns True once the market has a new price. `on_poll(market, due)`
+    runs before each poll (e.g. to record scheduling lag).
+    """
+
+    def __init__(self, poll, max_workers=4, recheck_delay=15, recheck_attempts=3, on_poll=None):
+        self.poll = poll
+        self.recheck_delay = recheck_delay
+        self.recheck_attempts = recheck_attempts
+        self.on_poll = on_poll
+        self.polls = {}
+        self.errors = {}
+        self._schedules = {}         # market -> (interval, delay)
+        self._rechecks = {}
+        self._heap = []
+        self._seq = count()
+        self._cond = Condition()
+        self._stop = Event()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='price-poll')
+
+    def add(self, market, interval=300, delay=5, first_at=None):
+        """Schedule a market, first polled at first_at (default: now)"""
+        with self._cond:
+            self._schedules[market] = (interval, delay)
+            self._rechecks[market] = 0
+            self.polls.setdefault(market, 0)
+            self.errors.setdefault(market, 0)
+            self._push(time.time() if first_at is None else first_at, market)
+
+    def _push(self, due, market):
+        heapq.heappush(self._heap, (due, next(self._seq), market))
+        self._cond.notify_all()
+
+    def next_due(self):
+        """Earliest scheduled poll time, or None"""
+        with self._cond:
+            return self._heap[0][0] if self._heap else None
+
+    def run_pending(self, now=None):
+        """Start every poll that is due; returns their futures"""
+        now = time.time() if now is None else now
+        due = []
+        with self._cond:
+            while self._heap and self._heap[0][0] <= now:
+                due.append(heapq.heappop(self._heap))
+        return [self._pool.submit(self._run, market, at) for at, _, market in due]
+
+    def _run(self, market, due):
+        if self.on_poll is not None:
+            self.on_poll(market, due)
+        try:
+            advanced = bool(self.poll(market))
+        except Exception as e:
+            logger.error(f"Polling {market} failed: {e}")
+            advanced = False
+            self.errors[market] += 1
+        self.polls[market] += 1
+
+        now = time.time()
+        with self._cond:
+            interval, delay = self._schedules[market]
+            if not advanced and self._rechecks[market] < self.recheck_attempts:
+                self._rechecks[market] += 1
+                self._push(now + self.recheck_delay, market)
+            else:
+                self._rechecks[market] = 0
+                self._push(now + seconds_until_next_poll(interval, delay, now), market)
+        return advanced
+
+    def run_forever(self):
+        while not self._stop.is_set():
+            with self._cond:
+                timeout = self._heap[0][0] - time.time() if self._heap else None
+                if timeout is None or timeout > 0:
+                    self._cond.wait(timeout)
+            self.run_pending()
+
+    def start(self):
+        """Run the scheduler in a daemon thread"""
+        Thread(target=self.run_forever, name='price-scheduler', daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        self._pool.shutdown(wait=False)
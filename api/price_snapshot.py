@@ -0,0 +1,69 @@
+"""
+Immutable current-price snapshots
+Each price update builds a new PriceSnapshot holding the state plus every
+representation the read endpoints serve (full JSON, compact ESP32 JSON,
+esp32_binary bytes and their ETags), then publishes it with a single
+reference assignment. Readers grab the reference once and use it without
+taking a lock or serializing anything; a reader that grabbed the previous
+snapshot just finishes with the previous, still consistent, state.
+"""
+
+import hashlib
+import json
+from types import MappingProxyType
+
+import esp32_binary
+
+INITIAL_STATE = {
+    'price_cents_per_kwh': 0.0,
+    'timestamp': None,
+    'status': 'initializing',
+    'tier': 'unknown',
+    'recommendation': 'normal'
+}
+
+
+def esp32_payload(data):
+    """Compact ESP32 payload from a price state dict"""
+    # Before the first successful fetch 'recommendation' is a plain string
+    rec = data['recommendation'] if isinstance(data['recommendation'], dict) else {}
+    return {
+        'p': round(data['price_cents_per_kwh'], 2),   # price
+        't': data['tier'],                             # tier
+        'a': rec.get('action', 'normal'),              # action
+        'o': rec.get('suggested_temp_offset', 0),      # temp offset
+        'ts': data.get('millisUTC'),                   # timestamp
+        's': data['status']                            # status
+    }
+
+
+def _etag(body):
+    return hashlib.sha1(body).hexdigest()[:20]
+
+
+class PriceSnapshot:
+    """One price state and its pre-serialized responses; never mutated after construction"""
+
+    __slots__ = ('data', 'esp32', 'json', 'esp32_json', 'esp32_bin',
+                 'etag', 'esp32_etag', 'esp32_bin_etag')
+
+    def __init__(self, data):
+        data = dict(data)
+        esp32 = esp32_payload(data)
+        set_ = object.__setattr__
+        set_(self, 'data', MappingProxyType(data))
+        set_(self, 'esp32', MappingProxyType(esp32))
+        # Same compact, key-sorted form as jsonify
+        set_(self, 'json', json.dumps(data, separators=(',', ':'), sort_keys=True).encode())
+        set_(self, 'esp32_json', json.dumps(esp32, separators=(',', ':'), sort_keys=True).encode())
+        set_(self, 'esp32_bin', esp32_binary.encode(esp32))
+        set_(self, 'etag', _etag(self.json))
+        set_(self, 'esp32_etag', _etag(self.esp32_json))
+        set_(self, 'esp32_bin_etag', _etag(self.esp32_bin))
+
+    def __setattr__(self, name, value):
+        raise AttributeError('PriceSnapshot is immutable, build a new one')
+
+    def replace(self, **changes):
+        """New snapshot with some state fields changed"""
+        return PriceSnapshot(dict(self.data, **changes))
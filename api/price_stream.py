@@ -0,0 +1,102 @@
+"""
+Push delivery of price updates over Server-Sent Events and long-polling
+fetch_comed_price publishes each new compact ESP32 payload here; waiting
+clients block on a single shared Condition instead of re-polling, and
+all of them are sent the same pre-serialized bytes. Listeners (the
+evented stream_server.py) are handed each payload as it is published.
+Streams served by Flask hold a worker thread each, so StreamSlots caps
+how many a worker serves that way.
+"""
+
+import json
+from threading import Condition, Lock
+
+
+class PriceBroadcaster:
+    """Latest price payload plus a condition that wakes all subscribers"""
+
+    def __init__(self):
+        self._cond = Condition()
+        self.sequence = 0
+        self.millis = None
+        self.payload = None
+        self.subscribers = 0
+        self.listeners = []
+
+    def publish(self, millis, payload):
+        """Store a new payload dict and wake every waiting subscriber"""
+        data = json.dumps(payload, separators=(',', ':'))
+        with self._cond:
+            self.sequence += 1
+            self.millis = millis
+            self.payload = data
+            self._cond.notify_all()
+        for listener in self.listeners:
+            listener(millis, data)
+
+    def wait(self, last_sequence, timeout):
+        """Block until a publish after last_sequence; returns (sequence, millis, payload)"""
+        with self._cond:
+            self._cond.wait_for(lambda: self.sequence != last_sequence, timeout)
+            return self.sequence, self.millis, self.payload
+
+    def wait_newer_than(self, since_millis, timeout):
+        """Long-poll: payload for a price newer than since_millis, or None on timeout"""
+        with self._cond:
+            self.subscribers += 1
+            try:
+                ready = self._cond.wait_for(
+                    lambda: self.millis is not None and self.millis > since_millis,
+                    timeout
+                )
+            finally:
+                self.subscribers -= 1
+            return self.payload if ready else None
+
+    def sse_events(self, last_event_id=None, heartbeat=15):
+        """
+        Generator of SSE frames: the current price right away (unless the
+        client already has it per Last-Event-ID), then each new price as
+        it is published, with comment heartbeats to keep proxies open
+        """
+        with self._cond:
+            self.subscribers += 1
+        try:
+            sequence = 0
+            while True:
+                new_sequence, millis, payload = self.wait(sequence, heartbeat)
+                if new_sequence == sequence or payload is None:
+                    yield ': keepalive\n\n'
+                    continue
+                sequence = new_sequence
+                if last_event_id is not None and str(millis) == last_event_id:
+                    last_event_id = None
+                    continue
+                last_event_id = None
+                yield f'id: {millis}\nevent: price\ndata: {payload}\n\n'
+        finally:
+            with self._cond:
+                self.subscribers -= 1
+
+
+class StreamSlots:
+    """Non-blocking counter of open streams, shared by every market in a worker"""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.active = 0
+        self.rejected = 0
+        self._lock = Lock()
+
+    def acquire(self):
+        """Take a slot; False (and counted as rejected) when all are in use"""
+        with self._lock:
+            if self.active >= self.limit:
+                self.rejected += 1
+                return False
+            self.active += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.active -= 1
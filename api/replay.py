@@ -0,0 +1,288 @@
+"""
+Historical replay simulator for savings estimates
+Streams stored 5-minute prices through determine_price_tier and
+get_recommendation and the eco-mode control rules (batch_control.py) for
+N rooms, comparing fan/lamp energy and cost against rooms that simply
+switch on whenever occupied. Room telemetry is synthetic, or recorded
+telemetry repeated week by week. Rooms are simulated a day at a time as
+NumPy arrays and sharded across worker processes.
+
+    python replay.py --db comed_prices.db --rooms 1000 --days 365
+    python replay.py --synthetic-prices --rooms 1000 --days 365 --workers 4
+"""
+
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+
+from batch_control import TIERS, switch_on
+from price_archive import default_archive_dir, read_archive
+
+logger = logging.getLogger(__name__)
+
+SLOT_MS = 5 * 60 * 1000
+DAY_SLOTS = 288
+DAY_MS = DAY_SLOTS * SLOT_MS
+WEEK_SLOTS = 7 * DAY_SLOTS
+BLOCK_ROOMS = 100           # Rooms per RNG block, so results don't depend on --workers
+LOCAL_OFFSET_HOURS = -6     # Central standard time, for daily occupancy/temperature shape
+
+# Hourly probability that a dorm room is occupied (local time)
+OCCUPANCY_BY_HOUR = np.array([0.9, 0.9, 0.9, 0.9, 0.9, 0.9, 0.85, 0.7, 0.5, 0.35, 0.3, 0.3,
+                              0.35, 0.3, 0.3, 0.35, 0.45, 0.6, 0.7, 0.75, 0.8, 0.85, 0.9, 0.9])
+
+
+def synthetic_prices(days, start_millis=1704067200000, seed=0):
+    """ComEd-like 5-minute prices: daily and weekday shape, AR(1) noise and occasional spikes"""
+    rng = np.random.default_rng(seed)
+    n = days * DAY_SLOTS
+    millis = start_millis + SLOT_MS * np.arange(n, dtype=np.int64)
+    hour = (millis // 3600000 + LOCAL_OFFSET_HOURS) % 24
+    weekday = (millis // DAY_MS + 3) % 7 < 5
+    noise = np.zeros(n)
+    shocks = rng.normal(0, 0.5, n)
+    for i in range(1, n):
+        noise[i] = 0.92 * noise[i - 1] + shocks[i]
+    spikes = np.where(rng.random(n) < 0.002, rng.exponential(15, n), 0)
+    prices = 3.5 + 2.5 * np.exp(-((hour - 17) / 3) ** 2) + 0.8 * weekday + noise + spikes
+    return millis, np.round(prices, 1)
+
+
+def stored_prices(db_path, start_millis, end_millis, archive_dir=None):
+    """(millis, prices) from the live table plus any compacted into the archive"""
+    conn = sqlite3.connect(db_path)
+    try:
+        rows = conn.execute('''
+            SELECT millisUTC, price_cents_per_kwh FROM prices
+            WHERE millisUTC >= ? AND millisUTC < ? ORDER BY millisUTC
+        ''', (start_millis, end_millis)).fetchall()
+    finally:
+        conn.close()
+    archived_millis, archived_prices, _ = read_archive(archive_dir or default_archive_dir(db_path),
+                                                       start_millis, end_millis)
+    millis = np.concatenate([archived_millis, np.array([r[0] for r in rows], dtype=np.int64)])
+    prices = np.concatenate([archived_prices, np.array([r[1] for r in rows], dtype=float)])
+    order = np.argsort(millis, kind='stable')
+    return millis[order], prices[order]
+
+
+def price_grid(millis, prices, start_millis, days):
+    """Prices on a regular 5-minute grid of whole days, carrying the last price across gaps"""
+    grid = start_millis + SLOT_MS * np.arange(days * DAY_SLOTS, dtype=np.int64)
+    index = np.searchsorted(millis, grid, side='right') - 1
+    # Slots before the first stored price take the first price
+    return grid, prices[np.clip(index, 0, len(prices) - 1)]
+
+
+def tier_indices(prices, tier_fn):
+    """Tier index per slot via tier_fn, evaluated once per distinct price"""
+    unique, inverse = np.unique(prices, return_inverse=True)
+    lookup = np.array([TIERS.index(tier_fn(float(p))) for p in unique])
+    return lookup[inverse]
+
+
+def recorded_telemetry(store, start_millis, end_millis):
+    """
+    (temp °C, occupied, power W) arrays of shape (slots, rooms) for every
+    recorded room on the 5-minute grid, from the telemetry rollups
+    """
+    slots = (end_millis - start_millis) // SLOT_MS
+    rooms = store.rooms()
+    temp = np.full((slots, len(rooms)), np.nan)
+    occupied = np.zeros((slots, len(rooms)), dtype=bool)
+    power = np.zeros((slots, len(rooms)))
+    for r, room in enumerate(rooms):
+        history = store.get_history(room, start_millis, end_millis, max_points=slots)
+        step_hours = history['resolution_seconds'] / 3600
+        for point in history['points']:
+            i = (point['millisUTC'] - start_millis) // SLOT_MS
+            span = slice(max(0, i), max(0, i) + max(1, int(step_hours * 12)))
+            temp[span, r] = point['temp_avg_c'] if point['temp_avg_c'] is not None else np.nan
+            occupied[span, r] = point['occupancy'] >= 0.5
+            power[span, r] = point['energy_kwh'] * 1000 / step_hours
+    # Carry the last temperature forward across gaps
+    for r in range(len(rooms)):
+        valid = np.flatnonzero(~np.isnan(temp[:, r]))
+        if len(valid):
+            temp[:, r] = temp[valid[np.clip(np.searchsorted(valid, np.arange(slots), side='right') - 1, 0, None)], r]
+    return rooms, temp, occupied, power
+
+
+def synthetic_rooms(seed, block, count, day_millis):
+    """One day of synthetic (temp, occupied, power) for `count` rooms of an RNG block"""
+    traits = np.random.default_rng([seed, block])
+    temp_offset = traits.normal(0, 1.0, count)
+    presence = traits.uniform(0.7, 1.1, count)
+    base_watts = traits.lognormal(np.log(120), 0.4, count)
+
+    rng = np.random.default_rng([seed, block, day_millis // DAY_MS])
+    millis = day_millis + SLOT_MS * np.arange(DAY_SLOTS, dtype=np.int64)
+    local_hour = (millis // 3600000 + LOCAL_OFFSET_HOURS) % 24
+    day_of_year = datetime.fromtimestamp(day_millis / 1000, tz=timezone.utc).timetuple().tm_yday
+
+    # Occupancy and heavy loads change hourly, not every 5 minutes
+    utc_hours_local = (np.arange(24) + LOCAL_OFFSET_HOURS) % 24
+    hourly = rng.random((24, count)) < OCCUPANCY_BY_HOUR[utc_hours_local][:, None] * presence
+    occupied = np.repeat(hourly, 12, axis=0)
+    heavy = rng.random((24, count)) < 0.08
+    power = np.repeat(base_watts * rng.lognormal(0, 0.2, (24, count)) + heavy * 900, 12, axis=0)
+
+    seasonal = 23 + 3 * np.sin(2 * np.pi * (day_of_year - 110) / 365)
+    daily = 1.5 * np.sin(2 * np.pi * (local_hour - 9) / 24)
+    # float32 noise: drawing normals is most of the simulation's cost
+    noise = rng.standard_normal((DAY_SLOTS, count), dtype=np.float32) * np.float32(0.3)
+    temp = noise + (seasonal + daily[:, None] + temp_offset).astype(np.float32)
+    return temp, occupied, power
+
+
+def _simulate_shard(task):
+    """Sum energy/cost per month for a set of room blocks (runs in a worker process)"""
+    (blocks, rooms, prices, tiers, day_starts, months, month_count,
+     device_watts, seed, recorded) = task
+    kwh_per_slot = device_watts * SLOT_MS / 3600000 / 1000
+    totals = {key: np.zeros(month_count) for key in ('eco_kwh', 'base_kwh', 'eco_cost', 'base_cost')}
+    on_slots = 0
+
+    for d, day_millis in enumerate(day_starts):
+        day = slice(d * DAY_SLOTS, (d + 1) * DAY_SLOTS)
+        day_prices = prices[day] / 100      # $/kWh
+        day_tiers = tiers[day][:, None]
+        for block in blocks:
+            first = block * BLOCK_ROOMS
+            count = min(BLOCK_ROOMS, rooms - first)
+            if recorded is not None:
+                # Recorded rooms repeat round-robin; recorded time repeats week by week
+                rec_temp, rec_occupied, rec_power = recorded
+                cols = np.arange(first, first + count) % rec_temp.shape[1]
+                rows = np.arange(d * DAY_SLOTS, (d + 1) * DAY_SLOTS) % rec_temp.shape[0]
+                temp, occupied, power = rec_temp[np.ix_(rows, cols)], rec_occupied[np.ix_(rows, cols)], rec_power[np.ix_(rows, cols)]
+            else:
+                temp, occupied, power = synthetic_rooms(seed, block, count, day_millis)
+
+            eco = switch_on(day_tiers, temp, occupied, power)
+            eco_slots = eco.sum(axis=1)
+            base_slots = occupied.sum(axis=1)
+            month = months[d]
+            totals['eco_kwh'][month] += eco_slots.sum() * kwh_per_slot
+            totals['base_kwh'][month] += base_slots.sum() * kwh_per_slot
+            totals['eco_cost'][month] += eco_slots @ day_prices * kwh_per_slot
+            totals['base_cost'][month] += base_slots @ day_prices * kwh_per_slot
+            on_slots += int(eco_slots.sum())
+    return totals, on_slots
+
+
+def replay(grid_millis, prices, tier_fn, recommend_fn, rooms=1000, device_watts=100,
+           workers=None, seed=0, recorded=None):
+    """Simulate `rooms` rooms over whole days of 5-minute prices; returns a summary dict"""
+    started = time.perf_counter()
+    days = len(prices) // DAY_SLOTS
+    tiers = tier_indices(prices, tier_fn)
+    day_starts = grid_millis[::DAY_SLOTS][:days]
+    labels = [datetime.fromtimestamp(m / 1000, tz=timezone.utc).strftime('%Y-%m') for m in day_starts]
+    month_names = sorted(set(labels))
+    months = np.array([month_names.index(label) for label in labels])
+
+    blocks = list(range((rooms + BLOCK_ROOMS - 1) // BLOCK_ROOMS))
+    workers = max(1, min(workers or os.cpu_count() or 1, len(blocks)))
+    tasks = [(blocks[i::workers], rooms, prices, tiers, day_starts, months, len(month_names),
+              device_watts, seed, recorded) for i in range(workers)]
+    if workers == 1:
+        results = [_simulate_shard(tasks[0])]
+    else:
+        with ProcessPoolExecutor(workers) as pool:
+            results = list(pool.map(_simulate_shard, tasks))
+
+    totals = {key: sum(r[0][key] for r in results) for key in results[0][0]}
+    tier_hours = np.bincount(tiers, minlength=len(TIERS)) / 12
+    action_hours = {}
+    for tier, hours in zip(TIERS, tier_hours):
+        action = recommend_fn(tier, None)['action']
+        action_hours[action] = action_hours.get(action, 0) + round(float(hours), 1)
+
+    eco_cost, base_cost = float(totals['eco_cost'].sum()), float(totals['base_cost'].sum())
+    return {
+        'rooms': rooms,
+        'days': days,
+        'room_steps': rooms * days * DAY_SLOTS,
+        'eco': {'energy_kwh': round(float(totals['eco_kwh'].sum()), 1), 'cost_usd': round(eco_cost, 2)},
+        'baseline': {'energy_kwh': round(float(totals['base_kwh'].sum()), 1), 'cost_usd': round(base_cost, 2)},
+        'savings_usd': round(base_cost - eco_cost, 2),
+        'savings_pct': round((base_cost - eco_cost) / base_cost * 100, 1) if base_cost else 0.0,
+        'savings_per_room_usd': round((base_cost - eco_cost) / rooms, 2),
+        'monthly': [
+            {'month': name, 'eco_cost_usd': round(float(totals['eco_cost'][m]), 2),
+             'baseline_cost_usd': round(float(totals['base_cost'][m]), 2)}
+            for m, name in enumerate(month_names)
+        ],
+        'tier_hours': {tier: round(float(h), 1) for tier, h in zip(TIERS, tier_hours)},
+        'action_hours': action_hours,
+        'workers': workers,
+        'seconds': round(time.perf_counter() - started, 2)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay price history through the control rules')
+    parser.add_argument('--db', default=os.environ.get('PRICE_DB_PATH', 'comed_prices.db'))
+    parser.add_argument('--start', help='first day, YYYY-MM-DD UTC (default: --days before today)')
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--rooms', type=int, default=1000)
+    parser.add_argument('--device-watts', type=float, default=100, help='fan + lamp load per room')
+    parser.add_argument('--synthetic-prices', action='store_true', help="don't read --db")
+    parser.add_argument('--telemetry-db', help='replay recorded rooms from this telemetry database')
+    parser.add_argument('--workers', type=int, help='processes (default: CPU count)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the summary JSON here')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    # Point the API module's database at the same file before importing it;
+    # its telemetry store isn't used here
+    os.environ['PRICE_DB_PATH'] = args.db
+    os.environ.setdefault('TELEMETRY_DB_PATH', ':memory:')
+    from comed_pricing_api import determine_price_tier, get_recommendation
+
+    if args.start:
+        start = int(datetime.strptime(args.start, '%Y-%m-%d').replace(tzinfo=timezone.utc).timestamp() * 1000)
+    else:
+        start = (int(time.time() * 1000) // DAY_MS - args.days) * DAY_MS
+    end = start + args.days * DAY_MS
+
+    if args.synthetic_prices:
+        millis, prices = synthetic_prices(args.days, start, args.seed)
+    else:
+        millis, prices = stored_prices(args.db, start, end, os.environ.get('PRICE_ARCHIVE_DIR'))
+        if len(prices) == 0:
+            parser.error(f"No prices in {args.db} for that range (backfill.py, or use --synthetic-prices)")
+        logger.info(f"Replaying {len(prices)} stored prices")
+    grid, grid_prices = price_grid(millis, prices, start, args.days)
+
+    recorded = None
+    if args.telemetry_db:
+        from telemetry_ingest import TelemetryStore
+        store = TelemetryStore(args.telemetry_db)
+        # One recorded week, the latest available, repeated across the replay
+        week_end = int(time.time() * 1000) // DAY_MS * DAY_MS
+        names, temp, occupied, power = recorded_telemetry(store, week_end - 7 * DAY_MS, week_end)
+        store.close()
+        if not names:
+            parser.error(f"No recorded rooms in {args.telemetry_db}")
+        recorded = (temp, occupied, power)
+
+    result = replay(grid, grid_prices, determine_price_tier, get_recommendation, args.rooms,
+                    args.device_watts, args.workers, args.seed, recorded)
+    print(json.dumps(result, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""
+Versioned response cache for the pricing API
+Serialized responses are kept per endpoint + query args until the next
+price update bumps the version. Responses carry strong ETags and a
+Cache-Control max-age that expires at the next expected update, and
+If-None-Match revalidation is answered with 304 Not Modified. Larger
+bodies are gzip/brotli compressed once per cache entry when the client
+accepts it.
+"""
+
+import gzip
+import hashlib
+import time
+from collections import OrderedDict
+from functools import wraps
+from threading import Lock
+
+from flask import Response, make_response, request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Tiny payloads (the ESP32 one) aren't worth the CPU or the header bytes
+MIN_COMPRESS_BYTES = 1024
+
+
+def compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=6, mtime=0)
+
+
+def supported_encodings():
+    return ['br', 'gzip'] if brotli is not None else ['gzip']
+
+
+class ResponseCache:
+    """LRU cache of serialized JSON responses, invalidated by version"""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.version = 0
+        self.next_update_at = None
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def invalidate(self, next_update_in=None):
+        """Drop all cached responses; call whenever served data changes"""
+        with self._lock:
+            self.version += 1
+            self._entries.clear()
+            if next_update_in is not None:
+                self.next_update_at = time.time() + next_update_in
+
+    def max_age(self):
+        """Seconds until the next expected price update"""
+        if self.next_update_at is None:
+            return 0
+        return max(0, int(self.next_update_at - time.time()))
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+            return entry, self.version
+
+    def _put(self, key, version, entry):
+        with self._lock:
+            # Don't store a body computed before an invalidation
+            if version != self.version:
+                return
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def cached(self, view):
+        """Decorator for GET views (and POST views whose result depends only on the body)"""
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            body_hash = hashlib.sha1(request.get_data()).hexdigest() if request.method == 'POST' else None
+            key = (request.path, tuple(sorted(request.args.items(multi=True))), body_hash)
+            entry, version = self._get(key)
+
+            if entry is None:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                body = response.get_data()
+                # Content hash, so an update that doesn't change the body
+                # still revalidates as 304 for clients holding the old copy
+                etag = hashlib.sha1(body).hexdigest()[:20]
+                entry = (body, etag, response.mimetype, {})
+                self._put(key, version, entry)
+
+            body, etag, mimetype, encoded = entry
+            encoding = None
+            if len(body) >= MIN_COMPRESS_BYTES:
+                encoding = request.accept_encodings.best_match(supported_encodings())
+            if encoding:
+                # Each encoding is a distinct representation with its own ETag
+                etag = f"{etag}-{encoding}"
+                if encoding not in encoded:
+                    encoded[encoding] = compress(body, encoding)
+                body = encoded[encoding]
+
+            if request.if_none_match.contains(etag):
+                response = Response(status=304)
+            else:
+                response = Response(body, mimetype=mimetype)
+                if encoding:
+                    response.content_encoding = encoding
+            response.set_etag(etag)
+            response.vary.add('Accept-Encoding')
+            response.cache_control.public = True
+            response.cache_control.max_age = self.max_age()
+            return response
+        return wrapper
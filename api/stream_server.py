@@ -0,0 +1,228 @@
+"""
+Evented server for price streams (SSE and long-poll)
+gthread workers spend a thread per open /api/price/stream request; here an
+idle subscriber is a socket and a parked coroutine instead. One asyncio
+loop in a daemon thread of each worker serves the stream route on
+PRICE_STREAM_PORT, bound with SO_REUSEPORT so all workers share the port,
+and the Flask route redirects to it. Each market's PriceBroadcaster hands
+new payloads to the loop, which wakes every subscriber of that market
+with one Event.
+"""
+
+import asyncio
+import json
+import logging
+import threading
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+logger = logging.getLogger(__name__)
+
+STREAM_PATH = '/api/price/stream'
+MAX_REQUEST_BYTES = 8192
+REQUEST_TIMEOUT = 10
+
+
+class _Feed:
+    """A market's latest payload as seen from the event loop"""
+
+    def __init__(self, millis, payload):
+        self.sequence = 0 if payload is None else 1
+        self.millis = millis
+        self.payload = payload
+        self.changed = asyncio.Event()
+
+    def publish(self, millis, payload):
+        self.sequence += 1
+        self.millis = millis
+        self.payload = payload
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+
+def _query_int(query, name, default=None):
+    try:
+        return int(query[name][0])
+    except (KeyError, ValueError):
+        return default
+
+
+class StreamServer:
+    """asyncio SSE / long-poll server fed by a {market: PriceBroadcaster} map"""
+
+    def __init__(self, broadcasters, default, host='0.0.0.0', port=0, reuse_port=False,
+                 heartbeat=15, max_streams=10000):
+        self.broadcasters = dict(broadcasters)
+        self.default = default
+        self.host = host
+        self.port = port
+        self.reuse_port = reuse_port
+        self.heartbeat = heartbeat
+        self.max_streams = max_streams
+        self.active = 0
+        self.rejected = 0
+
+        self._feeds = {}
+        self._listeners = []
+        self._loop = None
+        self._server = None
+        self._error = None
+        self._ready = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Bind and serve from a daemon thread; returns the bound port"""
+        self._thread = threading.Thread(target=self._run, name='price-stream-server', daemon=True)
+        self._thread.start()
+        self._ready.wait(REQUEST_TIMEOUT)
+        if self._error is not None:
+            raise self._error
+        return self.port
+
+    def stop(self):
+        """Close the listening socket and every open stream"""
+        if self._loop is None:
+            return
+        for broadcaster, listener in self._listeners:
+            broadcaster.listeners.remove(listener)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(REQUEST_TIMEOUT)
+
+    def _run(self):
+        loop = self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            self._server = loop.run_until_complete(self._bind())
+        except OSError as e:
+            self._error = e
+            self._ready.set()
+            return
+        self._ready.set()
+        try:
+            loop.run_forever()
+        finally:
+            self._server.close()
+            tasks = asyncio.all_tasks(loop)
+            for task in tasks:
+                task.cancel()
+            loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            loop.close()
+
+    async def _bind(self):
+        loop = asyncio.get_running_loop()
+        for market, broadcaster in self.broadcasters.items():
+            # Listen before reading the current payload so no publish falls in between
+            feed = self._feeds[market] = _Feed(None, None)
+            listener = (lambda millis, payload, feed=feed:
+                        loop.call_soon_threadsafe(feed.publish, millis, payload))
+            broadcaster.listeners.append(listener)
+            self._listeners.append((broadcaster, listener))
+            if broadcaster.payload is not None:
+                feed.publish(broadcaster.millis, broadcaster.payload)
+        server = await asyncio.start_server(self._handle, self.host, self.port, limit=MAX_REQUEST_BYTES,
+                                            reuse_port=self.reuse_port or None, backlog=1024)
+        self.port = server.sockets[0].getsockname()[1]
+        return server
+
+    async def _handle(self, reader, writer):
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), REQUEST_TIMEOUT)
+            lines = head.decode('latin-1').split('\r\n')
+            method, target, _ = lines[0].split(' ', 2)
+            headers = {}
+            for line in lines[1:]:
+                name, sep, value = line.partition(':')
+                if sep:
+                    headers[name.strip().lower()] = value.strip()
+            await self._respond(writer, method, target, headers)
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+                ValueError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, writer, method, target, headers):
+        url = urlsplit(target)
+        query = parse_qs(url.query)
+        if url.path != STREAM_PATH:
+            return await self._send(writer, 404, {'error': 'Not found'})
+        if method == 'OPTIONS':
+            return await self._send(writer, 204, headers={
+                'Access-Control-Allow-Methods': 'GET',
+                'Access-Control-Allow-Headers': 'Last-Event-ID, Cache-Control'
+            })
+        if method != 'GET':
+            return await self._send(writer, 405, {'error': 'Method not allowed'})
+        feed = self._feeds.get(query.get('market', [self.default])[0])
+        if feed is None:
+            return await self._send(writer, 404, {'error': 'Unknown market', 'markets': list(self._feeds)})
+        if self.active >= self.max_streams:
+            self.rejected += 1
+            return await self._send(writer, 503, {'error': 'Too many open price streams'},
+                                    headers={'Retry-After': '30'})
+
+        self.active += 1
+        try:
+            since = _query_int(query, 'since')
+            if since is None:
+                await self._stream(writer, feed, headers.get('last-event-id'))
+            else:
+                timeout = max(0, min(_query_int(query, 'timeout', 30), 60))
+                await self._long_poll(writer, feed, since, timeout)
+        finally:
+            self.active -= 1
+
+    async def _long_poll(self, writer, feed, since, timeout):
+        """Payload for a price newer than since, or 204 after timeout seconds"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while feed.millis is None or feed.millis <= since:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return await self._send(writer, 204)
+            try:
+                await asyncio.wait_for(feed.changed.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+        await self._send(writer, 200, feed.payload.encode())
+
+    async def _stream(self, writer, feed, last_event_id):
+        """Same frames as PriceBroadcaster.sse_events until the client goes away"""
+        writer.write(self._head(200, {
+            'Content-Type': 'text/event-stream',
+            'X-Accel-Buffering': 'no'   # Don't let reverse proxies buffer the stream
+        }))
+        await writer.drain()
+        sequence = 0
+        while True:
+            if feed.sequence != sequence and feed.payload is not None:
+                sequence = feed.sequence
+                skip = last_event_id is not None and str(feed.millis) == last_event_id
+                last_event_id = None
+                if not skip:
+                    writer.write(f'id: {feed.millis}\nevent: price\ndata: {feed.payload}\n\n'.encode())
+                    await writer.drain()
+                continue
+            try:
+                await asyncio.wait_for(feed.changed.wait(), self.heartbeat)
+            except asyncio.TimeoutError:
+                writer.write(b': keepalive\n\n')
+                await writer.drain()
+
+    def _head(self, status, headers):
+        lines = [f'HTTP/1.1 {status} {HTTPStatus(status).phrase}',
+                 'Cache-Control: no-cache',
+                 'Connection: close',
+                 'Access-Control-Allow-Origin: *']
+        lines += [f'{name}: {value}' for name, value in headers.items()]
+        return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+    async def _send(self, writer, status, body=None, headers=None):
+        headers = dict(headers or {})
+        if isinstance(body, dict):
+            body = json.dumps(body).encode()
+        if body is not None:
+            headers['Content-Type'] = 'application/json'
+        headers['Content-Length'] = str(len(body or b''))
+        writer.write(self._head(status, headers) + (body or b''))
+        await writer.drain()
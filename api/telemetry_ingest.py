@@ -0,0 +1,388 @@
+"""
+Room telemetry ingestion worker
+Subscribes to sensors/+/telemetry, buffers messages in memory and flushes
+them in batched transactions into compact, day-partitioned SQLite tables.
+
+    python telemetry_ingest.py   (uses MQTT_* and TELEMETRY_DB_PATH env vars)
+"""
+
+import json
+import logging
+import os
+import time
+from collections import deque
+from datetime import datetime, timezone
+from threading import Condition, Event, Lock, Thread
+
+import telemetry_rollup
+from db_pool import ConnectionPool
+from mqtt_publisher import mqtt_client_from_env
+
+logger = logging.getLogger(__name__)
+
+TELEMETRY_TOPIC = 'sensors/+/telemetry'
+
+# Bits of the packed `flags` column
+FLAG_PIR = 1
+FLAG_FAN = 2
+FLAG_LAMP = 4
+FLAG_ECO = 8
+
+
+def partition_name(millis):
+    """Daily partition table for a UTC timestamp, e.g. telemetry_20240601"""
+    return 'telemetry_' + datetime.fromtimestamp(millis / 1000, tz=timezone.utc).strftime('%Y%m%d')
+
+
+def _scaled(value, scale):
+    if value is None:
+        return None
+    try:
+        return int(round(float(value) * scale))
+    except (TypeError, ValueError):
+        return None
+
+
+def pack_sample(millis, data):
+    """Telemetry JSON dict -> compact row tuple (without room id)"""
+    flags = ((FLAG_PIR if data.get('pir') else 0) |
+             (FLAG_FAN if data.get('fan') else 0) |
+             (FLAG_LAMP if data.get('lamp') else 0) |
+             (FLAG_ECO if data.get('ecoMode') else 0))
+    return (
+        millis,
+        _scaled(data.get('tC'), 10),        # 0.1 °C
+        _scaled(data.get('rh'), 1),         # %
+        _scaled(data.get('dist'), 1),       # cm
+        _scaled(data.get('amps'), 1000),    # mA
+        _scaled(data.get('voltage'), 1),    # V
+        flags,
+        _scaled(data.get('priceTier'), 1),
+        _scaled(data.get('price'), 100)     # 0.01 ¢/kWh
+    )
+
+
+def unpack_sample(row):
+    """Compact row (millisUTC first) -> dict with the telemetry field names"""
+    millis, temp, rh, dist, milliamps, voltage, flags, tier, price = row
+    return {
+        'millisUTC': millis,
+        'tC': temp / 10 if temp is not None else None,
+        'rh': rh,
+        'dist': dist,
+        'amps': milliamps / 1000 if milliamps is not None else None,
+        'voltage': voltage,
+        'pir': 1 if flags & FLAG_PIR else 0,
+        'fan': bool(flags & FLAG_FAN),
+        'lamp': bool(flags & FLAG_LAMP),
+        'ecoMode': 1 if flags & FLAG_ECO else 0,
+        'priceTier': tier,
+        'price': price / 100 if price is not None else None
+    }
+
+
+class TelemetryStore:
+    """Day-partitioned telemetry tables, downsampled rollups and a room name -> id map"""
+
+    COLUMNS = 'millisUTC, temp_c_x10, rh, dist_cm, milliamps, voltage, flags, price_tier, price_x100'
+
+    def __init__(self, db_path='telemetry.db', pool_size=4):
+        self.pool = ConnectionPool(db_path, max_size=pool_size)
+        self._rooms = {}
+        self._partitions = set()
+        self._last_seen = {}         # room_id -> last millisUTC, for energy integration
+        self._lock = Lock()
+        with self.pool.transaction() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS rooms (
+                    id INTEGER PRIMARY KEY,
+                    name TEXT UNIQUE NOT NULL
+                )
+            ''')
+            for room_id, name in conn.execute('SELECT id, name FROM rooms'):
+                self._rooms[name] = room_id
+            if telemetry_rollup.create_tables(conn) and self.partitions(conn):
+                self.rebuild_rollups(conn)
+
+    def room_id(self, conn, name, new_rooms):
+        """
+        Id for a room name, registering it on first sight
+        Newly registered rooms go into new_rooms; the caller caches them once
+        the transaction commits (a rollback would free the id again)
+        """
+        room_id = self._rooms.get(name) or new_rooms.get(name)
+        if room_id is None:
+            conn.execute('INSERT OR IGNORE INTO rooms (name) VALUES (?)', (name,))
+            room_id = conn.execute('SELECT id FROM rooms WHERE name = ?', (name,)).fetchone()[0]
+            new_rooms[name] = room_id
+        return room_id
+
+    def rooms(self):
+        """Names of all rooms that have reported telemetry"""
+        with self.pool.connection() as conn:
+            return [r[0] for r in conn.execute('SELECT name FROM rooms ORDER BY name')]
+
+    def ensure_partition(self, conn, table, new_partitions):
+        """Create a day partition if needed, noting it in new_partitions (cached after commit)"""
+        if table in self._partitions or table in new_partitions:
+            return
+        conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS {table} (
+                room_id INTEGER NOT NULL,
+                millisUTC INTEGER NOT NULL,
+                temp_c_x10 INTEGER,
+                rh INTEGER,
+                dist_cm INTEGER,
+                milliamps INTEGER,
+                voltage INTEGER,
+                flags INTEGER NOT NULL,
+                price_tier INTEGER,
+                price_x100 INTEGER,
+                PRIMARY KEY (room_id, millisUTC)
+            ) WITHOUT ROWID
+        ''')
+        new_partitions.add(table)
+
+    def partitions(self, conn=None):
+        """Existing partition table names, oldest first"""
+        def query(c):
+            return [r[0] for r in c.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name GLOB 'telemetry_[0-9]*' ORDER BY name")]
+        if conn is not None:
+            return query(conn)
+        with self.pool.connection() as c:
+            return query(c)
+
+    def write_batch(self, samples):
+        """Insert (room name, packed row) samples and fold them into the rollups in one transaction"""
+        by_table = {}
+        new_rooms, new_partitions = {}, set()
+        with self._lock:
+            last_seen = dict(self._last_seen)
+            with self.pool.transaction() as conn:
+                for room, row in samples:
+                    table = partition_name(row[0])
+                    by_table.setdefault(table, []).append((self.room_id(conn, room, new_rooms),) + row)
+                for table, rows in by_table.items():
+                    self.ensure_partition(conn, table, new_partitions)
+                    conn.executemany(
+                        f'INSERT OR REPLACE INTO {table} (room_id, {self.COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                        rows)
+                telemetry_rollup.write(conn, telemetry_rollup.aggregate(
+                    [row for rows in by_table.values() for row in rows], last_seen))
+            # Only cache what the commit made permanent
+            self._rooms.update(new_rooms)
+            self._partitions |= new_partitions
+            self._last_seen = last_seen
+        return len(samples)
+
+    def rebuild_rollups(self, conn):
+        """Recompute every rollup bucket from the raw partitions"""
+        for resolution in telemetry_rollup.RESOLUTIONS:
+            conn.execute(f'DELETE FROM {telemetry_rollup.rollup_table(resolution)}')
+        last_seen = {}
+        for table in self.partitions(conn):
+            rows = conn.execute(f'SELECT room_id, {self.COLUMNS} FROM {table}').fetchall()
+            telemetry_rollup.write(conn, telemetry_rollup.aggregate(rows, last_seen))
+        self._last_seen = last_seen
+        logger.info("Rebuilt telemetry rollups from raw partitions")
+
+    def prune_rollups(self, now_millis=None):
+        """Drop rollup buckets past their resolution's retention"""
+        if now_millis is None:
+            now_millis = int(time.time() * 1000)
+        with self._lock, self.pool.transaction() as conn:
+            telemetry_rollup.prune(conn, now_millis)
+
+    def get_history(self, room, start_millis, end_millis, max_points=500, now_millis=None):
+        """Downsampled history for a room at the coarsest resolution that fits max_points"""
+        if now_millis is None:
+            now_millis = int(time.time() * 1000)
+        resolution, step = telemetry_rollup.choose_resolution(start_millis, end_millis, max_points, now_millis)
+        with self.pool.connection() as conn:
+            row = conn.execute('SELECT id FROM rooms WHERE name = ?', (room,)).fetchone()
+            points = [] if row is None else telemetry_rollup.query(
+                conn, row[0], start_millis, end_millis, resolution, step)
+        return {'resolution_seconds': step, 'source_resolution_seconds': resolution, 'points': points}
+
+    def get_samples(self, room, start_millis, end_millis):
+        """Decoded samples for a room with start_millis <= millisUTC < end_millis"""
+        first, last = partition_name(start_millis), partition_name(max(start_millis, end_millis - 1))
+        samples = []
+        with self.pool.connection() as conn:
+            # Rooms may have been registered by a separate ingest process
+            row = conn.execute('SELECT id FROM rooms WHERE name = ?', (room,)).fetchone()
+            if row is None:
+                return []
+            room_id = row[0]
+            for table in self.partitions(conn):
+                if first <= table <= last:
+                    rows = conn.execute(
+                        f'SELECT {self.COLUMNS} FROM {table} WHERE room_id = ? AND millisUTC >= ? AND millisUTC < ? ORDER BY millisUTC',
+                        (room_id, start_millis, end_millis))
+                    samples.extend(unpack_sample(row) for row in rows)
+        return samples
+
+    def close(self):
+        self.pool.close()
+
+
+class TelemetryIngestor:
+    """Buffers incoming telemetry and flushes it to a TelemetryStore in batches"""
+
+    def __init__(self, store, batch_size=2000, flush_interval=1.0, prune_interval=3600):
+        self.store = store
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.prune_interval = prune_interval
+
+        self.received = 0
+        self.written = 0
+        self.rejected = 0
+        self.last_flush_seconds = 0.0
+        self.listeners = []          # Called with (room, data, millis) per message
+
+        self._buffer = deque()
+        self._cond = Condition()
+        self._stop = Event()
+        self._thread = None
+        self._rate_window = deque()  # (time, written) for the ingest rate
+        self.client = None
+
+    def handle_message(self, topic, payload, millis=None):
+        """Parse one MQTT message and queue it; safe to call from any thread"""
+        parts = topic.split('/')
+        if len(parts) != 3 or parts[0] != 'sensors' or parts[2] != 'telemetry':
+            self.rejected += 1
+            return False
+        try:
+            data = json.loads(payload)
+        except (ValueError, UnicodeDecodeError):
+            self.rejected += 1
+            return False
+        if not isinstance(data, dict):
+            self.rejected += 1
+            return False
+
+        # Device `ts` is uptime millis, so stamp with receive time
+        if millis is None:
+            millis = int(time.time() * 1000)
+        room = parts[1]
+        with self._cond:
+            self._buffer.append((room, pack_sample(millis, data)))
+            self.received += 1
+            if len(self._buffer) >= self.batch_size:
+                self._cond.notify()
+        for listener in self.listeners:
+            try:
+                listener(room, data, millis)
+            except Exception as e:
+                logger.error(f"Telemetry listener failed: {e}")
+        return True
+
+    def flush(self):
+        """Write everything buffered so far; returns the number of samples written"""
+        total = 0
+        while True:
+            with self._cond:
+                if not self._buffer:
+                    break
+                count = min(len(self._buffer), self.batch_size)
+                batch = [self._buffer.popleft() for _ in range(count)]
+            start = time.perf_counter()
+            try:
+                self.store.write_batch(batch)
+            except Exception:
+                # Put the batch back in order so nothing is lost
+                with self._cond:
+                    self._buffer.extendleft(reversed(batch))
+                raise
+            self.last_flush_seconds = time.perf_counter() - start
+            total += len(batch)
+            with self._cond:
+                self.written += len(batch)
+        return total
+
+    def metrics(self):
+        """Counters, queue depth and recent ingest rate (samples/s)"""
+        now = time.time()
+        with self._cond:
+            self._rate_window.append((now, self.written))
+            while len(self._rate_window) > 1 and now - self._rate_window[0][0] > 60:
+                self._rate_window.popleft()
+            oldest_time, oldest_written = self._rate_window[0]
+            elapsed = now - oldest_time
+            return {
+                'received': self.received,
+                'written': self.written,
+                'rejected': self.rejected,
+                'queue_depth': len(self._buffer),
+                'ingest_rate': round((self.written - oldest_written) / elapsed, 1) if elapsed > 0 else 0.0,
+                'last_flush_ms': round(self.last_flush_seconds * 1000, 2)
+            }
+
+    def _run(self):
+        last_prune = 0.0
+        while not self._stop.is_set():
+            with self._cond:
+                self._cond.wait_for(
+                    lambda: self._stop.is_set() or len(self._buffer) >= self.batch_size,
+                    timeout=self.flush_interval
+                )
+            try:
+                self.flush()
+                if time.monotonic() - last_prune >= self.prune_interval:
+                    self.store.prune_rollups()
+                    last_prune = time.monotonic()
+            except Exception as e:
+                logger.error(f"Telemetry flush failed, will retry: {e}")
+                self._stop.wait(self.flush_interval)
+        self.flush()
+
+    def start(self):
+        """Start the flush thread"""
+        self._thread = Thread(target=self._run, name='telemetry-flush', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the MQTT client (if any) and flush what's left"""
+        if self.client is not None:
+            self.client.disconnect()
+            self.client.loop_stop()
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout=10)
+
+    def connect_mqtt(self, client):
+        """Subscribe a paho-style client to room telemetry and start its loop"""
+        def on_connect(client, userdata, flags, reason_code, properties=None):
+            client.subscribe(TELEMETRY_TOPIC, qos=0)
+            logger.info(f"Subscribed to {TELEMETRY_TOPIC}")
+
+        def on_message(client, userdata, message):
+            self.handle_message(message.topic, message.payload)
+
+        client.on_connect = on_connect
+        client.on_message = on_message
+        client.loop_start()
+        self.client = client
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    store = TelemetryStore(os.environ.get('TELEMETRY_DB_PATH', 'telemetry.db'))
+    ingestor = TelemetryIngestor(store)
+    ingestor.start()
+    ingestor.connect_mqtt(mqtt_client_from_env('telemetry-ingest'))
+    try:
+        while True:
+            time.sleep(60)
+            logger.info(f"Telemetry ingest: {ingestor.metrics()}")
+    except KeyboardInterrupt:
+        ingestor.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+"""
+Downsampled room telemetry rollups
+Maintains 1-minute, 15-minute and 1-hour buckets per room (temperature
+min/max/avg, energy integrated from amps x voltage, occupancy fraction)
+as telemetry is written, and answers range queries from the coarsest
+resolution that keeps the response under a requested number of points.
+"""
+
+import math
+
+# Bucket size in seconds -> retention in days (None = keep forever)
+RESOLUTIONS = {
+    60: 14,
+    900: 180,
+    3600: None
+}
+
+# Sensor hub publishes every 5 s; gaps longer than MAX_GAP_MS are treated
+# as a single nominal interval rather than integrated across
+DEFAULT_INTERVAL_MS = 5000
+MAX_GAP_MS = 60000
+
+FLAG_PIR = 1
+DAY_MS = 24 * 3600 * 1000
+
+
+def rollup_table(resolution):
+    return f'telemetry_rollup_{resolution}'
+
+
+def create_tables(conn):
+    """Create rollup tables; returns True if any of them is new"""
+    existing = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    created = False
+    for resolution in RESOLUTIONS:
+        table = rollup_table(resolution)
+        if table in existing:
+            continue
+        conn.execute(f'''
+            CREATE TABLE {table} (
+                room_id INTEGER NOT NULL,
+                bucket_start INTEGER NOT NULL,
+                samples INTEGER NOT NULL,
+                temp_min_x10 INTEGER,
+                temp_max_x10 INTEGER,
+                temp_sum_x10 INTEGER NOT NULL,
+                temp_count INTEGER NOT NULL,
+                energy_wh REAL NOT NULL,
+                occupied INTEGER NOT NULL,
+                PRIMARY KEY (room_id, bucket_start)
+            ) WITHOUT ROWID
+        ''')
+        created = True
+    return created
+
+
+def aggregate(rows, last_seen):
+    """
+    Fold raw rows into per-resolution bucket partials
+    rows: (room_id, millisUTC, temp_c_x10, rh, dist_cm, milliamps, voltage, flags, ...)
+    last_seen: room_id -> millisUTC of the previous sample, updated in place
+    Returns {resolution: {(room_id, bucket_start): [samples, tmin, tmax, tsum, tcount, wh, occupied]}}
+    """
+    buckets = {resolution: {} for resolution in RESOLUTIONS}
+    for row in sorted(rows, key=lambda r: (r[0], r[1])):
+        room_id, millis, temp, milliamps, voltage, flags = row[0], row[1], row[2], row[5], row[6], row[7]
+
+        previous = last_seen.get(room_id)
+        gap = millis - previous if previous is not None else None
+        interval = gap if gap is not None and 0 < gap <= MAX_GAP_MS else DEFAULT_INTERVAL_MS
+        if previous is None or millis > previous:
+            last_seen[room_id] = millis
+
+        wh = 0.0
+        if milliamps is not None and voltage is not None:
+            wh = voltage * milliamps / 1000 * interval / 3600000
+        occupied = 1 if flags & FLAG_PIR else 0
+
+        for resolution, partials in buckets.items():
+            step = resolution * 1000
+            key = (room_id, millis - millis % step)
+            p = partials.get(key)
+            if p is None:
+                p = partials[key] = [0, None, None, 0, 0, 0.0, 0]
+            p[0] += 1
+            if temp is not None:
+                p[1] = temp if p[1] is None else min(p[1], temp)
+                p[2] = temp if p[2] is None else max(p[2], temp)
+                p[3] += temp
+                p[4] += 1
+            p[5] += wh
+            p[6] += occupied
+    return buckets
+
+
+def write(conn, buckets):
+    """Merge bucket partials into the rollup tables"""
+    for resolution, partials in buckets.items():
+        if not partials:
+            continue
+        conn.executemany(f'''
+            INSERT INTO {rollup_table(resolution)}
+                (room_id, bucket_start, samples, temp_min_x10, temp_max_x10,
+                 temp_sum_x10, temp_count, energy_wh, occupied)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(room_id, bucket_start) DO UPDATE SET
+                samples = samples + excluded.samples,
+                temp_min_x10 = min(coalesce(temp_min_x10, excluded.temp_min_x10),
+                                   coalesce(excluded.temp_min_x10, temp_min_x10)),
+                temp_max_x10 = max(coalesce(temp_max_x10, excluded.temp_max_x10),
+                                   coalesce(excluded.temp_max_x10, temp_max_x10)),
+                temp_sum_x10 = temp_sum_x10 + excluded.temp_sum_x10,
+                temp_count = temp_count + excluded.temp_count,
+                energy_wh = energy_wh + excluded.energy_wh,
+                occupied = occupied + excluded.occupied
+        ''', [key + tuple(p) for key, p in partials.items()])
+
+
+def prune(conn, now_millis):
+    """Drop buckets older than each resolution's retention"""
+    for resolution, days in RESOLUTIONS.items():
+        if days is not None:
+            conn.execute(f'DELETE FROM {rollup_table(resolution)} WHERE bucket_start < ?',
+                         (now_millis - days * DAY_MS,))
+
+
+def choose_resolution(start_millis, end_millis, max_points, now_millis):
+    """
+    (stored resolution, output step) in seconds for a range: the coarsest
+    resolution still retained at start_millis that fits max_points, with
+    the step widened to a multiple of it when even that is too fine
+    """
+    wanted = max(1, (end_millis - start_millis) / 1000) / max(1, max_points)
+    retained = [r for r, days in RESOLUTIONS.items()
+                if days is None or start_millis >= now_millis - days * DAY_MS]
+    fitting = [r for r in retained if r <= wanted]
+    resolution = max(fitting) if fitting else min(retained)
+    return resolution, resolution * max(1, math.ceil(wanted / resolution))
+
+
+def query(conn, room_id, start_millis, end_millis, resolution, step):
+    """Aggregated points for [start_millis, end_millis) at `step` seconds"""
+    step_ms = step * 1000
+    start = start_millis - start_millis % (resolution * 1000)
+    rows = conn.execute(f'''
+        SELECT (bucket_start / ?) * ? AS b,
+               SUM(samples), MIN(temp_min_x10), MAX(temp_max_x10),
+               SUM(temp_sum_x10), SUM(temp_count), SUM(energy_wh), SUM(occupied)
+        FROM {rollup_table(resolution)}
+        WHERE room_id = ? AND bucket_start >= ? AND bucket_start < ?
+        GROUP BY b
+        ORDER BY b
+    ''', (step_ms, step_ms, room_id, start, end_millis)).fetchall()
+    return [
+        {
+            'millisUTC': b,
+            'samples': samples,
+            'temp_min_c': tmin / 10 if tmin is not None else None,
+            'temp_max_c': tmax / 10 if tmax is not None else None,
+            'temp_avg_c': round(tsum / tcount / 10, 2) if tcount else None,
+            'energy_kwh': round(wh / 1000, 6),
+            'occupancy': round(occupied / samples, 3) if samples else 0
+        }
+        for b, samples, tmin, tmax, tsum, tcount, wh, occupied in rows
+    ]
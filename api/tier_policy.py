@@ -0,0 +1,191 @@
+"""
+Price tier policy loaded from a JSON config file
+Thresholds and recommendations are compiled once into an immutable
+bisect lookup per building/room group; the file is re-read when its
+modification time changes, so edits take effect without a restart (and
+on_reload lets the caller reclassify what it already published). A bad
+edit is logged and the previous policy stays in force.
+
+    {
+      "tiers": [
+        {"name": "very_low", "below": 3.0, "action": "maximize", ...},
+        ...
+        {"name": "critical", "action": "critical", ...}
+      ],
+      "groups": {
+        "dorm-east": {"thresholds": {"high": 10.0}, "recommendations": {"high": {"suggested_temp_offset": 2}}}
+      }
+    }
+"""
+
+import json
+import logging
+import os
+import time
+from bisect import bisect_right
+from threading import Lock
+from types import MappingProxyType
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Tier names the firmware and binary payload know about, cheapest first
+KNOWN_TIERS = ('very_low', 'low', 'normal', 'high', 'very_high', 'critical')
+
+
+class PolicyError(ValueError):
+    """Invalid tier policy config"""
+
+
+class TierPolicy:
+    """Immutable price -> tier lookup with a read-only recommendation per tier"""
+
+    __slots__ = ('names', 'bounds', '_bounds_array', '_recommendations')
+
+    def __init__(self, tiers):
+        names, bounds, recommendations = [], [], []
+        for i, tier in enumerate(tiers):
+            if not isinstance(tier, dict):
+                raise PolicyError(f"Tier {i} must be an object")
+            name = tier.get('name')
+            if name not in KNOWN_TIERS:
+                raise PolicyError(f"Unknown tier {name!r} (expected one of {', '.join(KNOWN_TIERS)})")
+            if names and KNOWN_TIERS.index(name) <= KNOWN_TIERS.index(names[-1]):
+                raise PolicyError(f"Tier {name!r} is out of order")
+            last = i == len(tiers) - 1
+            if last != ('below' not in tier):
+                raise PolicyError("Every tier except the last needs a 'below' threshold")
+            if not last:
+                below = float(tier['below'])
+                if bounds and below <= bounds[-1]:
+                    raise PolicyError(f"Threshold for {name!r} must be above {bounds[-1]}")
+                bounds.append(below)
+            names.append(name)
+            rec = {k: v for k, v in tier.items() if k not in ('name', 'below')}
+            if 'action' not in rec:
+                raise PolicyError(f"Tier {name!r} has no action")
+            recommendations.append(MappingProxyType(rec))
+        if not names:
+            raise PolicyError("Policy has no tiers")
+
+        object.__setattr__(self, 'names', tuple(names))
+        object.__setattr__(self, 'bounds', tuple(bounds))
+        object.__setattr__(self, '_bounds_array', np.array(bounds))
+        object.__setattr__(self, '_recommendations', dict(zip(names, recommendations)))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("TierPolicy is immutable")
+
+    def classify(self, price):
+        """Tier name for one price (upper thresholds are exclusive)"""
+        return self.names[bisect_right(self.bounds, price)]
+
+    def classify_many(self, prices):
+        """Tier index (into self.names) for each price in an array, in one pass"""
+        return np.searchsorted(self._bounds_array, np.asarray(prices, dtype=float), side='right')
+
+    def recommendation(self, tier):
+        """Read-only recommendation for a tier, falling back to the middle tier"""
+        rec = self._recommendations.get(tier)
+        if rec is None:
+            rec = self._recommendations.get('normal', self._recommendations[self.names[len(self.names) // 2]])
+        return rec
+
+    def describe(self):
+        return [dict(self._recommendations[name], name=name, **({'below': b} if b is not None else {}))
+                for name, b in zip(self.names, self.bounds + (None,))]
+
+
+def compile_policies(config):
+    """Config dict -> {group name or None: TierPolicy}"""
+    if not isinstance(config, dict) or not isinstance(config.get('tiers'), list):
+        raise PolicyError("Config needs a 'tiers' list")
+    policies = {None: TierPolicy(config['tiers'])}
+    for group, overrides in (config.get('groups') or {}).items():
+        if not isinstance(overrides, dict):
+            raise PolicyError(f"Group {group!r} must be an object")
+        thresholds = overrides.get('thresholds', {})
+        recs = overrides.get('recommendations', {})
+        tiers = []
+        for tier in overrides.get('tiers', config['tiers']):
+            if isinstance(tier, dict):
+                tier = dict(tier, **recs.get(tier.get('name'), {}))
+                if tier.get('name') in thresholds:
+                    tier['below'] = thresholds[tier['name']]
+            tiers.append(tier)
+        try:
+            policies[group] = TierPolicy(tiers)
+        except PolicyError as e:
+            raise PolicyError(f"Group {group!r}: {e}")
+    return policies
+
+
+class PolicyStore:
+    """Compiled policies for a config file, reloaded when the file changes"""
+
+    def __init__(self, path, check_interval=1.0, on_reload=None):
+        self.path = path
+        self.check_interval = check_interval
+        self.on_reload = on_reload
+        self.reloads = 0
+        self._lock = Lock()
+        self._mtime = None
+        self._checked_at = 0.0
+        self._policies = None
+        self._reload(initial=True)
+
+    def _reload(self, initial=False):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+            if mtime == self._mtime:
+                return False
+            with open(self.path) as f:
+                policies = compile_policies(json.load(f))
+        except OSError as e:
+            if initial:
+                raise
+            if self._mtime is not None:
+                logger.error(f"Keeping previous tier policy, can't read {self.path}: {e}")
+                self._mtime = None
+            return False
+        except ValueError as e:
+            if initial:
+                raise
+            # Remember the broken version so it's only reported once
+            self._mtime = mtime
+            logger.error(f"Keeping previous tier policy, {self.path} is invalid: {e}")
+            return False
+        # Swapping the dict reference is atomic; readers never see a partial policy
+        self._policies = policies
+        self._mtime = mtime
+        if not initial:
+            self.reloads += 1
+            logger.info(f"Reloaded tier policy from {self.path}")
+        return True
+
+    def check(self):
+        """Re-read the file if it's due and changed; True if a new policy was loaded"""
+        now = time.monotonic()
+        reloaded = False
+        if now - self._checked_at >= self.check_interval:
+            with self._lock:
+                if now - self._checked_at >= self.check_interval:
+                    self._checked_at = now
+                    reloaded = self._reload()
+        # Outside the lock, the callback will look policies up again
+        if reloaded and self.on_reload is not None:
+            try:
+                self.on_reload()
+            except Exception as e:
+                logger.error(f"Tier policy reload callback failed: {e}")
+        return reloaded
+
+    def policy(self, group=None):
+        """Current policy for a group (the default policy for unknown groups)"""
+        self.check()
+        policies = self._policies
+        return policies.get(group) or policies[None]
+
+    def groups(self):
+        return sorted(g for g in self._policies if g is not None)
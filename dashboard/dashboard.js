@@ -488,17 +488,20 @@ async function fetchPricingData() {
 
 async function fetchPriceHistory() {
   try {
-    const res = await fetch(`${PRICING_API_URL}/api/price/history?hours=6`);
+    // Columnar, oldest first: t0 plus per-point millisecond deltas
+    const res = await fetch(`${PRICING_API_URL}/api/price/history?hours=6&points=72&format=columnar`);
     if (!res.ok) return;
 
     const data = await res.json();
     pricingChart.data.labels = [];
     pricingChart.data.datasets[0].data = [];
 
-    data.data.reverse().forEach(record => {
-      const time = new Date(record.millisUTC).toLocaleTimeString('en-US', { hour: '2-digit', minute: '2-digit' });
+    let millis = data.t0;
+    data.dt.forEach((delta, i) => {
+      millis += delta;
+      const time = new Date(millis).toLocaleTimeString('en-US', { hour: '2-digit', minute: '2-digit' });
       pricingChart.data.labels.push(time);
-      pricingChart.data.datasets[0].data.push(record.price_cents_per_kwh);
+      pricingChart.data.datasets[0].data.push(data.price[i]);
     });
 
     pricingChart.update('none');
@@ -758,8 +761,48 @@ connectMQTT();
 fetchPricingData();
 fetchPriceHistory();
 
-// Update pricing every 5 minutes
-setInterval(fetchPricingData, 300000);
+// Refresh pricing as soon as the API pushes a new price. While the stream
+// is unavailable (no EventSource, refused with 503 or dropped) poll every
+// 5 minutes and retry the stream with exponential backoff.
+const PRICE_POLL_MS = 300000;
+const PRICE_STREAM_RETRY_MS = 5000;
+let pricePollTimer = null;
+let priceStreamRetryMs = PRICE_STREAM_RETRY_MS;
+
+function startPricePolling() {
+  if (!pricePollTimer) {
+    pricePollTimer = setInterval(fetchPricingData, PRICE_POLL_MS);
+  }
+}
+
+function stopPricePolling() {
+  if (pricePollTimer) {
+    clearInterval(pricePollTimer);
+    pricePollTimer = null;
+  }
+}
+
+function connectPriceStream() {
+  if (!window.EventSource) {
+    startPricePolling();
+    return;
+  }
+  const priceStream = new EventSource(`${PRICING_API_URL}/api/price/stream`);
+  priceStream.onopen = () => {
+    priceStreamRetryMs = PRICE_STREAM_RETRY_MS;
+    stopPricePolling();
+  };
+  priceStream.addEventListener('price', fetchPricingData);
+  priceStream.onerror = () => {
+    // EventSource gives up for good on a 503, so take over reconnecting
+    priceStream.close();
+    startPricePolling();
+    setTimeout(connectPriceStream, priceStreamRetryMs);
+    priceStreamRetryMs = Math.min(priceStreamRetryMs * 2, PRICE_POLL_MS);
+  };
+}
+
+connectPriceStream();
 
 // Update uptime every second
 setInterval(updateUptime, 1000);
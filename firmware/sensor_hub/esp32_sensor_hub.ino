@@ -30,7 +30,7 @@
 // ============ CONFIGURATION - UPDATE THESE ============
 const char* WIFI_SSID = "YOUR_WIFI_SSID";
 const char* WIFI_PASSWORD = "YOUR_WIFI_PASSWORD";
-const char* PRICING_API_URL = "https://smart-energy-production-a08d.up.railway.app/api/price/esp32";
+const char* PRICING_API_URL = "https://smart-energy-production-a08d.up.railway.app/api/price/esp32.bin";  // Binary layout: api/esp32_binary.py
 
 // MQTT (HiveMQ Cloud)
 const char* MQTT_SERVER = "1e1a4e5c581e4bc3a697f8937d7fb9e4.s1.eu.hivemq.cloud";
@@ -44,6 +44,7 @@ const char* TOPIC_TELEMETRY_B = "sensors/room2/telemetry";
 const char* TOPIC_MODE = "control/mode";
 const char* TOPIC_ALERTS_A = "alerts/room1/anomaly";
 const char* TOPIC_ALERTS_B = "alerts/room2/anomaly";
+const char* TOPIC_PRICING = "pricing/current";  // Retained, published by pricing API
 
 // ============ PIN DEFINITIONS ============
 const int TRIG_A = 21, ECHO_A = 34;
@@ -91,6 +92,8 @@ PricingData currentPricing = {0, 2, "normal", 0, false, 0};
 
 // Timing
 unsigned long lastPriceFetch = 0;
+unsigned long lastMqttPriceMs = 0;  // Last price pushed over MQTT (HTTP fetches don't count)
+String pricingEtag = "";  // ETag of last pricing response, for If-None-Match
 unsigned long lastNrfSend = 0;
 unsigned long lastMqttPublish = 0;
 unsigned long lastDHTread = 0;
@@ -106,6 +109,7 @@ bool fanB = false, lampB = false;
 // ============ TIMING CONSTANTS ============
 const unsigned long DEBOUNCE_MS = 200;
 const unsigned long PRICE_FETCH_INTERVAL = 300000;  // 5 minutes
+const unsigned long MQTT_PRICE_GRACE = 60000;       // Slack on the 5-minute push before falling back
 const unsigned long NRF_SEND_INTERVAL = 250;        // 250ms
 const unsigned long MQTT_PUBLISH_INTERVAL = 5000;   // 5 seconds
 const unsigned long PULSE_TIMEOUT_US = 30000;
@@ -194,6 +198,13 @@ void mqttCallback(char* topic, byte* payload, unsigned int length) {
   
   String topicStr = String(topic);
   
+  // Price pushed by the pricing API (same p/t/a/o/ts/s payload as HTTP)
+  if (topicStr == TOPIC_PRICING) {
+    applyPricing(doc);
+    lastMqttPriceMs = millis();
+    return;
+  }
+  
   // Handle mode changes from dashboard
   if (topicStr == TOPIC_MODE) {
     String newMode = doc["mode"].as<String>();
@@ -221,6 +232,46 @@ uint8_t tierStringToNum(const String& tier) {
   return 2;  // default to normal
 }
 
+// ============ APPLY PRICING PAYLOAD ============
+void setPricing(float price, uint8_t tier, const String& action, int8_t tempOffset, bool valid) {
+  currentPricing.price = price;
+  currentPricing.tier = tier;
+  currentPricing.action = action;
+  currentPricing.tempOffset = tempOffset;
+  currentPricing.valid = valid;
+  currentPricing.lastUpdate = millis();
+  
+  Serial.printf("Price: %.2f¢/kWh, Tier: %d (%s)\n", 
+    currentPricing.price, currentPricing.tier, currentPricing.action.c_str());
+}
+
+void applyPricing(JsonDocument& doc) {
+  setPricing(doc["p"].as<float>(), tierStringToNum(doc["t"].as<String>()), doc["a"].as<String>(),
+             doc["o"].as<int8_t>(), doc["s"].as<String>() == "active");
+}
+
+// Fixed 11-byte layout from /api/price/esp32.bin (schema v1, little-endian)
+#define PRICE_SCHEMA_VERSION 1
+struct __attribute__((packed)) BinaryPrice {
+  uint8_t version;
+  int16_t priceX100;
+  uint8_t tier;       // very_low, low, normal, high, very_high, critical
+  uint8_t action;     // index into PRICE_ACTIONS
+  int8_t tempOffset;
+  uint32_t seconds;   // price timestamp, Unix seconds
+  uint8_t status;     // 0 initializing, 1 active, 2 error
+};
+const char* PRICE_ACTIONS[] = {"maximize", "normal_plus", "normal", "reduce", "minimize", "critical"};
+
+bool applyBinaryPricing(const uint8_t* buf, size_t len) {
+  BinaryPrice bp;
+  if (len != sizeof(bp) || buf[0] != PRICE_SCHEMA_VERSION) return false;
+  memcpy(&bp, buf, sizeof(bp));
+  const char* action = bp.action < 6 ? PRICE_ACTIONS[bp.action] : "normal";
+  setPricing(bp.priceX100 / 100.0f, bp.tier <= 5 ? bp.tier : 2, action, bp.tempOffset, bp.status == 1);
+  return true;
+}
+
 // ============ FETCH PRICING DATA ============
 void fetchComedPricing() {
   if (WiFi.status() != WL_CONNECTED) return;
@@ -228,20 +279,25 @@ void fetchComedPricing() {
   HTTPClient http;
   http.begin(PRICING_API_URL);
   http.setTimeout(10000);
+  if (pricingEtag.length() > 0) {
+    http.addHeader("If-None-Match", pricingEtag);
+  }
+  const char* headerKeys[] = {"ETag"};
+  http.collectHeaders(headerKeys, 1);
   
   int httpCode = http.GET();
-  if (httpCode == HTTP_CODE_OK) {
-    StaticJsonDocument<256> doc;
-    if (!deserializeJson(doc, http.getString())) {
-      currentPricing.price = doc["p"].as<float>();
-      currentPricing.tier = tierStringToNum(doc["t"].as<String>());
-      currentPricing.action = doc["a"].as<String>();
-      currentPricing.tempOffset = doc["o"].as<int8_t>();
-      currentPricing.valid = (doc["s"].as<String>() == "active");
-      currentPricing.lastUpdate = millis();
-      
-      Serial.printf("Price: %.2f¢/kWh, Tier: %d (%s)\n", 
-        currentPricing.price, currentPricing.tier, currentPricing.action.c_str());
+  if (httpCode == HTTP_CODE_NOT_MODIFIED) {
+    // Price unchanged since last fetch - skip download and parse
+    currentPricing.lastUpdate = millis();
+  } else if (httpCode == HTTP_CODE_OK) {
+    // Read straight into a stack buffer - no JSON parse or heap String
+    uint8_t buf[sizeof(BinaryPrice)];
+    WiFiClient* stream = http.getStreamPtr();
+    size_t len = stream->readBytes(buf, sizeof(buf));
+    if (http.getSize() == (int)sizeof(buf) && applyBinaryPricing(buf, len)) {
+      pricingEtag = http.header("ETag");
+    } else {
+      Serial.println("Pricing payload rejected (schema mismatch)");
     }
   } else {
     Serial.printf("Pricing fetch failed: %d\n", httpCode);
@@ -280,6 +336,9 @@ void connectMQTT() {
     mqttClient.subscribe(TOPIC_MODE);
     Serial.println("Subscribed to mode topic");
     
+    // Retained price arrives immediately on subscribe
+    mqttClient.subscribe(TOPIC_PRICING);
+    
     // Publish current mode
     publishModeChange();
   } else {
@@ -436,8 +495,11 @@ void loop() {
     lastDHTread = now;
   }
   
-  // Fetch pricing (every 5 minutes)
-  if (now - lastPriceFetch >= PRICE_FETCH_INTERVAL || lastPriceFetch == 0) {
+  // Fall back to HTTP pricing (every 5 minutes) while MQTT is down or its
+  // last price push is overdue
+  bool mqttPriceStale = !mqttClient.connected() || lastMqttPriceMs == 0 ||
+                        now - lastMqttPriceMs >= PRICE_FETCH_INTERVAL + MQTT_PRICE_GRACE;
+  if (mqttPriceStale && (now - lastPriceFetch >= PRICE_FETCH_INTERVAL || lastPriceFetch == 0)) {
     fetchComedPricing();
     lastPriceFetch = now;
   }
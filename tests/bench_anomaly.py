@@ -0,0 +1,76 @@
+"""
+Anomaly detector throughput benchmark
+Feeds pre-serialized telemetry for many rooms through handle_message (JSON
+parsing included, publishing stubbed out) and reports messages per second,
+alerts raised and state memory per room.
+
+    python tests/bench_anomaly.py --rooms 1000 5000 --messages 200000
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'api'))
+
+from anomaly_detector import AnomalyDetector  # noqa: E402
+
+STEP_MS = 5000
+
+
+def messages(rooms, count, rng):
+    """(topic, payload, millis) in arrival order, a round-robin over rooms"""
+    base_amps = rng.uniform(0.2, 3.0, rooms)
+    base_temp = rng.uniform(21, 27, rooms)
+    out = []
+    for i in range(count):
+        room = i % rooms
+        tick = i // rooms
+        amps = base_amps[room] + rng.normal(0, 0.05)
+        if rng.random() < 0.0005:
+            amps += 5.0
+        data = {'ts': tick * STEP_MS, 'tC': round(base_temp[room] + rng.normal(0, 0.05), 1), 'rh': 40,
+                'dist': 80, 'pir': int(rng.random() < 0.5), 'voltage': 120, 'amps': round(amps, 3),
+                'fan': bool(room % 3 == 0), 'lamp': False, 'ecoMode': 1}
+        out.append((f'sensors/room{room}/telemetry', json.dumps(data).encode(), tick * STEP_MS))
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rooms', type=int, nargs='+', default=[100, 1000, 5000])
+    parser.add_argument('--messages', type=int, default=200000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'rooms':>7} {'msgs/s':>10} {'us/msg':>8} {'alerts':>7} {'bytes/room':>11}")
+    for rooms in args.rooms:
+        batch = messages(rooms, args.messages, rng)
+        published = []
+        detector = AnomalyDetector(publish=lambda topic, alert: published.append(topic))
+
+        start = time.perf_counter()
+        for topic, payload, millis in batch:
+            detector.handle_message(topic, payload, millis)
+        elapsed = time.perf_counter() - start
+
+        # State size, measured separately so tracing doesn't skew the timing
+        tracemalloc.start()
+        sized = AnomalyDetector()
+        for topic, payload, millis in batch[:rooms * 3]:
+            sized.handle_message(topic, payload, millis)
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        rate = len(batch) / elapsed
+        print(f"{rooms:>7} {rate:>10.0f} {elapsed / len(batch) * 1e6:>8.1f} {len(published):>7} "
+              f"{memory / rooms:>11.0f}")
+
+
+if __name__ == '__main__':
+    main()
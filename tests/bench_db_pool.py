@@ -0,0 +1,136 @@
+"""
+Benchmark: per-call sqlite3.connect vs pooled WAL connections
+Runs reader threads against the history/stats queries while a writer
+inserts prices, then prints p50/p99 latency for each mode.
+
+    python tests/bench_db_pool.py [--readers 8] [--requests 500]
+"""
+
+import argparse
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'api'))
+# Keep the API module's own databases out of the working directory
+os.environ.setdefault('PRICE_DB_PATH', ':memory:')
+os.environ.setdefault('TELEMETRY_DB_PATH', ':memory:')
+
+from comed_pricing_api import PriceDatabase
+
+
+class LegacyPriceDatabase:
+    """The original connect-per-call access pattern, kept as the baseline"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+
+    def insert_price(self, timestamp, price, tier, millis_utc):
+        conn = sqlite3.connect(self.db_path)
+        conn.execute(
+            'INSERT INTO prices (timestamp, price_cents_per_kwh, tier, millisUTC) VALUES (?, ?, ?, ?)',
+            (timestamp, price, tier, millis_utc))
+        conn.commit()
+        conn.close()
+
+    def get_recent_prices(self, hours=24):
+        conn = sqlite3.connect(self.db_path)
+        rows = conn.execute('''
+            SELECT timestamp, price_cents_per_kwh, tier, millisUTC FROM prices
+            WHERE timestamp > datetime('now', '-' || ? || ' hours')
+            ORDER BY timestamp DESC''', (hours,)).fetchall()
+        conn.close()
+        return rows
+
+    def get_price_stats(self, hours=24):
+        conn = sqlite3.connect(self.db_path)
+        row = conn.execute('''
+            SELECT AVG(price_cents_per_kwh), MIN(price_cents_per_kwh),
+                   MAX(price_cents_per_kwh), COUNT(*) FROM prices
+            WHERE timestamp > datetime('now', '-' || ? || ' hours')''', (hours,)).fetchone()
+        conn.close()
+        return row
+
+
+def seed(db_path, rows):
+    db = PriceDatabase(db_path)
+    start = datetime.now() - timedelta(minutes=5 * rows)
+    with db.pool.transaction() as conn:
+        conn.executemany(
+            'INSERT INTO prices (timestamp, price_cents_per_kwh, tier, millisUTC) VALUES (?, ?, ?, ?)',
+            [((start + timedelta(minutes=5 * i)).isoformat(), 3.0 + (i % 40) / 4, 'normal',
+              int((start + timedelta(minutes=5 * i)).timestamp() * 1000)) for i in range(rows)])
+    db.close()
+
+
+def run(db, readers, requests_per_reader):
+    latencies = []
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def writer():
+        while not stop.is_set():
+            now = datetime.now()
+            db.insert_price(now.isoformat(), 5.0, 'normal', int(now.timestamp() * 1000))
+            time.sleep(0.005)
+
+    def reader(n):
+        local = []
+        for i in range(requests_per_reader):
+            start = time.perf_counter()
+            if i % 2:
+                db.get_recent_prices(6)
+            else:
+                db.get_price_stats(24)
+            local.append((time.perf_counter() - start) * 1000)
+        with lock:
+            latencies.extend(local)
+
+    w = threading.Thread(target=writer, daemon=True)
+    w.start()
+    threads = [threading.Thread(target=reader, args=(n,)) for n in range(readers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    stop.set()
+    w.join()
+
+    latencies.sort()
+    return {
+        'p50': statistics.median(latencies),
+        'p99': latencies[int(len(latencies) * 0.99) - 1],
+        'count': len(latencies)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--rows', type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench.db')
+        seed(db_path, args.rows)
+
+        # Legacy mode runs against the same (now WAL) file; the cost measured
+        # is the per-call connect + schema parse + lock contention.
+        before = run(LegacyPriceDatabase(db_path), args.readers, args.requests)
+        pooled = PriceDatabase(db_path, pool_size=args.readers + 1)
+        after = run(pooled, args.readers, args.requests)
+        pooled.close()
+
+    print(f"{'mode':<10} {'requests':>9} {'p50 ms':>9} {'p99 ms':>9}")
+    for name, r in (('before', before), ('after', after)):
+        print(f"{name:<10} {r['count']:>9} {r['p50']:>9.3f} {r['p99']:>9.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+Walk-forward backtest of the price forecaster
+Fits on the first --train-days of prices, then feeds the rest one price
+at a time through update() and, every --every-hours, compares the 24 h
+forecast against what actually happened. Reports MAE by horizon next to
+persistence and the old flat 24 h average, band coverage, and fit /
+update / forecast timings.
+
+    python tests/bench_forecast.py --days 120             # synthetic prices
+    python tests/bench_forecast.py --db comed_prices.db   # stored history
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'api'))
+
+from price_forecast import DAY_SLOTS, SLOT_MS, PriceForecaster  # noqa: E402
+from replay import stored_prices, synthetic_prices  # noqa: E402
+
+HORIZONS = {'5min': 1, '1h': 12, '6h': 72, '24h': 288}
+
+
+def backtest(millis, prices, train_days, every_hours):
+    train = np.searchsorted(millis, millis[0] + train_days * 86400000)
+    model = PriceForecaster()
+    model.fit(millis[:train], prices[:train])
+
+    errors = {name: {h: [] for h in HORIZONS} for name in ('model', 'persistence', 'flat_24h')}
+    covered = total = 0
+    update_seconds, forecast_seconds = [], []
+    next_check = millis[train - 1]
+
+    for i in range(train, len(millis)):
+        if millis[i - 1] >= next_check:
+            next_check = millis[i - 1] + every_hours * 3600000
+            start = time.perf_counter()
+            forecast = model.forecast()
+            forecast_seconds.append(time.perf_counter() - start)
+            # Positions of the actual prices at each forecast slot (gaps are skipped)
+            offsets = (millis[i:i + DAY_SLOTS] - forecast['start']) // SLOT_MS
+            flat = prices[max(0, i - DAY_SLOTS):i].mean()
+            for name, steps in HORIZONS.items():
+                match = np.flatnonzero(offsets == steps - 1)
+                if len(match) == 0:
+                    continue
+                actual = prices[i + match[0]]
+                errors['model'][name].append(abs(forecast['point'][steps - 1] - actual))
+                errors['persistence'][name].append(abs(prices[i - 1] - actual))
+                errors['flat_24h'][name].append(abs(flat - actual))
+            valid = offsets < DAY_SLOTS
+            actual = prices[i:i + DAY_SLOTS][valid]
+            idx = offsets[valid]
+            covered += int(np.sum((actual >= forecast['p10'][idx]) & (actual <= forecast['p90'][idx])))
+            total += len(idx)
+
+        start = time.perf_counter()
+        model.update(int(millis[i]), float(prices[i]))
+        update_seconds.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    PriceForecaster().fit(millis, prices)
+    fit_seconds = time.perf_counter() - start
+
+    return {
+        'mae': {name: {h: float(np.mean(v)) if v else None for h, v in by_h.items()}
+                for name, by_h in errors.items()},
+        'band_coverage': covered / total if total else None,
+        'fit_ms': fit_seconds * 1000,
+        'update_us': float(np.mean(update_seconds)) * 1e6 if update_seconds else None,
+        'forecast_ms': float(np.mean(forecast_seconds)) * 1000 if forecast_seconds else None,
+        'samples': len(millis),
+        'forecasts': len(forecast_seconds)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--db', help='price database to backtest on (default: synthetic prices)')
+    parser.add_argument('--days', type=int, default=120, help='days of synthetic prices')
+    parser.add_argument('--train-days', type=int, default=28)
+    parser.add_argument('--every-hours', type=int, default=6)
+    args = parser.parse_args()
+
+    millis, prices = stored_prices(args.db, 0, 2 ** 62) if args.db else synthetic_prices(args.days)
+    result = backtest(millis, prices, args.train_days, args.every_hours)
+
+    print(f"{result['samples']} prices, {result['forecasts']} forecasts")
+    print(f"{'MAE (¢/kWh)':<14}" + ''.join(f"{h:>9}" for h in HORIZONS))
+    for name, by_h in result['mae'].items():
+        print(f"{name:<14}" + ''.join(f"{v:>9.3f}" if v is not None else f"{'-':>9}" for v in by_h.values()))
+    if result['band_coverage'] is not None:
+        print(f"p10-p90 coverage: {result['band_coverage']:.1%}")
+    print(f"Full fit: {result['fit_ms']:.1f} ms   update: {result['update_us']:.1f} us   "
+          f"forecast: {result['forecast_ms']:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,217 @@
+"""
+Load-testing benchmark for the pricing API
+Starts the app in-process on a seeded SQLite database with a stubbed
+ComEd source (or targets --url), then drives concurrent simulated ESP32
+pollers and dashboards. Reports throughput and p50/p95/p99 latency per
+endpoint and saves the results as JSON so runs can be compared across
+commits.
+
+    python tests/bench_load.py --esp32 200 --dashboards 20 --duration 15 \\
+        --output results.json [--compare baseline.json]
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from urllib.parse import urlparse
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+API_DIR = os.path.join(os.path.dirname(TESTS_DIR), 'api')
+
+ESP32_ENDPOINTS = ['/api/price/esp32']
+DASHBOARD_ENDPOINTS = ['/api/price/current', '/api/price/stats?hours=24', '/api/price/history?hours=6']
+FIVE_MIN_MS = 5 * 60 * 1000
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def start_in_process_server(seed_hours):
+    """Seed a temp database, stub ComEd and serve the app on a free port; returns base URL"""
+    sys.path.insert(0, TESTS_DIR)
+    sys.path.insert(0, API_DIR)
+    from comed_stub import ComEdStub
+
+    stub = ComEdStub().__enter__()
+    tmp = tempfile.mkdtemp(prefix='smart-energy-load-')
+    os.environ['PRICE_DB_PATH'] = os.path.join(tmp, 'load.db')
+    os.environ['TELEMETRY_DB_PATH'] = os.path.join(tmp, 'telemetry.db')
+    os.environ['COMED_API_URL'] = stub.url
+    os.environ.pop('MQTT_BROKER', None)
+
+    import logging
+    from werkzeug.serving import make_server
+    import comed_pricing_api as api
+
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    now = api.now_millis()
+    rng = random.Random(1)
+    rows = []
+    for i in range(seed_hours * 12):
+        millis = now - (seed_hours * 12 - i) * FIVE_MIN_MS
+        price = round(max(-1.0, rng.gauss(5, 3)), 1)
+        rows.append((datetime.fromtimestamp(millis / 1000).isoformat(), price,
+                     api.determine_price_tier(price), millis))
+    api.db.insert_prices(rows)
+    stub.current = [{'millisUTC': str(now), 'price': '4.7'}]
+    api.fetch_market_price()
+
+    server = make_server('127.0.0.1', 0, api.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}"
+
+
+class Recorder:
+    """Collects latency samples per endpoint from many client threads"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {}
+        self.errors = {}
+
+    def record(self, endpoint, millis, ok):
+        with self._lock:
+            if ok:
+                self.samples.setdefault(endpoint, []).append(millis)
+            else:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+    def summary(self, duration):
+        endpoints = {}
+        for endpoint in sorted(set(self.samples) | set(self.errors)):
+            values = sorted(self.samples.get(endpoint, []))
+            endpoints[endpoint] = {
+                'requests': len(values),
+                'errors': self.errors.get(endpoint, 0),
+                'throughput_rps': round(len(values) / duration, 1),
+                'p50_ms': round(percentile(values, 50), 3),
+                'p95_ms': round(percentile(values, 95), 3),
+                'p99_ms': round(percentile(values, 99), 3)
+            }
+        return endpoints
+
+
+def simulated_client(base_url, endpoints, think_ms, revalidate, deadline, recorder):
+    """Closed-loop client on one keep-alive connection"""
+    url = urlparse(base_url)
+    conn = http.client.HTTPConnection(url.hostname, url.port, timeout=10)
+    etags = {}
+    rng = random.Random()
+    # Spread start times so clients don't march in lockstep
+    time.sleep(rng.uniform(0, think_ms / 1000))
+    while time.time() < deadline:
+        for endpoint in endpoints:
+            headers = {}
+            if revalidate and endpoint in etags:
+                headers['If-None-Match'] = etags[endpoint]
+            start = time.perf_counter()
+            try:
+                conn.request('GET', endpoint, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                ok = response.status in (200, 304)
+                if response.getheader('ETag'):
+                    etags[endpoint] = response.getheader('ETag')
+            except (OSError, http.client.HTTPException):
+                ok = False
+                conn.close()
+                conn = http.client.HTTPConnection(url.hostname, url.port, timeout=10)
+            recorder.record(endpoint, (time.perf_counter() - start) * 1000, ok)
+        if think_ms:
+            time.sleep(think_ms / 1000 * rng.uniform(0.5, 1.5))
+    conn.close()
+
+
+def run_load(base_url, esp32=100, dashboards=10, duration=10.0, esp32_think_ms=100,
+             dashboard_think_ms=500, revalidate=True):
+    """Drive the mixed workload against base_url and return per-endpoint results"""
+    recorder = Recorder()
+    deadline = time.time() + duration
+    threads = [
+        threading.Thread(target=simulated_client,
+                         args=(base_url, ESP32_ENDPOINTS, esp32_think_ms, revalidate, deadline, recorder))
+        for _ in range(esp32)
+    ] + [
+        threading.Thread(target=simulated_client,
+                         args=(base_url, DASHBOARD_ENDPOINTS, dashboard_think_ms, revalidate, deadline, recorder))
+        for _ in range(dashboards)
+    ]
+    started = time.time()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return recorder.summary(time.time() - started)
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=TESTS_DIR,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(endpoints, baseline=None):
+    header = f"{'endpoint':<28} {'req':>7} {'err':>5} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8}"
+    if baseline:
+        header += f" {'p99 vs base':>12}"
+    print(header)
+    for endpoint, r in endpoints.items():
+        line = (f"{endpoint:<28} {r['requests']:>7} {r['errors']:>5} {r['throughput_rps']:>8.1f} "
+                f"{r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f}")
+        base = (baseline or {}).get(endpoint)
+        if base and base['p99_ms']:
+            line += f" {(r['p99_ms'] / base['p99_ms'] - 1) * 100:>+11.1f}%"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--url', help='target a running server instead of starting one in-process')
+    parser.add_argument('--esp32', type=int, default=200, help='simulated ESP32 pollers')
+    parser.add_argument('--dashboards', type=int, default=20, help='simulated dashboards')
+    parser.add_argument('--duration', type=float, default=15)
+    parser.add_argument('--esp32-think-ms', type=float, default=100)
+    parser.add_argument('--dashboard-think-ms', type=float, default=500)
+    parser.add_argument('--no-revalidate', action='store_true', help="don't send If-None-Match")
+    parser.add_argument('--seed-hours', type=int, default=168)
+    parser.add_argument('--output', help='write results JSON here')
+    parser.add_argument('--compare', help='baseline results JSON to compare p99 against')
+    args = parser.parse_args()
+
+    base_url = args.url or start_in_process_server(args.seed_hours)
+    endpoints = run_load(base_url, args.esp32, args.dashboards, args.duration,
+                         args.esp32_think_ms, args.dashboard_think_ms, not args.no_revalidate)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['endpoints']
+    print_results(endpoints, baseline)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'commit': git_commit(),
+                'timestamp': datetime.now().isoformat(),
+                'config': {k: v for k, v in vars(args).items() if k not in ('output', 'compare')},
+                'endpoints': endpoints
+            }, f, indent=2)
+        print(f"Saved results to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
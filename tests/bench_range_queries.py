@@ -0,0 +1,92 @@
+"""
+Benchmark: range query latency vs table size
+Seeds databases with 5-minute synthetic prices at increasing sizes and
+times the 24h history and stats queries. With the millisUTC index the
+latency should stay flat as the table grows. "rollup ms" is the
+in-memory rolling stats get_price_stats serves (loaded after seeding);
+--legacy also times the old ISO-string scan for comparison.
+
+    python tests/bench_range_queries.py [--sizes 10000 100000 1000000] [--legacy]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'api'))
+# Keep the API module's own databases out of the working directory
+os.environ.setdefault('PRICE_DB_PATH', ':memory:')
+os.environ.setdefault('TELEMETRY_DB_PATH', ':memory:')
+
+from comed_pricing_api import PriceDatabase, now_millis
+
+FIVE_MIN_MS = 5 * 60 * 1000
+LEGACY_STATS_SQL = '''
+    SELECT AVG(price_cents_per_kwh), MIN(price_cents_per_kwh),
+           MAX(price_cents_per_kwh), COUNT(*) FROM prices
+    WHERE timestamp > datetime('now', '-' || ? || ' hours')
+'''
+
+
+def seed(db, rows):
+    """Insert `rows` 5-minute samples ending now"""
+    end = now_millis()
+    start = end - rows * FIVE_MIN_MS
+
+    def generate():
+        for i in range(rows):
+            ms = start + i * FIVE_MIN_MS
+            yield (time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(ms / 1000)),
+                   3.0 + (i % 97) / 10, 'normal', ms)
+
+    with db.pool.transaction() as conn:
+        conn.executemany(
+            'INSERT INTO prices (timestamp, price_cents_per_kwh, tier, millisUTC) VALUES (?, ?, ?, ?)',
+            generate())
+
+
+def time_call(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--legacy', action='store_true', help='also time the old ISO-string scan')
+    args = parser.parse_args()
+
+    header = f"{'rows':>10} {'history ms':>11} {'stats ms':>9} {'rollup ms':>10}"
+    if args.legacy:
+        header += f" {'legacy ms':>10}"
+    print(header)
+
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            db = PriceDatabase(os.path.join(tmp, 'bench.db'))
+            seed(db, size)
+            history = time_call(lambda: db.get_recent_prices(24), args.repeat)
+            stats = time_call(lambda: db.query_price_stats(24), args.repeat)
+            # Rows went in through the raw pool, so the rollup must be rebuilt
+            db.load_rollup()
+            rollup = time_call(lambda: db.get_price_stats(24), args.repeat)
+            line = f"{size:>10} {history:>11.3f} {stats:>9.3f} {rollup:>10.3f}"
+            if args.legacy:
+                with db.pool.connection() as conn:
+                    legacy = time_call(lambda: conn.execute(LEGACY_STATS_SQL, (24,)).fetchone(),
+                                       max(1, args.repeat // 10))
+                line += f" {legacy:>10.3f}"
+            print(line)
+            db.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""
+Scheduler scaling benchmark
+Times load_scheduler.optimize for growing numbers of rooms, each with an
+AC (thermal DP) and a fan (shiftable), over a 24 h 5-minute price curve.
+
+    python tests/bench_schedule.py --rooms 50 100 250 500
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'api'))
+
+from load_scheduler import optimize  # noqa: E402
+
+
+def room_devices(rooms, rng):
+    devices = []
+    for room in range(rooms):
+        low = float(rng.uniform(20, 23))
+        devices.append({'id': f'room{room}/ac', 'watts': 1500, 'temp': low + 2, 'comfort_min': low,
+                        'comfort_max': low + 4, 'cooling_per_hour': float(rng.uniform(2, 4)),
+                        'warming_per_hour': float(rng.uniform(0.5, 1.5))})
+        devices.append({'id': f'room{room}/fan', 'watts': 80, 'runtime_minutes': int(rng.integers(30, 480)),
+                        'deadline_minutes': 1440})
+    return devices
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rooms', type=int, nargs='+', default=[50, 100, 250, 500])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    hours = np.arange(288) / 12
+    prices = 4 + 3 * np.exp(-((hours - 17) / 3) ** 2) + rng.normal(0, 0.5, 288)
+
+    print(f"{'rooms':>6} {'devices':>8} {'best ms':>9} {'savings ¢':>10}")
+    for rooms in args.rooms:
+        devices = room_devices(rooms, rng)
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            result = optimize(devices, prices, 0)
+            timings.append(time.perf_counter() - start)
+        print(f"{rooms:>6} {len(devices):>8} {min(timings) * 1000:>9.1f} {result['total_savings_cents']:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
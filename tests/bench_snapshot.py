@@ -0,0 +1,166 @@
+"""
+Benchmark: locked dict + per-request serialization vs immutable snapshots
+Reader threads fetch the full and ESP32 payloads while a writer publishes
+a new price every --write-ms. The "locked" baseline is the old pattern
+(take price_lock, build the ESP32 dict, serialize); "snapshot" grabs the
+current PriceSnapshot reference and uses its pre-built bytes. With
+--endpoints the same comparison also runs through the Flask test client.
+Prints reads/s, p99 latency and how often the lock was contended.
+
+    python tests/bench_snapshot.py [--threads 1 8 32 128] [--reads 2000] [--write-ms 1]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'api'))
+# Keep the API module's own databases out of the working directory
+_tmp = tempfile.mkdtemp(prefix='smart-energy-snapshot-')
+os.environ.setdefault('PRICE_DB_PATH', os.path.join(_tmp, 'prices.db'))
+os.environ.setdefault('TELEMETRY_DB_PATH', os.path.join(_tmp, 'telemetry.db'))
+
+from metrics import Histogram, InstrumentedLock
+from price_snapshot import PriceSnapshot, esp32_payload
+
+STATE = {
+    'price_cents_per_kwh': 4.5,
+    'timestamp': '2024-01-01T12:00:00',
+    'millisUTC': 1704110400000,
+    'status': 'active',
+    'tier': 'low',
+    'recommendation': {'action': 'normal_plus', 'suggested_temp_offset': -1,
+                       'message': 'Low prices - good time for normal usage'}
+}
+
+
+class LockedState:
+    """The original shared dict guarded by price_lock, kept as the baseline"""
+
+    def __init__(self):
+        self.lock = InstrumentedLock(Histogram('lock_wait', '', ('lock',)), 'price')
+        self.data = dict(STATE)
+
+    def update(self, i):
+        with self.lock:
+            self.data.update(price_cents_per_kwh=4.0 + i % 100 / 10, millisUTC=STATE['millisUTC'] + i)
+
+    def read(self, i):
+        with self.lock:
+            if i % 2:
+                return json.dumps(self.data).encode()
+            return json.dumps(esp32_payload(self.data)).encode()
+
+
+class SnapshotState:
+    def __init__(self):
+        self.lock = InstrumentedLock(Histogram('lock_wait', '', ('lock',)), 'price')
+        self.snapshot = PriceSnapshot(STATE)
+
+    def update(self, i):
+        with self.lock:
+            self.snapshot = self.snapshot.replace(price_cents_per_kwh=4.0 + i % 100 / 10,
+                                                  millisUTC=STATE['millisUTC'] + i)
+
+    def read(self, i):
+        snapshot = self.snapshot
+        return snapshot.json if i % 2 else snapshot.esp32_json
+
+
+def run(threads, reads, write_ms, update, read):
+    latencies = []
+    latencies_lock = threading.Lock()
+    stop = threading.Event()
+    start_gate = threading.Barrier(threads + 1)
+
+    def writer():
+        i = 0
+        while not stop.is_set():
+            i += 1
+            update(i)
+            time.sleep(write_ms / 1000)
+
+    def reader():
+        local = []
+        start_gate.wait()
+        for i in range(reads):
+            t = time.perf_counter()
+            read(i)
+            local.append(time.perf_counter() - t)
+        with latencies_lock:
+            latencies.extend(local)
+
+    w = threading.Thread(target=writer, daemon=True)
+    w.start()
+    pool = [threading.Thread(target=reader) for _ in range(threads)]
+    for t in pool:
+        t.start()
+    start_gate.wait()
+    started = time.perf_counter()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - started
+    stop.set()
+    w.join()
+
+    latencies.sort()
+    return {
+        'reads_per_s': len(latencies) / elapsed,
+        'p99_us': latencies[int(len(latencies) * 0.99) - 1] * 1e6
+    }
+
+
+def endpoint_modes():
+    """(name, update, read) running the real routes through the test client"""
+    import comed_pricing_api as api
+    client_local = threading.local()
+
+    def client():
+        if not hasattr(client_local, 'client'):
+            client_local.client = api.app.test_client()
+        return client_local.client
+
+    def update(i):
+        with api.price_lock:
+            api.publish_snapshot(api.current_snapshot().replace(
+                price_cents_per_kwh=4.0 + i % 100 / 10, millisUTC=STATE['millisUTC'] + i))
+        api.response_cache.invalidate()
+
+    def read(i):
+        client().get('/api/price/current' if i % 2 else '/api/price/esp32').get_data()
+
+    with api.price_lock:
+        api.publish_snapshot(api.PriceSnapshot(STATE))
+    return [('endpoints', update, read, api.price_lock)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 8, 32, 128])
+    parser.add_argument('--reads', type=int, default=2000, help='reads per thread')
+    parser.add_argument('--write-ms', type=float, default=1.0,
+                        help='delay between updates (production is one per 5 minutes)')
+    parser.add_argument('--endpoints', action='store_true', help='also benchmark the HTTP routes')
+    args = parser.parse_args()
+
+    print(f"{'mode':<10} {'threads':>7} {'reads/s':>11} {'p99 us':>9} {'contended':>10}")
+    for threads in args.threads:
+        modes = []
+        for name, cls in (('locked', LockedState), ('snapshot', SnapshotState)):
+            state = cls()
+            modes.append((name, state.update, state.read, state.lock))
+        if args.endpoints:
+            modes += endpoint_modes()
+        for name, update, read, lock in modes:
+            contended = lock.contended
+            result = run(threads, args.reads, args.write_ms, update, read)
+            print(f"{name:<10} {threads:>7} {result['reads_per_s']:>11,.0f} "
+                  f"{result['p99_us']:>9.1f} {lock.contended - contended:>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""
+Benchmark: thousands of idle price stream subscribers vs API latency
+Starts the API under gunicorn (gthread workers plus each worker's evented
+stream server) against a temporary database and a local ComEd stub, opens
+--subscribers SSE streams through the /api/price/stream redirect, and
+times /api/price/esp32 before and while they are held. Prints p50/p99
+latency, open streams per the stream server and how many subscribers
+received a pushed price.
+
+    python tests/bench_stream_subscribers.py [--subscribers 5000] [--requests 200] [--workers 1]
+"""
+
+import argparse
+import asyncio
+import http.client
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import urlparse
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+API_DIR = os.path.join(os.path.dirname(TESTS_DIR), 'api')
+sys.path.insert(0, TESTS_DIR)
+
+from bench_workers import wait_ready
+from comed_stub import ComEdStub
+
+
+def time_requests(port, count):
+    """p50 / p99 ms of sequential keep-alive GET /api/price/esp32"""
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    samples = []
+    for _ in range(count):
+        start = time.perf_counter()
+        conn.request('GET', '/api/price/esp32')
+        response = conn.getresponse()
+        response.read()
+        if response.status != 200:
+            raise RuntimeError(f"/api/price/esp32 returned {response.status}")
+        samples.append((time.perf_counter() - start) * 1000)
+    conn.close()
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.99) - 1]
+
+
+def stream_location(port):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    conn.request('GET', '/api/price/stream')
+    response = conn.getresponse()
+    response.read()
+    conn.close()
+    if response.status != 307:
+        raise RuntimeError(f"Expected a redirect to the stream server, got {response.status}")
+    return urlparse(response.headers['Location']).port
+
+
+async def hold_subscribers(stream_port, api_port, subscribers, requests):
+    async def subscribe():
+        reader, writer = await asyncio.open_connection('127.0.0.1', stream_port)
+        writer.write(b'GET /api/price/stream HTTP/1.1\r\nHost: localhost\r\n\r\n')
+        await writer.drain()
+        await reader.readuntil(b'\r\n\r\n')
+        return reader, writer
+
+    started = time.perf_counter()
+    streams = []
+    for i in range(0, subscribers, 500):
+        streams += await asyncio.gather(*(subscribe() for _ in range(min(500, subscribers - i))))
+    connect_s = time.perf_counter() - started
+
+    p50, p99 = await asyncio.to_thread(time_requests, api_port, requests)
+
+    async def first_price(reader):
+        while not (await reader.readuntil(b'\n\n')).startswith(b'id: '):
+            pass
+
+    # The worker pushes its current price to every new stream right away
+    received = await asyncio.gather(*(asyncio.wait_for(first_price(r), 30) for r, _ in streams),
+                                    return_exceptions=True)
+    for _, writer in streams:
+        writer.close()
+    return connect_s, p50, p99, sum(r is None for r in received)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--subscribers', type=int, default=5000)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--port', type=int, default=5057)
+    args = parser.parse_args()
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (min(hard, max(soft, args.subscribers * 2 + 256)), hard))
+
+    with ComEdStub() as stub, tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ,
+                   PORT=str(args.port),
+                   WEB_CONCURRENCY=str(args.workers),
+                   GUNICORN_THREADS=str(args.threads),
+                   PRICE_DB_PATH=os.path.join(tmp, 'bench.db'),
+                   TELEMETRY_DB_PATH=os.path.join(tmp, 'telemetry.db'),
+                   COMED_API_URL=stub.url)
+        env.pop('MQTT_BROKER', None)
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--log-level', 'warning',
+             'comed_pricing_api:app'],
+            cwd=API_DIR, env=env)
+        try:
+            wait_ready(args.port)
+            # Give the fetcher its first poll so streams have a price to push
+            time.sleep(1)
+            stream_port = stream_location(args.port)
+            idle_p50, idle_p99 = time_requests(args.port, args.requests)
+            connect_s, p50, p99, received = asyncio.run(
+                hold_subscribers(stream_port, args.port, args.subscribers, args.requests))
+        finally:
+            server.terminate()
+            server.wait()
+
+    print(f"{args.workers} worker(s) x {args.threads} threads, {args.subscribers} subscribers "
+          f"connected in {connect_s:.2f}s, {received} received the current price")
+    print(f"{'':<20} {'p50 ms':>8} {'p99 ms':>8}")
+    print(f"{'no subscribers':<20} {idle_p50:>8.2f} {idle_p99:>8.2f}")
+    print(f"{'with subscribers':<20} {p50:>8.2f} {p99:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
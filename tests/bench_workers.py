@@ -0,0 +1,109 @@
+"""
+Benchmark: /api/price/esp32 throughput with 1 vs N gunicorn workers
+Starts the API under gunicorn against a temporary database and a local
+ComEd stub, hammers the ESP32 endpoint from several client processes
+over keep-alive connections and prints requests/sec per worker count.
+
+    python tests/bench_workers.py [--workers 1 4] [--clients 8] [--duration 10]
+"""
+
+import argparse
+import http.client
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+API_DIR = os.path.join(os.path.dirname(TESTS_DIR), 'api')
+sys.path.insert(0, TESTS_DIR)
+
+from comed_stub import ComEdStub
+
+
+def client(port, duration, result_queue):
+    """Issue sequential keep-alive GETs until the deadline; report count"""
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    count = errors = 0
+    deadline = time.time() + duration
+    while time.time() < deadline:
+        try:
+            conn.request('GET', '/api/price/esp32')
+            response = conn.getresponse()
+            response.read()
+            if response.status == 200:
+                count += 1
+            else:
+                errors += 1
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            conn.close()
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    result_queue.put((count, errors))
+
+
+def wait_ready(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            conn.request('GET', '/api/health')
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError('gunicorn did not start')
+
+
+def run(workers, clients, duration, port, stub_url):
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ,
+                   PORT=str(port),
+                   WEB_CONCURRENCY=str(workers),
+                   PRICE_DB_PATH=os.path.join(tmp, 'bench.db'),
+                   TELEMETRY_DB_PATH=os.path.join(tmp, 'telemetry.db'),
+                   COMED_API_URL=stub_url)
+        env.pop('MQTT_BROKER', None)
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--log-level', 'warning',
+             'comed_pricing_api:app'],
+            cwd=API_DIR, env=env)
+        try:
+            wait_ready(port)
+            queue = multiprocessing.Queue()
+            procs = [multiprocessing.Process(target=client, args=(port, duration, queue))
+                     for _ in range(clients)]
+            for p in procs:
+                p.start()
+            results = [queue.get() for _ in procs]
+            for p in procs:
+                p.join()
+        finally:
+            server.terminate()
+            server.wait()
+
+    total = sum(r[0] for r in results)
+    errors = sum(r[1] for r in results)
+    return total / duration, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4])
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--port', type=int, default=5055)
+    args = parser.parse_args()
+
+    with ComEdStub() as stub:
+        print(f"{'workers':>8} {'req/s':>10} {'errors':>7}")
+        for workers in args.workers:
+            rps, errors = run(workers, args.clients, args.duration, args.port, stub.url)
+            print(f"{workers:>8} {rps:>10.0f} {errors:>7}")
+
+
+if __name__ == '__main__':
+    main()
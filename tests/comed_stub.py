@@ -0,0 +1,72 @@
+"""
+Local HTTP stand-in for the ComEd hourly pricing API
+"""
+
+import json
+import threading
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from zoneinfo import ZoneInfo
+
+CHICAGO = ZoneInfo('America/Chicago')
+
+
+class ComEdStub:
+    """Serves ?type=currenthouraverage / ?type=5minutefeed from in-memory prices"""
+
+    def __init__(self):
+        self.current = [{'millisUTC': '1704110400000', 'price': '4.5'}]
+        self.feed = []
+        self.fail_next = 0          # Answer this many requests with 503
+        self.requests = []          # (query, client port) per request
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'   # Allow keep-alive
+
+            def do_GET(self):
+                query = parse_qs(urlparse(self.path).query)
+                stub.requests.append((query, self.client_address[1]))
+                if stub.fail_next > 0:
+                    stub.fail_next -= 1
+                    self._send(503, b'unavailable')
+                    return
+                if query.get('type') == ['5minutefeed']:
+                    body = stub.feed_for(query)
+                else:
+                    body = stub.current
+                self._send(200, json.dumps(body).encode())
+
+            def _send(self, status, body):
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/api"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def feed_for(self, query):
+        """5-minute feed rows within datestart/dateend (Central YYYYMMDDhhmm), newest first"""
+        rows = self.feed
+        if 'datestart' in query:
+            start = datetime.strptime(query['datestart'][0], '%Y%m%d%H%M').replace(tzinfo=CHICAGO).timestamp() * 1000
+            rows = [r for r in rows if int(r['millisUTC']) >= start]
+        if 'dateend' in query:
+            end = datetime.strptime(query['dateend'][0], '%Y%m%d%H%M').replace(tzinfo=CHICAGO).timestamp() * 1000
+            rows = [r for r in rows if int(r['millisUTC']) < end]
+        return sorted(rows, key=lambda r: int(r['millisUTC']), reverse=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,15 @@
+"""
+Shared pytest setup: make the api/ modules importable and keep the
+pricing API's module-level databases out of the working directory
+"""
+
+import os
+import sys
+import tempfile
+
+API_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'api')
+sys.path.insert(0, API_DIR)
+
+_tmp = tempfile.mkdtemp(prefix='smart-energy-tests-')
+os.environ.setdefault('PRICE_DB_PATH', os.path.join(_tmp, 'comed_prices.db'))
+os.environ.setdefault('TELEMETRY_DB_PATH', os.path.join(_tmp, 'telemetry.db'))
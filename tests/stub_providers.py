@@ -0,0 +1,33 @@
+"""
+In-memory price provider for tests and benchmarks (no network)
+"""
+
+import time
+
+import requests
+
+from price_providers import PriceProvider
+
+
+class StubProvider(PriceProvider):
+    """Serves `prices` [(millisUTC, price)], optionally slowly or failing"""
+
+    kind = None
+
+    def __init__(self, market, prices=(), delay=0.0, fail=False, tier_group=None, label=None):
+        super().__init__(market, tier_group, label)
+        self.prices = list(prices)
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+
+    def fetch(self):
+        self.calls += 1
+        if self.delay:
+            time.sleep(self.delay)
+        if self.fail:
+            raise requests.exceptions.ConnectionError(f"{self.market} stub is down")
+        return list(self.prices)
+
+    def parse(self, raw):
+        return raw
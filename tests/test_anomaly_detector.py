@@ -0,0 +1,75 @@
+"""
+Streaming per-room anomaly detection (no broker needed)
+"""
+
+import json
+
+import numpy as np
+
+from anomaly_detector import ALERT_COOLDOWN_MS, AnomalyDetector, IDLE_LOAD_MS
+
+STEP_MS = 5000
+
+
+def reading(**overrides):
+    data = {'tC': 24.0, 'amps': 1.0, 'pir': 1, 'dist': 80, 'fan': True, 'lamp': False}
+    data.update(overrides)
+    return data
+
+
+def test_amps_spike_after_warmup_with_cooldown():
+    published = []
+    detector = AnomalyDetector(publish=lambda topic, alert: published.append((topic, alert)))
+    noise = np.random.default_rng(1).normal(0, 0.03, 100)
+    for i, n in enumerate(noise):
+        assert detector.process('room1', reading(amps=1.0 + n), i * STEP_MS) == []
+
+    [alert] = detector.process('room1', reading(amps=3.5), 100 * STEP_MS)
+    assert alert['type'] == 'amps_spike' and alert['room'] == 'room1' and 'σ' in alert['message']
+    assert published == [('alerts/room1/anomaly', alert)]
+    # Still high a moment later, but within the cooldown
+    assert detector.process('room1', reading(amps=3.6), 101 * STEP_MS) == []
+    assert detector.process('room1', reading(amps=9.0), 100 * STEP_MS + ALERT_COOLDOWN_MS)
+
+
+def test_small_steps_on_a_flat_load_are_ignored():
+    detector = AnomalyDetector()
+    for i in range(50):
+        detector.process('room1', reading(amps=0.5), i * STEP_MS)
+    assert detector.process('room1', reading(amps=0.6), 50 * STEP_MS) == []
+    assert detector.process('room1', reading(amps=2.0), 51 * STEP_MS)[0]['type'] == 'amps_spike'
+
+
+def test_temperature_rise_rate():
+    detector = AnomalyDetector()
+    # Sensor noise of one 0.1 °C step doesn't count as a rise
+    temps = [24.0, 24.1] * 30
+    assert not any(detector.process('room1', reading(tC=t), i * STEP_MS) for i, t in enumerate(temps))
+
+    alerts = []
+    for i in range(60, 120):
+        alerts += detector.process('room1', reading(tC=24.0 + (i - 60) * 0.1), i * STEP_MS)
+    assert [a['type'] for a in alerts] == ['temp_rise']
+    assert alerts[0]['severity'] == 'critical' and alerts[0]['value'] >= 0.5
+
+
+def test_idle_load_needs_a_sustained_mismatch():
+    detector = AnomalyDetector()
+    vacant = reading(pir=0, dist=80, fan=True, lamp=True)
+    assert detector.process('room2', vacant, 0) == []
+    assert detector.process('room2', vacant, IDLE_LOAD_MS - 1) == []
+    # Someone walks in, which resets the timer
+    assert detector.process('room2', reading(pir=0, dist=6, fan=True), IDLE_LOAD_MS) == []
+    assert detector.process('room2', vacant, IDLE_LOAD_MS + 1) == []
+    [alert] = detector.process('room2', vacant, 2 * IDLE_LOAD_MS + 1)
+    assert alert['type'] == 'idle_load' and 'fan and lamp' in alert['message']
+    assert detector.process('room2', dict(vacant, fan=False, lamp=False), 3 * IDLE_LOAD_MS) == []
+
+
+def test_handle_message_and_metrics():
+    detector = AnomalyDetector()
+    assert detector.handle_message('sensors/a101/telemetry', json.dumps(reading()).encode(), millis=0) == []
+    assert detector.handle_message('sensors/a101/status', b'{}') == []
+    assert detector.handle_message('sensors/a101/telemetry', b'not json') == []
+    detector.process('a102', {'amps': 'n/a', 'tC': None}, 0)
+    assert detector.metrics() == {'rooms': 2, 'processed': 2, 'rejected': 2, 'alerts': {}}
@@ -0,0 +1,106 @@
+"""
+5-minute feed backfill tests against the local ComEd stub
+"""
+
+import json
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from backfill import CHICAGO, backfill, fill_gap, iter_feed_rows
+from comed_pricing_api import PriceDatabase, determine_price_tier, now_millis
+from comed_stub import ComEdStub
+from price_fetcher import ComEdFetcher
+
+FIVE_MIN_MS = 5 * 60 * 1000
+
+
+def feed_rows(start_ms, count):
+    return [{'millisUTC': str(start_ms + i * FIVE_MIN_MS), 'price': f"{2 + i % 10 / 2:.1f}"}
+            for i in range(count)]
+
+
+def test_stream_parser_handles_split_chunks():
+    rows = feed_rows(0, 50)
+    text = json.dumps(rows)
+    chunks = [text[i:i + 7] for i in range(0, len(text), 7)]
+    assert list(iter_feed_rows(chunks)) == rows
+    assert list(iter_feed_rows(['[]'])) == []
+
+
+def test_backfill_is_idempotent(tmp_path):
+    db = PriceDatabase(str(tmp_path / 'prices.db'))
+    start = datetime(2024, 6, 1, tzinfo=CHICAGO)
+    with ComEdStub() as stub:
+        stub.feed = feed_rows(int(start.timestamp() * 1000), 3 * 288)
+        fetcher = ComEdFetcher(stub.url)
+        end = start + timedelta(days=3)
+
+        assert backfill(db, fetcher, start, end, determine_price_tier) == 3 * 288
+        backfill(db, fetcher, start, end, determine_price_tier)
+        # One request per day-sized chunk per run
+        assert len(stub.requests) == 6
+
+    rows = db.get_prices_between(0, int(end.timestamp() * 1000))
+    assert len(rows) == 3 * 288
+    assert rows[0][3] == int(end.timestamp() * 1000) - FIVE_MIN_MS
+    db.close()
+
+
+def test_fill_gap_starts_at_newest_row(tmp_path):
+    db = PriceDatabase(str(tmp_path / 'prices.db'))
+    newest = now_millis() - 60 * 60 * 1000
+    db.insert_price('', 3.0, 'low', newest)
+    with ComEdStub() as stub:
+        stub.feed = feed_rows(newest - 12 * FIVE_MIN_MS, 24)
+        assert fill_gap(db, ComEdFetcher(stub.url), determine_price_tier) == 12
+    assert db.get_price_stats(2)['sample_count'] == 12
+    db.close()
+
+
+@pytest.fixture
+def utc_server(monkeypatch):
+    """Run as if the server's local zone were UTC"""
+    monkeypatch.setenv('TZ', 'UTC')
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def test_fill_gap_uses_central_time_on_utc_server(tmp_path, utc_server):
+    db = PriceDatabase(str(tmp_path / 'prices.db'))
+    newest = now_millis() - 60 * 60 * 1000
+    db.insert_price('', 3.0, 'low', newest)
+    with ComEdStub() as stub:
+        stub.feed = feed_rows(newest - 12 * FIVE_MIN_MS, 24)
+        assert fill_gap(db, ComEdFetcher(stub.url), determine_price_tier) == 12
+        query = stub.requests[0][0]
+    assert query['datestart'] == [datetime.fromtimestamp(newest / 1000, tz=CHICAGO).strftime('%Y%m%d%H%M')]
+    db.close()
+
+
+def test_unique_migration_removes_duplicates(tmp_path):
+    path = str(tmp_path / 'dupes.db')
+    conn = sqlite3.connect(path)
+    conn.execute('''
+        CREATE TABLE prices (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT NOT NULL,
+            price_cents_per_kwh REAL NOT NULL,
+            tier TEXT,
+            millisUTC INTEGER
+        )
+    ''')
+    conn.executemany('INSERT INTO prices (timestamp, price_cents_per_kwh, tier, millisUTC) VALUES (?, ?, ?, ?)',
+                     [('a', 1.0, 'very_low', 1000), ('b', 2.0, 'very_low', 1000), ('c', 3.0, 'low', 2000)])
+    conn.commit()
+    conn.close()
+
+    db = PriceDatabase(path)
+    assert db.get_prices_between(0, 5000) == [('c', 3.0, 'low', 2000), ('b', 2.0, 'very_low', 1000)]
+    db.insert_price('d', 4.0, 'low', 2000)
+    assert db.get_prices_between(0, 5000)[0] == ('d', 4.0, 'low', 2000)
+    db.close()
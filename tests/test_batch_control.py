@@ -0,0 +1,43 @@
+"""
+Vectorized multi-room control decisions
+"""
+
+from batch_control import decide
+
+
+def room(name, **telemetry):
+    return dict({'room': name, 'tC': 25.0, 'pir': 0, 'dist': 80, 'power': 100, 'ecoMode': 1}, **telemetry)
+
+
+def test_matches_control_hub_rules():
+    rooms = [
+        room('occupied', pir=1),
+        room('close_by', dist=6),
+        room('vacant'),
+        room('warm', pir=1, tC=27.0),
+        room('cool', pir=1, tC=25.0),
+        room('heavy_load', pir=1, tC=27.0, power=650),
+        room('manual', pir=1, ecoMode=0)
+    ]
+    normal = {d['room']: d for d in decide(rooms, 'normal')}
+    assert [normal[r]['fan'] for r in ('occupied', 'close_by', 'vacant', 'warm', 'cool', 'heavy_load')] == \
+        [True, True, False, True, True, True]
+    assert normal['manual']['fan'] is None and normal['manual']['reason'] == 'manual'
+
+    high = {d['room']: d for d in decide(rooms, 'high')}
+    assert high['warm']['fan'] and high['warm']['lamp']
+    assert (high['cool']['fan'], high['cool']['reason']) == (False, 'too_cool')
+    assert (high['heavy_load']['fan'], high['heavy_load']['reason']) == (False, 'shed_power')
+    assert not decide([room('warm', pir=1, tC=27.0)], 'very_high')[0]['fan']
+
+    assert {d['reason'] for d in decide(rooms[:-1], 'critical')} == {'critical'}
+
+
+def test_changed_only_when_state_differs():
+    rooms = [room('a', pir=1, fan=True, lamp=True), room('b', pir=1, fan=False, lamp=False), room('c', pir=1)]
+    assert [d['changed'] for d in decide(rooms, 'low')] == [False, True, True]
+
+
+def test_power_from_amps_and_voltage():
+    [decision] = decide([{'room': 'x', 'tC': 27, 'motion': True, 'amps': 5, 'voltage': 120}], 'high')
+    assert decision['reason'] == 'shed_power'
@@ -0,0 +1,39 @@
+"""
+Binary ESP32 price payload: layout and round trips
+"""
+
+import pytest
+
+import esp32_binary
+
+
+def test_round_trip_every_enum():
+    for tier, action in zip(esp32_binary.TIERS, esp32_binary.ACTIONS):
+        for status in esp32_binary.STATUSES:
+            payload = {'p': -1.25, 't': tier, 'a': action, 'o': -2, 'ts': 1717200300000, 's': status}
+            data = esp32_binary.encode(payload)
+            assert len(data) == esp32_binary.SIZE == 11
+            assert esp32_binary.decode(data) == payload
+
+
+def test_fixed_layout():
+    data = esp32_binary.encode({'p': 4.5, 't': 'low', 'a': 'normal_plus', 'o': -1,
+                                'ts': 1704110400000, 's': 'active'})
+    assert data == bytes([1, 0xC2, 0x01, 1, 1, 0xFF]) + (1704110400).to_bytes(4, 'little') + bytes([1])
+
+
+def test_out_of_range_values_clamped():
+    payload = {'p': 999.99, 't': 'unknown', 'a': 'normal', 'o': 0, 'ts': None, 's': 'initializing'}
+    decoded = esp32_binary.decode(esp32_binary.encode(payload))
+    assert decoded['p'] == 327.67
+    assert decoded['t'] == 'normal'
+    assert decoded['ts'] is None
+
+
+def test_rejects_other_versions():
+    data = bytearray(esp32_binary.encode({'p': 1, 't': 'low', 'a': 'normal', 'o': 0, 'ts': 0, 's': 'active'}))
+    data[0] = 2
+    with pytest.raises(ValueError):
+        esp32_binary.decode(bytes(data))
+    with pytest.raises(ValueError):
+        esp32_binary.decode(b'')
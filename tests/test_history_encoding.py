@@ -0,0 +1,38 @@
+"""
+LTTB downsampling and columnar history encoding
+"""
+
+import math
+
+from history_encoding import TIERS, lttb, to_columnar
+
+
+def test_lttb_keeps_endpoints_and_spikes():
+    xs = list(range(2016))
+    ys = [5 + math.sin(i / 50) for i in xs]
+    ys[777] = 40.0  # A single 5-minute spike in a week of data
+    keep = lttb(xs, ys, 200)
+    assert len(keep) == 200
+    assert keep[0] == 0 and keep[-1] == 2015
+    assert keep == sorted(keep)
+    assert 777 in keep
+
+
+def test_lttb_small_inputs_unchanged():
+    assert lttb([1, 2, 3], [1, 2, 3], 10) == [0, 1, 2]
+    assert lttb([1, 2, 3, 4], [1, 2, 3, 4], 2) == [0, 3]
+
+
+def test_columnar_round_trip():
+    rows = [('2024-06-01T00:00:00', 2.5, 'very_low', 1717200000000),
+            ('2024-06-01T00:05:00', 16.0, 'critical', 1717200300000),
+            ('2024-06-01T00:15:00', 6.1, 'normal', 1717200900000)]
+    encoded = to_columnar(rows)
+    assert encoded['dt'] == [0, 300000, 600000]
+
+    millis, t = [], encoded['t0']
+    for delta in encoded['dt']:
+        t += delta
+        millis.append(t)
+    decoded = [(p, TIERS[tier], m) for p, tier, m in zip(encoded['price'], encoded['tier'], millis)]
+    assert decoded == [row[1:] for row in rows]
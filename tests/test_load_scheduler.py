@@ -0,0 +1,97 @@
+"""
+Load scheduler: optimality against brute force and comfort constraints
+"""
+
+import itertools
+
+import numpy as np
+import pytest
+
+from load_scheduler import MAX_DEVICES, SLOT_MINUTES, ScheduleError, optimize
+
+SLOT_MS = SLOT_MINUTES * 60 * 1000
+
+
+def slots_on(result, device=0):
+    return [(start // SLOT_MS, end // SLOT_MS) for start, end in result['devices'][device]['on']]
+
+
+def test_shiftable_runs_in_cheapest_allowed_slots():
+    prices = [9, 1, 8, 2, 7, 3, 0, 6]
+    result = optimize([{'id': 'fan', 'watts': 600, 'runtime_minutes': 15, 'deadline_minutes': 30}], prices, 0)
+    # Slot 6 is cheapest overall but past the deadline
+    assert slots_on(result) == [(1, 2), (3, 4), (5, 6)]
+    device = result['devices'][0]
+    assert device['feasible']
+    assert device['cost_cents'] == pytest.approx(0.05 * (1 + 2 + 3))
+    assert device['baseline_cost_cents'] == pytest.approx(0.05 * (9 + 1 + 8))
+
+    late = optimize([{'watts': 100, 'runtime_minutes': 60, 'deadline_minutes': 10}], prices, 0)
+    assert not late['devices'][0]['feasible']
+
+
+def simulate(temp, on, cool, warm):
+    temps = []
+    for state in on:
+        temp += -cool if state else warm
+        temps.append(temp)
+    return temps
+
+
+def test_thermal_matches_brute_force():
+    prices = [3, 3, 12, 12, 12, 2, 15, 15]
+    ac = {'id': 'ac', 'type': 'thermal', 'watts': 1200, 'temp': 24.0, 'comfort_min': 22, 'comfort_max': 25,
+          'cooling_per_hour': 12, 'warming_per_hour': 6}  # 1.0 °C down / 0.5 °C up per slot
+    result = optimize([ac], prices, 0)
+
+    best = None
+    for on in itertools.product([False, True], repeat=len(prices)):
+        temps = simulate(24.0, on, 1.0, 0.5)
+        if all(22 - 1e-9 <= t <= 25 + 1e-9 for t in temps):
+            cost = sum(p for p, state in zip(prices, on) if state)
+            best = cost if best is None else min(best, cost)
+
+    device = result['devices'][0]
+    assert device['feasible']
+    assert device['cost_cents'] == pytest.approx(best * 0.1)
+    on = np.zeros(len(prices), dtype=bool)
+    for a, b in slots_on(result):
+        on[a:b] = True
+    assert all(22 - 1e-9 <= t <= 25 + 1e-9 for t in simulate(24.0, on, 1.0, 0.5))
+    assert device['cost_cents'] < device['baseline_cost_cents']
+
+
+def test_many_rooms_solved_together():
+    rng = np.random.default_rng(3)
+    prices = 5 + 3 * np.sin(np.arange(288) / 288 * 2 * np.pi) + rng.normal(0, 0.5, 288)
+    devices = []
+    for room in range(100):
+        devices.append({'id': f'room{room}/ac', 'room': f'room{room}', 'watts': 1500, 'temp': 24,
+                        'comfort_min': 22, 'comfort_max': 26, 'cooling_per_hour': 3, 'warming_per_hour': 1})
+        devices.append({'id': f'room{room}/fan', 'room': f'room{room}', 'watts': 80,
+                        'runtime_minutes': 240, 'deadline_minutes': 720})
+    result = optimize(devices, prices, 0)
+    assert all(d['feasible'] for d in result['devices'])
+    assert all(d['cost_cents'] <= d['baseline_cost_cents'] + 1e-9 for d in result['devices'])
+    assert result['total_savings_cents'] > 0
+
+
+def test_oversized_thermal_requests_rejected():
+    prices = np.full(288, 5.0)
+    wide = {'id': 'ac', 'watts': 1500, 'comfort_min': 0, 'comfort_max': 100, 'cooling_per_hour': 3}
+    with pytest.raises(ScheduleError, match='comfort band'):
+        optimize([wide], prices, 0)
+    ac = dict(wide, comfort_max=10)
+    with pytest.raises(ScheduleError, match='Too many thermal devices'):
+        optimize([dict(ac, id=f'ac{i}') for i in range(400)], prices, 0)
+    with pytest.raises(ScheduleError, match='At most'):
+        optimize([dict(ac, id=f'ac{i}') for i in range(MAX_DEVICES + 1)], prices, 0)
+
+
+def test_invalid_devices_rejected():
+    with pytest.raises(ScheduleError):
+        optimize([], [1, 2], 0)
+    with pytest.raises(ScheduleError):
+        optimize([{'id': 'x', 'runtime_minutes': 10}], [1, 2], 0)
+    with pytest.raises(ScheduleError):
+        optimize([{'id': 'x', 'watts': 10, 'type': 'nuclear'}], [1, 2], 0)
@@ -0,0 +1,80 @@
+"""
+Metrics registry, exposition format, lock contention and request profiling
+"""
+
+import threading
+import time
+
+from metrics import InstrumentedLock, Registry, RequestProfiler
+
+
+def test_render_exposition_format():
+    registry = Registry({'pid': 7})
+    requests = registry.counter('requests_total', 'Requests', ('route',))
+    latency = registry.histogram('latency_seconds', 'Latency', ('route',), buckets=(0.1, 1.0))
+    registry.callback('ratio', 'Ratio', lambda: 0.25)
+    registry.callback('missing', 'Not available yet', lambda: None)
+
+    requests.inc('/a')
+    requests.inc('/a', amount=2)
+    for value in (0.05, 0.1, 0.5, 3.0):
+        latency.observe(value, '/say "hi"')
+
+    lines = registry.render().splitlines()
+    assert '# TYPE requests_total counter' in lines
+    assert 'requests_total{pid="7",route="/a"} 3' in lines
+    assert 'latency_seconds_bucket{pid="7",route="/say \\"hi\\"",le="0.1"} 2' in lines
+    assert 'latency_seconds_bucket{pid="7",route="/say \\"hi\\"",le="1"} 3' in lines
+    assert 'latency_seconds_bucket{pid="7",route="/say \\"hi\\"",le="+Inf"} 4' in lines
+    assert 'latency_seconds_count{pid="7",route="/say \\"hi\\""} 4' in lines
+    assert 'ratio{pid="7"} 0.25' in lines
+    assert '# TYPE missing gauge' in lines and not any(l.startswith('missing') for l in lines)
+
+
+def test_histogram_time_decorator():
+    registry = Registry()
+    latency = registry.histogram('db_seconds', 'DB', ('method',))
+
+    @latency.time('query')
+    def query(x):
+        return x * 2
+
+    assert query(4) == 8
+    assert latency.count('query') == 1
+
+
+def test_instrumented_lock_records_contention():
+    registry = Registry()
+    wait = registry.histogram('wait_seconds', 'Wait', ('lock',))
+    lock = InstrumentedLock(wait, 'price')
+
+    with lock:
+        pass
+    assert (lock.acquisitions, lock.contended, wait.count('price')) == (1, 0, 0)
+
+    lock.acquire()
+    waiter = threading.Thread(target=lambda: lock.acquire() and lock.release())
+    waiter.start()
+    time.sleep(0.05)
+    lock.release()
+    waiter.join()
+    assert (lock.acquisitions, lock.contended, wait.count('price')) == (3, 1, 1)
+    assert lock.acquire(blocking=False)
+    assert not lock.acquire(blocking=False)
+    lock.release()
+
+
+def test_profiler_keeps_only_slow_sampled_requests():
+    assert RequestProfiler().start() is None
+
+    profiler = RequestProfiler(sample_rate=1.0, slow_seconds=0.01)
+    profile = profiler.start()
+    # Only one request is profiled at a time
+    assert profiler.start() is None
+    assert profiler.finish(profile, 'GET /fast', 0.001) is None
+
+    profile = profiler.start()
+    sum(range(10000))
+    report = profiler.finish(profile, 'GET /slow', 0.2)
+    assert report['route'] == 'GET /slow' and 'function calls' in report['stats']
+    assert list(profiler.reports) == [report]
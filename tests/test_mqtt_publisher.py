@@ -0,0 +1,116 @@
+"""
+PricePublisher tests against an in-process stand-in broker
+"""
+
+import time
+from types import SimpleNamespace
+
+from mqtt_publisher import PricePublisher
+
+
+class StandInBroker:
+    """Keeps retained messages per topic, like Mosquitto with retain=true"""
+
+    def __init__(self):
+        self.up = True
+        self.retained = {}
+        self.log = []
+
+
+class StandInClient:
+    """Subset of the paho client interface used by PricePublisher"""
+
+    def __init__(self, broker):
+        self.broker = broker
+        self.on_connect = None
+        self.on_disconnect = None
+        self.is_connected = False
+
+    def loop_start(self):
+        self.reconnect()
+
+    def loop_stop(self):
+        pass
+
+    def reconnect(self):
+        if self.broker.up and not self.is_connected:
+            self.is_connected = True
+            self.on_connect(self, None, {}, SimpleNamespace(is_failure=False), None)
+
+    def drop(self):
+        self.is_connected = False
+        self.on_disconnect(self, None, {}, 'broker down', None)
+
+    def disconnect(self):
+        self.is_connected = False
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        if not (self.broker.up and self.is_connected):
+            return SimpleNamespace(rc=4)   # MQTT_ERR_NO_CONN
+        self.broker.log.append((topic, payload))
+        if retain:
+            self.broker.retained[topic] = payload
+        return SimpleNamespace(rc=0)
+
+
+def wait_until(predicate, timeout=2.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_publishes_retained_compact_payload():
+    broker = StandInBroker()
+    publisher = PricePublisher(StandInClient(broker))
+    publisher.start()
+    publisher.publish({'p': 4.5, 't': 'low', 'a': 'normal_plus', 'o': -1, 'ts': 1000, 's': 'active'})
+    assert wait_until(lambda: publisher.published == 1)
+    assert broker.retained['pricing/current'] == '{"p":4.5,"t":"low","a":"normal_plus","o":-1,"ts":1000,"s":"active"}'
+    # Other markets get their own retained topic
+    publisher.publish({'p': 9.0}, 'pricing/current/west')
+    assert wait_until(lambda: publisher.published == 2)
+    assert broker.retained['pricing/current/west'] == '{"p":9.0}'
+    assert broker.retained['pricing/current'].startswith('{"p":4.5')
+    publisher.stop()
+
+
+def test_queue_is_bounded_during_outage_and_flushes_on_reconnect():
+    broker = StandInBroker()
+    broker.up = False
+    client = StandInClient(broker)
+    publisher = PricePublisher(client, max_queue=3)
+    publisher.start()
+
+    for ts in range(5):
+        publisher.publish({'ts': ts})
+    assert publisher.pending() == 3
+    assert publisher.dropped == 2
+    assert broker.log == []
+
+    broker.up = True
+    client.reconnect()
+    assert wait_until(lambda: publisher.pending() == 0)
+    assert [payload for _, payload in broker.log] == ['{"ts":2}', '{"ts":3}', '{"ts":4}']
+    assert broker.retained['pricing/current'] == '{"ts":4}'
+    publisher.stop()
+
+
+def test_resumes_after_disconnect():
+    broker = StandInBroker()
+    client = StandInClient(broker)
+    publisher = PricePublisher(client, topic='pricing/test')
+    publisher.start()
+
+    client.drop()
+    broker.up = False
+    publisher.publish({'ts': 1})
+    time.sleep(0.05)
+    assert publisher.pending() == 1
+
+    broker.up = True
+    client.reconnect()
+    assert wait_until(lambda: broker.retained.get('pricing/test') == '{"ts":1}')
+    publisher.stop()
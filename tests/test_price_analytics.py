@@ -0,0 +1,81 @@
+"""
+Long-range price analytics over memory-mapped archive columns
+"""
+
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+from comed_pricing_api import PriceDatabase
+from price_analytics import PriceAnalytics, analyze, local_time, tier_durations
+from tier_policy import TierPolicy
+
+DAY_MS = 24 * 3600 * 1000
+NOW = int(datetime(2024, 6, 15, tzinfo=timezone.utc).timestamp() * 1000)
+CHICAGO = ZoneInfo('America/Chicago')
+POLICY = TierPolicy([{'name': 'low', 'below': 5.0, 'action': 'a'},
+                     {'name': 'normal', 'below': 8.0, 'action': 'b'},
+                     {'name': 'high', 'action': 'c'}])
+
+
+def test_local_time_follows_dst():
+    millis = np.random.default_rng(2).integers(NOW - 400 * DAY_MS, NOW, 2000)
+    weekday, hour = local_time(millis, CHICAGO)
+    expected = [datetime.fromtimestamp(m / 1000, tz=CHICAGO) for m in millis.tolist()]
+    assert weekday.tolist() == [t.weekday() for t in expected]
+    assert hour.tolist() == [t.hour for t in expected]
+
+
+def test_heatmap_and_distribution():
+    millis = np.arange(NOW - 28 * DAY_MS, NOW, 300000)
+    _, hour = local_time(millis, CHICAGO)
+    # Cheapest in the small hours, priciest late afternoon
+    prices = 3.0 + 6.0 * np.exp(-((hour - 17) ** 2) / 8.0)
+    result = analyze(millis, prices, POLICY, CHICAGO)
+
+    heatmap = result['heatmap']
+    assert heatmap['priciest_hours'][0] == 17
+    assert set(heatmap['cheapest_hours']) <= {0, 1, 2, 3, 4, 5, 6}
+    assert sum(map(sum, heatmap['samples'])) == len(millis)
+    assert heatmap['mean'][0][17] == round(9.0, 3)
+    dist = result['distribution']
+    assert dist['min'] == 3.0 and dist['max'] == 9.0
+    assert dist['by_hour']['values'][17] == [9.0, 9.0, 9.0]
+    assert dist['percentiles']['p50'] <= dist['percentiles']['p90']
+
+
+def test_tier_durations():
+    millis = np.arange(20) * 300000
+    # low x3, high x2, gap, high x1, normal x14
+    tiers = np.array([0, 0, 0, 2, 2, 2] + [1] * 14)
+    millis[5:] += 3600000
+    result = tier_durations(millis, tiers, POLICY.names)['tiers']
+    assert result['low'] == {'runs': 1, 'hours': 0.25, 'longest_minutes': 15.0, 'histogram': [0, 1, 0, 0, 0, 0, 0, 0, 0]}
+    assert result['high']['runs'] == 2 and result['high']['longest_minutes'] == 10.0
+    assert result['normal']['histogram'][4] == 1 and result['normal']['hours'] == round(70 / 60, 2)
+
+
+def test_memoized_over_archive_and_live_rows(tmp_path):
+    db = PriceDatabase(str(tmp_path / 'p.db'))
+    millis = np.arange(NOW - 150 * DAY_MS, NOW, 300000)
+    prices = np.random.default_rng(5).uniform(1, 12, len(millis)).round(2)
+    db.insert_prices([('t', float(p), 'normal', int(m)) for m, p in zip(millis, prices)])
+    db.compact(90, now=NOW)
+    analytics = PriceAnalytics(db)
+
+    got_millis, got_prices = analytics.columns(NOW - 150 * DAY_MS, NOW)
+    assert np.array_equal(got_millis, millis) and np.array_equal(got_prices, prices)
+    archived, _ = analytics.archive.columns(NOW - 150 * DAY_MS, NOW)
+    assert len(archived) and isinstance(next(iter(analytics.archive._months.values()))[1], np.memmap)
+
+    first = analytics.get(NOW - 150 * DAY_MS, NOW, POLICY, CHICAGO)
+    assert first['samples'] == len(millis)
+    assert analytics.get(NOW - 150 * DAY_MS, NOW, POLICY, CHICAGO) is first
+    assert (analytics.hits, analytics.misses) == (1, 1)
+
+    # A new live row in the range invalidates it
+    db.insert_price('t', 20.0, 'high', NOW - 1000)
+    assert analytics.get(NOW - 150 * DAY_MS, NOW, POLICY, CHICAGO)['samples'] == len(millis) + 1
+    assert analytics.get(NOW - DAY_MS, NOW, POLICY, ZoneInfo('UTC'))['distribution']['max'] == 20.0
+    assert analytics.get(NOW + DAY_MS, NOW + 2 * DAY_MS, POLICY, CHICAGO) is None
@@ -0,0 +1,129 @@
+"""
+Price history compaction, columnar archive files and vacuuming
+"""
+
+import os
+from datetime import datetime, timezone
+
+import numpy as np
+
+import price_archive
+from comed_pricing_api import PriceDatabase
+
+DAY_MS = 24 * 3600 * 1000
+NOW = int(datetime(2024, 6, 15, 12, tzinfo=timezone.utc).timestamp() * 1000)
+TIERS = ['very_low', 'low', 'normal', 'high']
+
+
+def fill(db, days, step_ms=300000):
+    """Every 5 minutes for `days` days up to NOW; returns (millis, prices, tiers)"""
+    millis = np.arange(NOW - days * DAY_MS, NOW, step_ms)
+    prices = np.round(np.random.default_rng(4).uniform(1, 12, len(millis)), 2)
+    tiers = [TIERS[i % 4] for i in range(len(millis))]
+    db.insert_prices([(f't{m}', float(p), t, int(m)) for m, p, t in zip(millis, prices, tiers)])
+    return millis, prices, tiers
+
+
+def live_count(db, before=None):
+    with db.pool.connection() as conn:
+        return conn.execute('SELECT COUNT(*) FROM prices WHERE millisUTC < ?', (before or 2 ** 62,)).fetchone()[0]
+
+
+def test_compaction_archives_aggregates_and_deletes(tmp_path):
+    db = PriceDatabase(str(tmp_path / 'p.db'))
+    millis, prices, tiers = fill(db, 150)
+    result = db.compact(90, now=NOW)
+
+    cutoff = (NOW - 90 * DAY_MS) // DAY_MS * DAY_MS
+    old = millis < cutoff
+    assert result['archived'] == old.sum() and result['retention_days'] == 90
+    assert live_count(db, cutoff) == 0 and live_count(db) == (~old).sum()
+    # One file per UTC month touched
+    assert [os.path.basename(p) for _, p in price_archive.archive_files(db.archive_dir)] == \
+        ['prices-2024-01.bin.gz', 'prices-2024-02.bin.gz', 'prices-2024-03.bin.gz']
+
+    a_millis, a_prices, a_tiers = price_archive.read_archive(db.archive_dir)
+    assert np.array_equal(a_millis, millis[old]) and np.array_equal(a_prices, prices[old])
+    assert [TIERS[i] for i in a_tiers] == [t for t, o in zip(tiers, old) if o]
+
+    # Aggregates over the whole range, archived days included, match the raw data
+    daily = db.get_price_aggregates('day', (NOW - 150 * DAY_MS) // DAY_MS * DAY_MS, NOW)
+    buckets = millis // DAY_MS * DAY_MS
+    assert [r[0] for r in daily] == sorted(set(buckets.tolist()))
+    for bucket, samples, avg, lo, hi in daily[::17]:
+        day = prices[buckets == bucket]
+        assert (samples, lo, hi) == (len(day), day.min(), day.max())
+        assert abs(avg - day.mean()) < 1e-9
+    hourly = db.get_price_aggregates('hour', cutoff - DAY_MS, cutoff + DAY_MS)
+    assert len(hourly) == 48 and all(r[1] == 12 for r in hourly)
+
+
+def test_late_rows_merge_into_existing_archive(tmp_path):
+    db = PriceDatabase(str(tmp_path / 'p.db'))
+    fill(db, 120)
+    db.compact(90, now=NOW)
+    path = price_archive.archive_files(db.archive_dir)[0][1]
+    with open(path, 'rb') as f:
+        before = f.read()
+
+    late = NOW - 100 * DAY_MS + 150000
+    db.insert_prices([('late', 50.0, 'critical', late)])
+    assert db.compact(90, now=NOW)['archived'] == 1
+    with open(path, 'rb') as f:
+        assert f.read().startswith(before)  # Append-only
+    a_millis, a_prices, _ = price_archive.read_archive(db.archive_dir, late, late + 1)
+    assert a_millis.tolist() == [late] and a_prices.tolist() == [50.0]
+    [(_, samples, _, _, hi)] = db.get_price_aggregates('day', late // DAY_MS * DAY_MS, late + 1)
+    assert samples == 289 and hi == 50.0
+
+
+def test_reimported_rows_are_not_counted_twice(tmp_path):
+    db = PriceDatabase(str(tmp_path / 'p.db'))
+    millis, prices, tiers = fill(db, 120)
+    db.compact(90, now=NOW)
+    day = (NOW - 100 * DAY_MS) // DAY_MS * DAY_MS
+    before = db.get_price_aggregates('day', day, day + DAY_MS)
+    hourly = db.get_price_aggregates('hour', day, day + DAY_MS)
+    assert before[0][1] == 288
+
+    # A backfill re-run over the already compacted range
+    again = (millis >= day) & (millis < day + DAY_MS)
+    db.insert_prices([(f't{m}', float(p), t, int(m))
+                      for m, p, t, a in zip(millis, prices, tiers, again) if a])
+    assert db.get_price_aggregates('day', day, day + DAY_MS) == before
+    assert db.compact(90, now=NOW)['archived'] == 288
+    assert db.get_price_aggregates('day', day, day + DAY_MS) == before
+    assert db.get_price_aggregates('hour', day, day + DAY_MS) == hourly
+    assert len(price_archive.read_archive(db.archive_dir, day, day + DAY_MS)[0]) == 288
+
+
+def test_read_archive_keeps_last_duplicate(tmp_path):
+    path = price_archive.archive_path(str(tmp_path), NOW)
+    price_archive.append_chunk(path, [NOW, NOW + 1], [1.0, 2.0], [0, 1])
+    # Re-archived after a crash before the delete committed
+    price_archive.append_chunk(path, [NOW + 1, NOW + 2], [2.5, 3.0], [1, 2])
+    millis, prices, tiers = price_archive.read_archive(str(tmp_path))
+    assert millis.tolist() == [NOW, NOW + 1, NOW + 2]
+    assert prices.tolist() == [1.0, 2.5, 3.0] and tiers.tolist() == [0, 1, 2]
+    assert len(price_archive.read_archive(str(tmp_path), NOW + 1, NOW + 2)[0]) == 1
+
+
+def test_vacuum_converts_and_shrinks(tmp_path):
+    db = PriceDatabase(str(tmp_path / 'p.db'), pragmas={'auto_vacuum': 'NONE'})
+    fill(db, 150)
+    result = db.compact(30, now=NOW)
+    # Retention never drops below what the forecaster reads
+    assert result['retention_days'] == PriceDatabase.FORECAST_HISTORY_DAYS
+    assert result['pages_freed'] > 0
+    with db.pool.connection() as conn:
+        assert conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2
+        assert conn.execute('PRAGMA freelist_count').fetchone()[0] == 0
+
+
+def test_incremental_vacuum_releases_all_free_pages(tmp_path):
+    db = PriceDatabase(str(tmp_path / 'p.db'))
+    fill(db, 150)
+    result = db.compact(90, now=NOW)
+    assert result['pages_freed'] > 100
+    with db.pool.connection() as conn:
+        assert conn.execute('PRAGMA freelist_count').fetchone()[0] == 0
@@ -0,0 +1,145 @@
+"""
+Unit tests for the pricing API's SQLite layer (no live server needed)
+"""
+
+import random
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+from db_pool import ConnectionPool
+from comed_pricing_api import PriceDatabase, now_millis
+
+
+def make_db(tmp_path, **kwargs):
+    return PriceDatabase(str(tmp_path / 'prices.db'), **kwargs)
+
+
+def test_pool_uses_wal_and_custom_pragmas(tmp_path):
+    pool = ConnectionPool(str(tmp_path / 'p.db'), pragmas={'cache_size': -1000})
+    with pool.connection() as conn:
+        assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+        assert conn.execute('PRAGMA cache_size').fetchone()[0] == -1000
+    pool.close()
+
+
+def test_pool_reuses_connections_and_respects_max_size(tmp_path):
+    pool = ConnectionPool(str(tmp_path / 'p.db'), max_size=2, timeout=0.1)
+    a = pool.acquire()
+    b = pool.acquire()
+    try:
+        pool.acquire()
+        assert False, "expected pool exhaustion"
+    except TimeoutError:
+        pass
+    pool.release(a)
+    assert pool.acquire() is a
+    pool.release(a)
+    pool.release(b)
+    pool.close()
+
+
+def test_insert_and_query_roundtrip(tmp_path):
+    db = make_db(tmp_path)
+    now = datetime.now()
+    db.insert_price(now.isoformat(), 4.2, 'low', int(now.timestamp() * 1000))
+    rows = db.get_recent_prices(1)
+    assert len(rows) == 1
+    assert rows[0][1] == 4.2
+    assert db.get_price_stats(1)['sample_count'] == 1
+    db.close()
+
+
+def test_readers_not_blocked_by_writer(tmp_path):
+    db = make_db(tmp_path, pool_size=4)
+    errors = []
+
+    def writer():
+        start = now_millis() - 1000
+        for i in range(200):
+            db.insert_price('', float(i), 'normal', start + i)
+
+    def reader():
+        try:
+            for _ in range(200):
+                db.get_price_stats(24)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=writer)] + [threading.Thread(target=reader) for _ in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert not errors
+    assert db.get_price_stats(24)['sample_count'] == 200
+    db.close()
+
+
+def test_migration_backfills_legacy_rows_and_adds_index(tmp_path):
+    path = str(tmp_path / 'legacy.db')
+    conn = sqlite3.connect(path)
+    conn.execute('''
+        CREATE TABLE prices (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT NOT NULL,
+            price_cents_per_kwh REAL NOT NULL,
+            tier TEXT,
+            millisUTC INTEGER
+        )
+    ''')
+    recent = datetime.now().replace(microsecond=0) - timedelta(minutes=10)
+    conn.execute("INSERT INTO prices (timestamp, price_cents_per_kwh, tier) VALUES (?, 3.5, 'low')",
+                 (recent.isoformat(),))
+    conn.commit()
+    conn.close()
+
+    db = PriceDatabase(path)
+    with db.pool.connection() as c:
+        assert c.execute('PRAGMA user_version').fetchone()[0] == len(PriceDatabase.MIGRATIONS)
+        millis = c.execute('SELECT millisUTC FROM prices').fetchone()[0]
+        plan = ' '.join(r[3] for r in c.execute(
+            'EXPLAIN QUERY PLAN SELECT * FROM prices WHERE millisUTC > 0').fetchall())
+    assert millis == int(recent.timestamp() * 1000)
+    assert 'idx_prices_millis' in plan
+    assert len(db.get_recent_prices(1)) == 1
+    # Re-running is a no-op
+    assert db.migrate() == len(PriceDatabase.MIGRATIONS)
+    db.close()
+
+
+def test_rolling_stats_match_sql_aggregates(tmp_path):
+    db = make_db(tmp_path)
+    rng = random.Random(42)
+    base = now_millis() - 200 * 3600 * 1000 + 1234   # Keep samples off the hour cutoffs
+    five_min = 5 * 60 * 1000
+
+    # Part of the history exists before startup, the rest arrives via inserts
+    with db.pool.transaction() as conn:
+        conn.executemany(
+            'INSERT INTO prices (timestamp, price_cents_per_kwh, tier, millisUTC) VALUES (?, ?, ?, ?)',
+            [('', round(rng.uniform(-1, 20), 1), 'normal', base + i * five_min) for i in range(1200)])
+    db.load_rollup()
+    for i in range(1200, 2350):
+        db.insert_price('', round(rng.uniform(-1, 20), 1), 'normal', base + i * five_min)
+
+    for hours in (1, 3, 6, 24, 48, 100, 168):
+        fast = db.get_price_stats(hours)
+        slow = db.query_price_stats(hours)
+        assert fast['sample_count'] == slow['sample_count']
+        assert fast['min_price'] == slow['min_price']
+        assert fast['max_price'] == slow['max_price']
+        assert abs(fast['avg_price'] - slow['avg_price']) < 1e-9
+    db.close()
+
+
+def test_rolling_stats_rebuild_after_out_of_order_insert(tmp_path):
+    db = make_db(tmp_path)
+    now = now_millis()
+    db.insert_price('', 5.0, 'normal', now - 1000)
+    db.insert_price('', 9.0, 'high', now - 60 * 60 * 1000 + 5000)   # Older than the newest row
+    assert db.rollup.stale
+    assert db.get_price_stats(24)['max_price'] == 9.0
+    assert db.get_price_stats(24)['sample_count'] == 2
+    db.close()
@@ -0,0 +1,61 @@
+"""
+Upstream fetcher tests against a local ComEd stub
+"""
+
+import pytest
+import requests
+
+import comed_pricing_api as api
+from comed_stub import ComEdStub
+from price_fetcher import ComEdFetcher, seconds_until_next_poll
+
+
+@pytest.fixture
+def stub():
+    with ComEdStub() as s:
+        yield s
+
+
+def test_poll_scheduled_just_after_boundary():
+    assert seconds_until_next_poll(300, 5, now=600) == 5
+    assert seconds_until_next_poll(300, 5, now=603) == 2
+    assert seconds_until_next_poll(300, 5, now=606) == 299
+    assert seconds_until_next_poll(300, 5, now=899) == 6
+
+
+def test_retries_transient_errors_on_one_connection(stub):
+    stub.fail_next = 2
+    fetcher = ComEdFetcher(f"{stub.url}?type=currenthouraverage", backoff_base=0.01)
+    assert fetcher.fetch() == stub.current
+    assert len(stub.requests) == 3
+    fetcher.fetch()
+    # Keep-alive: every request reused the same client socket
+    assert len({port for _, port in stub.requests}) == 1
+
+
+def test_gives_up_after_max_retries(stub):
+    stub.fail_next = 10
+    fetcher = ComEdFetcher(f"{stub.url}?type=currenthouraverage", max_retries=2, backoff_base=0.01)
+    with pytest.raises(requests.exceptions.HTTPError):
+        fetcher.fetch()
+    assert len(stub.requests) == 3
+
+
+def test_unchanged_price_skips_store_and_invalidation(stub, monkeypatch):
+    monkeypatch.setattr(api.markets['comed'].provider, 'fetcher', ComEdFetcher(f"{stub.url}?type=currenthouraverage"))
+    with api.price_lock:
+        api.publish_snapshot(api.current_snapshot().replace(millisUTC=None, status='initializing'))
+
+    assert api.fetch_market_price()
+    rows = api.db.get_prices_between(0)
+    version = api.response_cache.version
+
+    assert api.fetch_market_price()
+    assert api.db.get_prices_between(0) == rows
+    assert api.response_cache.version == version
+
+    stub.current = [{'millisUTC': '1704110700000', 'price': '5.1'}]
+    assert api.fetch_market_price()
+    assert len(api.db.get_prices_between(0)) == len(rows) + 1
+    assert api.response_cache.version == version + 1
+    assert api.current_snapshot().data['tier'] == 'normal'
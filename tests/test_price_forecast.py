@@ -0,0 +1,89 @@
+"""
+Seasonal forecaster: accuracy on a synthetic series and incremental refits
+"""
+
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+from price_forecast import DAY_SLOTS, SLOT_MS, PriceForecaster, slots_of
+
+START = 1717200000000  # 2024-06-01 00:00 UTC
+
+
+def synthetic(days, seed=0):
+    """Daily price shape plus AR(1) noise at 5-minute resolution"""
+    rng = np.random.default_rng(seed)
+    n = days * DAY_SLOTS
+    millis = START + SLOT_MS * np.arange(n)
+    hour = (millis // 3600000) % 24
+    noise = np.zeros(n)
+    for i in range(1, n):
+        noise[i] = 0.9 * noise[i - 1] + rng.normal(0, 0.4)
+    prices = 4 + 3 * np.sin((hour - 9) / 24 * 2 * np.pi) + noise
+    return millis, prices
+
+
+def test_beats_flat_average_on_next_day():
+    millis, prices = synthetic(29)
+    train = 28 * DAY_SLOTS
+    model = PriceForecaster()
+    model.fit(millis[:train], prices[:train])
+    forecast = model.forecast()
+
+    actual = prices[train:]
+    assert forecast['start'] == millis[train]
+    assert len(forecast['point']) == DAY_SLOTS
+    model_mae = np.abs(forecast['point'] - actual).mean()
+    flat_mae = np.abs(prices[train - DAY_SLOTS:train].mean() - actual).mean()
+    assert model_mae < flat_mae / 2
+    assert np.all(forecast['p10'] <= forecast['point']) and np.all(forecast['point'] <= forecast['p90'])
+    coverage = np.mean((actual >= forecast['p10']) & (actual <= forecast['p90']))
+    assert coverage > 0.6
+
+
+def test_incremental_updates_track_full_refit():
+    millis, prices = synthetic(21, seed=1)
+    full = PriceForecaster()
+    full.fit(millis, prices)
+
+    incremental = PriceForecaster()
+    incremental.fit(millis[:14 * DAY_SLOTS], prices[:14 * DAY_SLOTS])
+    for m, p in zip(millis[14 * DAY_SLOTS:], prices[14 * DAY_SLOTS:]):
+        incremental.update(int(m), float(p))
+
+    a, b = full.forecast(), incremental.forecast()
+    assert a['start'] == b['start'] and a['samples'] == b['samples']
+    # Seasonal profiles are identical; the short-term deviation has decayed by a day out
+    assert np.allclose(a['point'][-12:], b['point'][-12:], atol=1e-3)
+
+
+def test_out_of_order_marks_stale():
+    model = PriceForecaster()
+    assert model.forecast() is None
+    model.update(START, 4.0)
+    model.update(START, 4.5)
+    assert model.stale
+
+
+def test_slots_follow_central_time_across_dst():
+    chicago = ZoneInfo('America/Chicago')
+    # Fridays either side of the March 2024 change, same wall-clock time
+    before = int(datetime(2024, 3, 8, 14, 0, tzinfo=chicago).timestamp() * 1000)
+    after = int(datetime(2024, 3, 15, 14, 0, tzinfo=chicago).timestamp() * 1000)
+    assert after - before == 7 * 24 * 3600000 - 3600000
+    assert slots_of([before, after]).tolist() == [slots_of(before)[0]] * 2
+
+
+def test_horizon_starts_at_now_after_a_gap():
+    millis, prices = synthetic(14, seed=2)
+    model = PriceForecaster()
+    model.fit(millis, prices)
+    now = int(millis[-1]) + 6 * 3600000 + 1000
+    forecast = model.forecast(steps=12, now=now)
+    assert forecast['start'] == (now // SLOT_MS + 1) * SLOT_MS
+    # Same seasonal slots as a forecast that ran through the gap
+    through = model.forecast(steps=6 * 12 + 12)
+    assert np.allclose(forecast['point'], through['point'][-12:])
+    assert model.forecast(now=int(millis[0]))['start'] == millis[-1] + SLOT_MS
@@ -0,0 +1,112 @@
+"""
+Price provider plugins, markets config and the shared poll scheduler,
+exercised with local stub providers
+"""
+
+import json
+import time
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from price_providers import ComEdProvider, ProviderError, TimeOfUseProvider, load_markets
+from price_scheduler import PollScheduler
+from stub_providers import StubProvider
+
+CHICAGO = ZoneInfo('America/Chicago')
+
+
+def local_millis(*args):
+    return int(datetime(*args, tzinfo=CHICAGO).timestamp() * 1000)
+
+
+def test_time_of_use_rates():
+    provider = TimeOfUseProvider('tou', default_price=7.0, rates=[
+        {'from': '22:00', 'to': '06:00', 'price': 3.0},
+        {'from': '14:00', 'to': '19:00', 'price': 15.0, 'days': ['mon', 'tue', 'wed', 'thu', 'fri']}
+    ])
+    assert provider.price_at(local_millis(2024, 7, 1, 23, 30)) == 3.0   # wraps past midnight
+    assert provider.price_at(local_millis(2024, 7, 2, 5, 55)) == 3.0
+    assert provider.price_at(local_millis(2024, 7, 2, 15, 0)) == 15.0   # Tuesday peak
+    assert provider.price_at(local_millis(2024, 7, 6, 15, 0)) == 7.0    # Saturday
+    assert provider.price_at(local_millis(2024, 7, 2, 19, 0)) == 7.0    # end is exclusive
+
+    provider.clock = lambda: local_millis(2024, 7, 2, 15, 7) / 1000
+    assert provider.latest(provider.fetch()) == (local_millis(2024, 7, 2, 15, 5), 15.0)
+
+
+def test_comed_parse_picks_newest():
+    provider = ComEdProvider('comed', url='http://localhost:1')
+    raw = [{'millisUTC': '1704110400000', 'price': '4.5'}, {'millisUTC': '1704110700000', 'price': '5.1'}]
+    assert provider.latest(raw) == (1704110700000, 5.1)
+    assert provider.latest([]) is None
+
+
+def test_load_markets(tmp_path):
+    path = tmp_path / 'markets.json'
+    path.write_text(json.dumps({'default': 'west', 'markets': {
+        'comed': {'provider': 'comed'},
+        'west': {'provider': 'time_of_use', 'default_price': 6.0, 'rates': [], 'tier_group': 'dorm'},
+        'lab': {'provider': 'stub_providers:StubProvider', 'prices': [[1000, 2.0]]}
+    }}))
+    default, providers = load_markets(str(path), comed_url='http://localhost:1')
+    assert default == 'west' and list(providers) == ['comed', 'west', 'lab']
+    assert providers['comed'].url == 'http://localhost:1'
+    assert providers['west'].describe()['tier_group'] == 'dorm'
+    assert isinstance(providers['lab'], StubProvider)
+
+    assert list(load_markets()[1]) == ['comed']
+
+
+@pytest.mark.parametrize('markets, message', [
+    ({'x': {'provider': 'nope'}}, 'Unknown provider'),
+    ({'x': {'provider': 'json:loads'}}, 'not a PriceProvider'),
+    ({'Bad Id': {}}, 'Bad market id'),
+    ({'x': {'provider': 'time_of_use', 'default_price': 1, 'rates': [{'from': '25:00'}]}}, 'bad rate'),
+    ({'x': {'provider': 'comed', 'colour': 'red'}}, 'colour'),
+])
+def test_bad_market_config(tmp_path, markets, message):
+    path = tmp_path / 'markets.json'
+    path.write_text(json.dumps({'markets': markets}))
+    with pytest.raises(ProviderError, match=message):
+        load_markets(str(path))
+
+
+def test_scheduler_polls_markets_concurrently():
+    providers = {m: StubProvider(m, delay=0.3) for m in ('a', 'b', 'c')}
+    scheduler = PollScheduler(lambda m: providers[m].fetch() is not None, max_workers=3)
+    for market in providers:
+        scheduler.add(market)
+    start = time.perf_counter()
+    futures = scheduler.run_pending()
+    assert all(f.result(timeout=2) for f in futures)
+    # One slow provider's latency, not the sum
+    assert time.perf_counter() - start < 0.6
+    assert all(p.calls == 1 for p in providers.values())
+    # Rescheduled for the next publication, nothing due right away
+    assert scheduler.next_due() > time.time() and scheduler.run_pending() == []
+    scheduler.stop()
+
+
+def test_scheduler_rechecks_then_waits_for_next_boundary():
+    down = StubProvider('down', fail=True)
+    up = StubProvider('up', prices=[(1000, 4.0)])
+    providers = {'down': down, 'up': up}
+
+    def poll(market):
+        return bool(providers[market].fetch())
+
+    scheduler = PollScheduler(poll, max_workers=2, recheck_delay=0.05, recheck_attempts=2)
+    scheduler.add('down')
+    scheduler.add('up')
+    deadline = time.time() + 2
+    while down.calls < 3 and time.time() < deadline:
+        for f in scheduler.run_pending():
+            f.result()
+        time.sleep(0.01)
+    # Two re-checks after the failed poll, then back to the normal schedule
+    assert down.calls == 3 and scheduler.errors['down'] == 3
+    assert up.calls == 1 and scheduler.errors['up'] == 0
+    assert scheduler._rechecks == {'down': 0, 'up': 0}
+    scheduler.stop()
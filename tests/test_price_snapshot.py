@@ -0,0 +1,80 @@
+"""
+Immutable price snapshot checks: representations agree, snapshots can't
+be mutated, and concurrent readers never see a half-applied update
+"""
+
+import json
+import threading
+
+import pytest
+
+import esp32_binary
+from price_snapshot import INITIAL_STATE, PriceSnapshot
+
+STATE = {
+    'price_cents_per_kwh': 4.567,
+    'timestamp': '2024-01-01T12:00:00',
+    'millisUTC': 1704110400000,
+    'status': 'active',
+    'tier': 'low',
+    'recommendation': {'action': 'normal_plus', 'suggested_temp_offset': -1}
+}
+
+
+def test_representations_agree():
+    snapshot = PriceSnapshot(STATE)
+    assert json.loads(snapshot.json) == STATE
+    assert json.loads(snapshot.esp32_json) == dict(snapshot.esp32) == {
+        'p': 4.57, 't': 'low', 'a': 'normal_plus', 'o': -1, 'ts': 1704110400000, 's': 'active'}
+    assert esp32_binary.decode(snapshot.esp32_bin) == dict(snapshot.esp32)
+    assert PriceSnapshot(STATE).etag == snapshot.etag
+    assert snapshot.replace(price_cents_per_kwh=9.0).etag != snapshot.etag
+
+
+def test_initial_state_payload():
+    assert PriceSnapshot(INITIAL_STATE).esp32['a'] == 'normal'
+
+
+def test_snapshot_is_immutable():
+    source = dict(STATE)
+    snapshot = PriceSnapshot(source)
+    source['tier'] = 'critical'
+    assert snapshot.data['tier'] == 'low'
+    with pytest.raises(TypeError):
+        snapshot.data['tier'] = 'high'
+    with pytest.raises(AttributeError):
+        snapshot.json = b'{}'
+    assert snapshot.replace(status='error').data['status'] == 'error'
+    assert snapshot.data['status'] == 'active'
+
+
+def test_readers_never_see_torn_state():
+    holder = [PriceSnapshot(STATE)]
+    stop = threading.Event()
+    errors = []
+
+    def writer():
+        i = 0
+        while not stop.is_set():
+            i += 1
+            holder[0] = holder[0].replace(price_cents_per_kwh=float(i), millisUTC=i * 300000)
+
+    def reader():
+        for _ in range(20000):
+            snapshot = holder[0]
+            full = json.loads(snapshot.json)
+            if full['millisUTC'] != full['price_cents_per_kwh'] * 300000 and full['millisUTC'] != STATE['millisUTC']:
+                errors.append(full)
+            if esp32_binary.decode(snapshot.esp32_bin)['ts'] // 1000 != snapshot.esp32['ts'] // 1000:
+                errors.append(dict(snapshot.esp32))
+
+    threads = [threading.Thread(target=reader) for _ in range(4)]
+    write = threading.Thread(target=writer)
+    write.start()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    stop.set()
+    write.join()
+    assert errors == []
@@ -0,0 +1,343 @@
+"""
+Flask test-client checks for the pricing API endpoints (no live server)
+"""
+
+import gzip
+import json
+import os
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import comed_pricing_api as api
+import esp32_binary
+from leader_lock import LeaderLock
+from price_stream import PriceBroadcaster, StreamSlots
+from stub_providers import StubProvider
+from tier_policy import PolicyStore
+
+
+@pytest.fixture
+def client():
+    api.response_cache.invalidate()
+    with api.price_lock:
+        api.publish_snapshot(api.current_snapshot().replace(
+            price_cents_per_kwh=4.5,
+            timestamp='2024-01-01T12:00:00',
+            millisUTC=1704110400000,
+            status='active',
+            tier='low',
+            recommendation=api.get_recommendation('low', None)
+        ))
+    return api.app.test_client()
+
+
+def test_esp32_payload(client):
+    data = client.get('/api/price/esp32').get_json()
+    assert data == {'p': 4.5, 't': 'low', 'a': 'normal_plus', 'o': -1,
+                    'ts': 1704110400000, 's': 'active'}
+
+
+def test_etag_revalidation_returns_304(client):
+    first = client.get('/api/price/esp32')
+    assert first.status_code == 200
+    etag = first.headers['ETag']
+    assert 'max-age' in first.headers['Cache-Control']
+
+    again = client.get('/api/price/esp32', headers={'If-None-Match': etag})
+    assert again.status_code == 304
+    assert again.data == b''
+
+
+def test_snapshot_swap_changes_current_price(client):
+    etag = client.get('/api/price/current').headers['ETag']
+    with api.price_lock:
+        api.publish_snapshot(api.current_snapshot().replace(status='active'))
+    # Same state, same body: still revalidates
+    assert client.get('/api/price/current', headers={'If-None-Match': etag}).status_code == 304
+
+    with api.price_lock:
+        api.publish_snapshot(api.current_snapshot().replace(price_cents_per_kwh=9.9))
+    api.response_cache.invalidate(next_update_in=api.UPDATE_INTERVAL)
+    fresh = client.get('/api/price/current', headers={'If-None-Match': etag})
+    assert fresh.status_code == 200
+    assert fresh.get_json()['price_cents_per_kwh'] == 9.9
+    assert 0 < fresh.cache_control.max_age <= api.UPDATE_INTERVAL
+
+
+def test_cache_keyed_on_query_args(client):
+    assert client.get('/api/price/stats?hours=1').get_json()['period_hours'] == 1
+    assert client.get('/api/price/stats?hours=6').get_json()['period_hours'] == 6
+
+
+def test_long_poll_returns_newer_price(client):
+    api.price_stream.publish(1704110400000, {'p': 4.5, 'ts': 1704110400000})
+    res = client.get('/api/price/stream?since=1704110100000')
+    assert res.status_code == 200
+    assert res.get_json()['ts'] == 1704110400000
+
+
+def test_long_poll_times_out_with_204(client):
+    api.price_stream.publish(1704110400000, {'p': 4.5, 'ts': 1704110400000})
+    assert client.get('/api/price/stream?since=1704110400000&timeout=0').status_code == 204
+
+
+def test_long_poll_wakes_on_publish():
+    broadcaster = PriceBroadcaster()
+    result = []
+    waiter = threading.Thread(target=lambda: result.append(broadcaster.wait_newer_than(0, 5)))
+    waiter.start()
+    time.sleep(0.05)
+    broadcaster.publish(1000, {'p': 1.0})
+    waiter.join(1)
+    assert result == ['{"p":1.0}']
+
+
+def test_sse_stream_sends_current_then_updates():
+    broadcaster = PriceBroadcaster()
+    broadcaster.publish(1000, {'p': 1.0})
+    events = broadcaster.sse_events(heartbeat=0.01)
+    assert next(events) == 'id: 1000\nevent: price\ndata: {"p":1.0}\n\n'
+    assert next(events) == ': keepalive\n\n'
+    broadcaster.publish(2000, {'p': 2.0})
+    assert next(events).startswith('id: 2000\n')
+    assert broadcaster.subscribers == 1
+    events.close()
+    assert broadcaster.subscribers == 0
+
+
+def test_streams_capped_per_worker(client, monkeypatch):
+    monkeypatch.setattr(api, 'stream_slots', StreamSlots(1))
+    sse = client.get('/api/price/stream')
+    assert sse.status_code == 200
+    refused = client.get('/api/price/stream?since=0&timeout=0')
+    assert refused.status_code == 503 and refused.headers['Retry-After'] == '30'
+    sse.close()
+    assert api.stream_slots.active == 0
+    assert client.get('/api/price/stream?since=1704110400000&timeout=0').status_code == 204
+    assert api.stream_slots.active == 0 and api.stream_slots.rejected == 1
+
+
+def test_only_one_fetcher_elected(tmp_path):
+    path = str(tmp_path / 'fetcher.lock')
+    first, second = LeaderLock(path), LeaderLock(path)
+    assert first.try_acquire()
+    assert not second.try_acquire()
+    first.release()
+    assert second.try_acquire()
+    second.release()
+
+
+def test_follower_adopts_shared_state(client):
+    state = dict(api.current_snapshot().data, price_cents_per_kwh=13.0, tier='very_high',
+                 millisUTC=1704111000000)
+    api.db.save_price_state(json.dumps(state))
+    assert api.sync_shared_state()
+    assert not api.sync_shared_state()
+    assert client.get('/api/price/esp32').get_json()['p'] == 13.0
+    assert api.price_stream.millis == 1704111000000
+
+
+def test_telemetry_history_endpoint(client):
+    now = api.now_millis()
+    api.telemetry_store.write_batch([('lab', (now - 60000, 215, 40, 100, 500, 120, 1, 1, 300))])
+    response = client.get('/api/telemetry/lab/history?hours=1&points=60')
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['resolution_seconds'] == 60
+    assert body['count'] == 1 and body['points'][0]['temp_avg_c'] == 21.5
+    assert client.get(f'/api/telemetry/lab/history?start={now}&end={now}').status_code == 400
+
+
+def test_history_downsampled_columnar_gzip(client):
+    now = api.now_millis()
+    start = now - 168 * 3600 * 1000
+    rows = [(f'week-{i}', 4.0 + (i % 12) / 10, 'low', start + i * 300000) for i in range(1, 2016)]
+    api.db.insert_prices(rows)
+
+    full = client.get('/api/price/history?hours=168')
+    compact = client.get('/api/price/history?hours=168&points=300&format=columnar',
+                         headers={'Accept-Encoding': 'gzip'})
+    assert compact.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in compact.headers['Vary']
+    assert len(compact.data) * 10 < len(full.data)
+
+    body = json.loads(gzip.decompress(compact.data))
+    assert body['count'] == len(body['price']) == len(body['dt']) == 300
+    assert all(delta > 0 for delta in body['dt'][1:])
+    assert body['t0'] <= start + 300000
+
+    again = client.get('/api/price/history?hours=168&points=300&format=columnar',
+                       headers={'Accept-Encoding': 'gzip', 'If-None-Match': compact.headers['ETag']})
+    assert again.status_code == 304
+
+
+def test_history_order_same_with_and_without_points(client):
+    now = api.now_millis()
+    api.db.insert_prices([(f'order-{i}', 4.0 + i % 7, 'low', now - i * 300000) for i in range(1, 200)])
+    full = client.get('/api/price/history?hours=12').get_json()['data']
+    sampled = client.get('/api/price/history?hours=12&points=50').get_json()['data']
+    assert len(sampled) == 50
+    assert [row['millisUTC'] for row in sampled] == sorted((row['millisUTC'] for row in sampled), reverse=True)
+    assert sampled[0] == full[0] and sampled[-1] == full[-1]
+
+
+def test_esp32_binary_matches_json(client):
+    response = client.get('/api/price/esp32.bin')
+    assert response.mimetype == 'application/octet-stream'
+    assert len(response.data) == esp32_binary.SIZE
+    assert esp32_binary.decode(response.data) == client.get('/api/price/esp32').get_json()
+    assert client.get('/api/price/esp32.bin',
+                      headers={'If-None-Match': response.headers['ETag']}).status_code == 304
+
+
+def test_forecast_endpoint(client):
+    now = api.now_millis() // 300000 * 300000
+    rows = [(f'forecast-{i}', 5.0 + (i % 288) / 100, 'normal', now - i * 300000) for i in range(1, 4 * 288)]
+    api.db.insert_prices(rows)
+    data = client.get('/api/price/forecast?hours=6').get_json()
+    assert data['horizon_hours'] == 6
+    assert len(data['point']) == len(data['p10']) == len(data['p90']) == 72
+    assert all(lo <= p <= hi for lo, p, hi in zip(data['p10'], data['point'], data['p90']))
+    assert 4 < data['next_hour_estimate'] < 9
+
+
+def test_schedule_endpoint(client):
+    now = api.now_millis() // 300000 * 300000
+    api.db.insert_prices([(f'schedule-{i}', 4.0 + (i % 12), 'normal', now - i * 300000) for i in range(1, 2 * 288)])
+    body = {'horizon_hours': 6, 'devices': [
+        {'id': 'fan', 'watts': 100, 'runtime_minutes': 30},
+        {'id': 'ac', 'watts': 1500, 'temp': 24, 'comfort_min': 22, 'comfort_max': 26,
+         'cooling_per_hour': 3, 'warming_per_hour': 1}
+    ]}
+    first = client.post('/api/schedule', json=body)
+    assert first.status_code == 200
+    data = first.get_json()
+    assert data['slots'] == 72 and len(data['devices']) == 2
+    assert sum(end - start for start, end in data['devices'][0]['on']) == 30 * 60 * 1000
+    # Same body is served from the cache until the next price update
+    again = client.post('/api/schedule', json=body, headers={'If-None-Match': first.headers['ETag']})
+    assert again.status_code == 304
+    assert client.post('/api/schedule', json={'devices': [{'id': 'x'}]}).status_code == 400
+    wide = {'id': 'ac', 'watts': 1500, 'comfort_min': 0, 'comfort_max': 100, 'cooling_per_hour': 3}
+    oversized = client.post('/api/schedule', json={'devices': [dict(wide, id=f'ac{i}') for i in range(50)]})
+    assert oversized.status_code == 400 and 'comfort band' in oversized.get_json()['error']
+
+
+def test_control_batch_endpoint(client):
+    rooms = [{'room': f'r{i}', 'tC': 24 + i % 4, 'pir': i % 2, 'dist': 80} for i in range(400)]
+    data = client.post('/api/control/batch', json={'rooms': rooms}).get_json()
+    assert data['tier'] == 'low' and data['count'] == 400
+    assert [d['fan'] for d in data['rooms'][:4]] == [False, True, False, True]
+    assert client.post('/api/control/batch', json={'rooms': [{'tC': 'hot'}]}).status_code == 400
+
+
+def test_group_policy_applies_to_price_endpoints(client, monkeypatch, tmp_path):
+    path = tmp_path / 'policy.json'
+    with open(os.path.join(os.path.dirname(api.__file__), 'tier_policy.json')) as f:
+        config = json.load(f)
+    config['groups'] = {'dorm': {'thresholds': {'low': 4.0}}}
+    path.write_text(json.dumps(config))
+    store = PolicyStore(str(path), check_interval=0, on_reload=api.reclassify_markets)
+    monkeypatch.setattr(api, 'tier_policies', store)
+    published = []
+    monkeypatch.setattr(api, 'price_publisher', SimpleNamespace(
+        topic='pricing/current', publish=lambda payload, topic: published.append((topic, payload['t']))))
+    monkeypatch.setattr(api, 'fetcher_lock', SimpleNamespace(held=True))
+
+    assert client.get('/api/price/esp32').get_json()['t'] == 'low'
+    assert client.get('/api/price/esp32?group=dorm').get_json()['t'] == 'normal'
+    assert esp32_binary.decode(client.get('/api/price/esp32.bin?group=dorm').data)['t'] == 'normal'
+    current = client.get('/api/price/current?group=dorm').get_json()
+    assert current['tier'] == 'normal' and current['recommendation']['action'] == 'normal'
+
+    rooms = [{'room': 'a', 'tC': 27, 'pir': 1}, {'room': 'b', 'tC': 27, 'pir': 1, 'group': 'lab'}]
+    data = client.post('/api/control/batch?group=dorm', json={'rooms': rooms}).get_json()
+    assert data['tier'] == 'normal' and data['group'] == 'dorm'
+    assert [(d['room'], d['tier']) for d in data['rooms']] == [('a', 'normal'), ('b', 'low')]
+
+    api.publish_mqtt(api.markets[api.DEFAULT_MARKET], api.current_snapshot())
+    assert published == [('pricing/current', 'low'), ('pricing/current/groups/dorm', 'normal')]
+
+    # Editing the file reclassifies and republishes the current price
+    published.clear()
+    config['tiers'][1]['below'] = 4.2
+    path.write_text(json.dumps(config))
+    os.utime(path, ns=(time.time_ns(), time.time_ns() + 10 ** 9))
+    assert store.check()
+    assert client.get('/api/price/esp32').get_json()['t'] == 'normal'
+    assert published == [('pricing/current', 'normal'), ('pricing/current/groups/dorm', 'normal')]
+    assert api.db.load_price_state()[1]['tier'] == 'normal'
+
+
+def test_tier_endpoints(client):
+    data = client.post('/api/tiers/classify', json={'prices': [2.0, 4.0, 9.5, 20.0]}).get_json()
+    assert data == {'count': 4, 'tiers': ['very_low', 'low', 'high', 'critical']}
+    assert client.post('/api/tiers/classify', json={'prices': ['x']}).status_code == 400
+    assert client.post('/api/tiers/classify', json={'prices': 3}).status_code == 400
+
+    policy = client.get('/api/tiers/policy').get_json()
+    assert policy['group'] is None
+    assert [t['name'] for t in policy['tiers']][-1] == 'critical'
+    assert policy['tiers'][0]['below'] == 3.0
+
+
+def test_metrics_endpoint(client):
+    client.get('/api/price/current')
+    client.get('/api/price/current')
+    response = client.get('/metrics')
+    assert response.content_type.startswith('text/plain')
+    text = response.get_data(as_text=True)
+    assert 'route="/api/price/current",status="200",le="+Inf"}' in text
+    assert '# TYPE comed_api_db_seconds histogram' in text
+    assert 'comed_api_response_cache_hit_ratio' in text
+    assert client.get('/metrics/profiles').get_json()['enabled'] is False
+
+
+def test_price_aggregates_endpoint(client):
+    now = api.now_millis() // 3600000 * 3600000
+    api.db.insert_prices([(f'agg-{i}', 2.0 + i % 2, 'very_low', now - 7200000 + i * 300000) for i in range(12)])
+    data = client.get('/api/price/aggregates?resolution=hour&days=1').get_json()
+    hour = [r for r in data['data'] if r['millisUTC'] == now - 7200000][0]
+    assert hour['samples'] >= 12 and hour['min_price'] <= 2.0 and hour['max_price'] >= 3.0
+    assert client.get('/api/price/aggregates?resolution=week').status_code == 400
+
+
+def test_price_analytics_endpoint(client):
+    now = api.now_millis() // 300000 * 300000
+    api.db.insert_prices([(f'analytics-{i}', 2.0 + (i % 288) / 50, 'low', now - i * 300000) for i in range(1, 3 * 288)])
+    data = client.get('/api/price/analytics?days=3&tz=UTC').get_json()
+    assert data['samples'] >= 3 * 288 - 1 and data['tz'] == 'UTC'
+    assert len(data['heatmap']['mean']) == 7 and len(data['heatmap']['mean'][0]) == 24
+    assert set(data['tier_durations']['tiers']) >= {'very_low', 'low', 'critical'}
+    assert client.get('/api/price/analytics?tz=Mars/Olympus').status_code == 400
+    assert client.get('/api/price/analytics?start=2024-06-02&end=2024-06-01').status_code == 400
+    assert client.get('/api/price/analytics?start=1999-01-01&end=1999-01-31').status_code == 404
+
+
+def test_market_query_arg(client):
+    now = api.now_millis() // 300000 * 300000
+    market = api.add_market(StubProvider('west', prices=[(now - 300000, 2.0), (now, 16.5)]))
+    try:
+        assert api.fetch_market_price('west')
+        west = client.get('/api/price/esp32?market=west').get_json()
+        assert west['p'] == 16.5 and west['t'] == 'critical' and west['ts'] == now
+        # The default market is untouched
+        assert client.get('/api/price/esp32').get_json()['p'] == 4.5
+        assert client.get('/api/price/current?market=west').get_json()['price_cents_per_kwh'] == 16.5
+        assert client.get('/api/price/history?market=west&hours=1').get_json()['count'] == 1
+        assert client.get('/api/price/stats?market=west&hours=1').get_json()['current_price'] == 16.5
+        assert client.post('/api/control/batch?market=west', json={'rooms': []}).get_json()['tier'] == 'critical'
+        assert market.db.db_path.endswith('-west.db')
+
+        listed = client.get('/api/markets').get_json()
+        assert listed['default'] == 'comed'
+        assert [m['market'] for m in listed['markets']] == ['comed', 'west']
+        assert client.get('/api/health').get_json()['markets']['west'] == 'active'
+
+        response = client.get('/api/price/current?market=mars')
+        assert response.status_code == 404 and 'west' in response.get_json()['markets']
+    finally:
+        api.markets.pop('west').db.close()
@@ -0,0 +1,62 @@
+"""
+Replay simulator: price grid, tier mapping and savings accounting
+"""
+
+import numpy as np
+
+import comed_pricing_api as api
+from replay import DAY_SLOTS, SLOT_MS, price_grid, replay, synthetic_prices, tier_indices
+from batch_control import TIERS
+
+START = 1717200000000  # 2024-06-01 00:00 UTC
+
+
+def test_price_grid_carries_prices_across_gaps():
+    millis = np.array([START + SLOT_MS, START + 4 * SLOT_MS])
+    grid, prices = price_grid(millis, np.array([3.0, 9.0]), START, 1)
+    assert len(grid) == DAY_SLOTS
+    assert prices[:6].tolist() == [3.0, 3.0, 3.0, 3.0, 9.0, 9.0]
+
+
+def test_tiers_match_determine_price_tier():
+    prices = np.array([-1.0, 2.9, 4.0, 7.5, 11.0, 14.0, 30.0, 4.0])
+    expected = [TIERS.index(api.determine_price_tier(p)) for p in prices]
+    assert tier_indices(prices, api.determine_price_tier).tolist() == expected
+
+
+def test_replay_saves_against_occupancy_baseline():
+    millis, prices = synthetic_prices(14, START)
+    grid, grid_prices = price_grid(millis, prices, START, 14)
+    result = replay(grid, grid_prices, api.determine_price_tier, api.get_recommendation, rooms=150, workers=1)
+
+    assert result['days'] == 14 and result['room_steps'] == 150 * 14 * DAY_SLOTS
+    assert result['eco']['energy_kwh'] <= result['baseline']['energy_kwh']
+    assert result['savings_usd'] > 0
+    assert abs(sum(result['tier_hours'].values()) - 14 * 24) < 1
+    assert [m['month'] for m in result['monthly']] == ['2024-06']
+    assert set(result['action_hours']) <= {'maximize', 'normal_plus', 'normal', 'reduce', 'minimize', 'critical'}
+
+    # Rooms are generated per block, so sharding doesn't change the answer
+    sharded = replay(grid, grid_prices, api.determine_price_tier, api.get_recommendation, rooms=150, workers=2)
+    assert sharded['eco'] == result['eco'] and sharded['baseline'] == result['baseline']
+
+
+def test_recorded_telemetry_replays_rooms(tmp_path):
+    from replay import recorded_telemetry
+    from telemetry_ingest import TelemetryStore
+    store = TelemetryStore(str(tmp_path / 't.db'))
+    # Occupied and warm for the first hour of the day, then empty
+    store.write_batch([('a101', (START + i * 60000, 270, 40, 5 if i < 60 else 80, 500, 120, 1 if i < 60 else 0, 2, 500))
+                       for i in range(24 * 60)])
+    rooms, temp, occupied, power = recorded_telemetry(store, START, START + 86400000)
+    store.close()
+    assert rooms == ['a101']
+    assert occupied[:12, 0].all() and not occupied[12:, 0].any()
+    assert np.allclose(temp[:, 0], 27.0) and np.allclose(power[:, 0], 60.0, rtol=0.02)
+
+    millis, prices = synthetic_prices(2, START)
+    grid, grid_prices = price_grid(millis, prices, START, 2)
+    result = replay(grid, grid_prices, api.determine_price_tier, api.get_recommendation, rooms=3,
+                    workers=1, recorded=(temp, occupied, power))
+    # 3 rooms x 2 days x 1 occupied hour x 100 W
+    assert result['baseline']['energy_kwh'] == 0.6
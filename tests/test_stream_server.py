@@ -0,0 +1,122 @@
+"""
+Evented price stream server: SSE and long-poll over raw sockets, and
+thousands of idle subscribers alongside a single-threaded API server
+"""
+
+import asyncio
+import http.client
+import threading
+import time
+
+import pytest
+from werkzeug.serving import make_server
+
+import comed_pricing_api as api
+from price_stream import PriceBroadcaster
+from stream_server import StreamServer
+
+
+@pytest.fixture
+def server():
+    broadcaster = PriceBroadcaster()
+    broadcaster.publish(1000, {'p': 1.0})
+    stream = StreamServer({'comed': broadcaster}, 'comed', host='127.0.0.1', heartbeat=0.05)
+    stream.start()
+    yield stream, broadcaster
+    stream.stop()
+
+
+async def open_stream(port, path='/api/price/stream', headers=''):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(f'GET {path} HTTP/1.1\r\nHost: localhost\r\n{headers}\r\n'.encode())
+    await writer.drain()
+    head = await reader.readuntil(b'\r\n\r\n')
+    return reader, writer, head.decode()
+
+
+async def next_event(reader):
+    while True:
+        frame = (await reader.readuntil(b'\n\n')).decode()
+        if not frame.startswith(':'):
+            return frame
+
+
+def test_sse_frames_and_long_poll(server):
+    stream, broadcaster = server
+
+    async def scenario():
+        reader, writer, head = await open_stream(stream.port)
+        assert head.startswith('HTTP/1.1 200') and 'text/event-stream' in head
+        assert await next_event(reader) == 'id: 1000\nevent: price\ndata: {"p":1.0}\n\n'
+        assert (await reader.readuntil(b'\n\n')) == b': keepalive\n\n'
+        broadcaster.publish(2000, {'p': 2.0})
+        assert (await next_event(reader)).startswith('id: 2000\n')
+
+        # Reconnecting with the last id skips the price the client already has
+        again, again_writer, _ = await open_stream(stream.port, headers='Last-Event-ID: 2000\r\n')
+        broadcaster.publish(3000, {'p': 3.0})
+        assert (await next_event(again)).startswith('id: 3000\n')
+        for w in (writer, again_writer):
+            w.close()
+
+        reader, writer, head = await open_stream(stream.port, '/api/price/stream?since=2000&timeout=1')
+        assert head.startswith('HTTP/1.1 200') and await reader.read() == b'{"p":3.0}'
+        reader, writer, head = await open_stream(stream.port, '/api/price/stream?since=3000&timeout=0')
+        assert head.startswith('HTTP/1.1 204')
+        reader, writer, head = await open_stream(stream.port, '/api/price/stream?market=nope')
+        assert head.startswith('HTTP/1.1 404')
+
+    asyncio.run(scenario())
+    deadline = time.time() + 2
+    while stream.active and time.time() < deadline:
+        time.sleep(0.01)
+    assert stream.active == 0
+
+
+def test_thousands_of_subscribers_leave_api_threads_free():
+    subscribers = 2000
+    stream = api.start_stream_server(0, host='127.0.0.1')
+    # One request thread: any stream holding it would block the API
+    web = make_server('127.0.0.1', 0, api.app, threaded=False)
+    threading.Thread(target=web.serve_forever, daemon=True).start()
+    try:
+        conn = http.client.HTTPConnection('127.0.0.1', web.server_port, timeout=5)
+        conn.request('GET', '/api/price/stream?market=comed')
+        response = conn.getresponse()
+        response.read()
+        assert response.status == 307
+        assert response.headers['Location'].endswith(f':{stream.port}/api/price/stream?market=comed')
+
+        async def scenario():
+            streams = await asyncio.gather(*(open_stream(stream.port) for _ in range(subscribers)))
+            assert stream.active == subscribers
+
+            def api_requests():
+                latencies = []
+                for _ in range(20):
+                    start = time.perf_counter()
+                    conn.request('GET', '/api/price/esp32')
+                    response = conn.getresponse()
+                    response.read()
+                    assert response.status == 200
+                    latencies.append(time.perf_counter() - start)
+                return max(latencies)
+
+            assert await asyncio.to_thread(api_requests) < 1.0
+            millis = api.now_millis()
+            api.price_stream.publish(millis, {'p': 6.1, 'ts': millis})
+
+            async def receive(reader):
+                # Skips the price already current when the stream opened
+                while f'id: {millis}\n' not in await next_event(reader):
+                    pass
+
+            await asyncio.wait_for(asyncio.gather(*(receive(reader) for reader, _, _ in streams)), 30)
+            for _, writer, _ in streams:
+                writer.close()
+
+        asyncio.run(scenario())
+    finally:
+        web.shutdown()
+        stream.stop()
+        api.stream_server = None
@@ -8,6 +8,8 @@ import json
 import time
 from datetime import datetime
 
+from bench_load import run_load
+
 # Configuration
 API_BASE_URL = "http://localhost:5000"
 
@@ -218,50 +220,26 @@ def simulate_control_logic():
         print("\nSimulating control decisions:")
         print("-" * 60)
         
-        for scenario in scenarios:
+        # One batch request decides every scenario with the server's rules
+        rooms = [
+            {'room': s['name'], 'tC': s['temp'], 'motion': s['motion'], 'power': s['power']}
+            for s in scenarios
+        ]
+        response = requests.post(f"{API_BASE_URL}/api/control/batch", json={'rooms': rooms}, timeout=5)
+        if response.status_code != 200:
+            print_error("Failed to fetch control decisions")
+            return False
+        
+        for scenario, decision in zip(scenarios, response.json()['rooms']):
             print(f"\n{Colors.BOLD}Scenario: {scenario['name']}{Colors.ENDC}")
             print(f"  Temperature: {scenario['temp']}°C")
             print(f"  Motion: {scenario['motion']}")
             print(f"  Power: {scenario['power']}W")
             print(f"  Price tier: {tier}")
             
-            # Determine fan state based on logic
-            fan_on = False
-            reason = ""
-            
-            if tier in ['very_low', 'low']:
-                if scenario['motion'] and scenario['temp'] > 24.0:
-                    fan_on = True
-                    reason = "Low prices, room occupied and warm"
-                else:
-                    reason = "Low prices but conditions don't warrant fan"
-            
-            elif tier == 'normal':
-                if scenario['motion'] and scenario['temp'] > 25.0:
-                    fan_on = True
-                    reason = "Normal prices, room warm and occupied"
-                else:
-                    reason = "Normal prices, conserving energy"
-            
-            elif tier == 'high':
-                if scenario['motion'] and scenario['temp'] > 26.0:
-                    fan_on = True
-                    reason = "High prices but room very warm"
-                else:
-                    reason = "High prices, minimizing loads"
-            
-            elif tier in ['very_high', 'critical']:
-                fan_on = False
-                reason = "Critical pricing, all non-essentials OFF"
-            
-            # Additional check for high power + high prices
-            if scenario['power'] > 500 and tier in ['high', 'very_high', 'critical']:
-                fan_on = False
-                reason += " (High power + high prices)"
-            
-            status = f"{Colors.OKGREEN}ON{Colors.ENDC}" if fan_on else f"{Colors.WARNING}OFF{Colors.ENDC}"
+            status = f"{Colors.OKGREEN}ON{Colors.ENDC}" if decision['fan'] else f"{Colors.WARNING}OFF{Colors.ENDC}"
             print(f"  → Fan: {status}")
-            print(f"  → Reason: {reason}")
+            print(f"  → Reason: {decision['reason']}")
         
         return True
         
@@ -339,40 +317,32 @@ def calculate_savings():
         return False
 
 def test_api_performance():
-    """Test 8: API performance"""
+    """Test 8: API performance under concurrent load"""
     print_header("Test 8: API Performance")
     
     try:
-        # Test response times
-        endpoints = [
-            '/api/price/current',
-            '/api/price/esp32',
-            '/api/price/stats',
-            '/api/health'
-        ]
-        
-        print("Testing response times (10 requests each):")
+        requests.get(f"{API_BASE_URL}/api/health", timeout=5)
+    except requests.exceptions.RequestException as e:
+        print_error(f"Cannot connect to API: {e}")
+        return False
+    
+    try:
+        # Short mixed run of ESP32 pollers and dashboards; use
+        # tests/bench_load.py directly for longer, recorded runs
+        print("Simulating 50 ESP32 pollers + 5 dashboards for 5 seconds:")
         print("-" * 60)
         
-        for endpoint in endpoints:
-            times = []
-            for _ in range(10):
-                start = time.time()
-                response = requests.get(f"{API_BASE_URL}{endpoint}", timeout=5)
-                elapsed = (time.time() - start) * 1000  # Convert to ms
-                times.append(elapsed)
-            
-            avg_time = sum(times) / len(times)
-            min_time = min(times)
-            max_time = max(times)
-            
-            status = "✓" if avg_time < 100 else "⚠"
+        results = run_load(API_BASE_URL, esp32=50, dashboards=5, duration=5)
+        
+        for endpoint, r in results.items():
+            status = "✓" if r['p95_ms'] < 100 and r['errors'] == 0 else "⚠"
             print(f"{status} {endpoint}")
-            print(f"    Avg: {avg_time:.1f}ms | Min: {min_time:.1f}ms | Max: {max_time:.1f}ms")
+            print(f"    {r['throughput_rps']:.0f} req/s | p50: {r['p50_ms']:.1f}ms | "
+                  f"p95: {r['p95_ms']:.1f}ms | p99: {r['p99_ms']:.1f}ms | errors: {r['errors']}")
             
-            if avg_time < 50:
+            if r['p95_ms'] < 50:
                 print(f"    {Colors.OKGREEN}Excellent performance{Colors.ENDC}")
-            elif avg_time < 100:
+            elif r['p95_ms'] < 100:
                 print(f"    {Colors.OKGREEN}Good performance{Colors.ENDC}")
             else:
                 print(f"    {Colors.WARNING}Consider optimization{Colors.ENDC}")
@@ -0,0 +1,145 @@
+"""
+Telemetry ingestion and storage tests (no broker needed)
+"""
+
+import json
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+import pytest
+
+from telemetry_ingest import TelemetryIngestor, TelemetryStore, partition_name
+
+DAY_MS = 24 * 3600 * 1000
+JUNE_1 = int(datetime(2024, 6, 1, tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def telemetry(**overrides):
+    data = {'ts': 12345, 'tC': 24.6, 'rh': 41, 'dist': 80, 'pir': 1, 'voltage': 120,
+            'amps': 0.92, 'fan': True, 'lamp': False, 'ecoMode': 1, 'priceTier': 2, 'price': 5.25}
+    data.update(overrides)
+    return json.dumps(data).encode()
+
+
+def test_round_trip_through_compact_rows(tmp_path):
+    store = TelemetryStore(str(tmp_path / 't.db'))
+    ingestor = TelemetryIngestor(store)
+    assert ingestor.handle_message('sensors/room1/telemetry', telemetry(), millis=JUNE_1)
+    assert not ingestor.handle_message('sensors/room1/other', telemetry())
+    assert not ingestor.handle_message('sensors/room1/telemetry', b'not json')
+    assert ingestor.flush() == 1
+
+    [sample] = store.get_samples('room1', JUNE_1, JUNE_1 + 1)
+    assert sample == {'millisUTC': JUNE_1, 'tC': 24.6, 'rh': 41, 'dist': 80, 'amps': 0.92,
+                      'voltage': 120, 'pir': 1, 'fan': True, 'lamp': False, 'ecoMode': 1,
+                      'priceTier': 2, 'price': 5.25}
+    assert ingestor.metrics()['rejected'] == 2
+    store.close()
+
+
+def test_samples_partitioned_by_utc_day(tmp_path):
+    store = TelemetryStore(str(tmp_path / 't.db'))
+    ingestor = TelemetryIngestor(store)
+    for i in range(3):
+        ingestor.handle_message('sensors/room2/telemetry', telemetry(tC=20 + i), millis=JUNE_1 + i * DAY_MS - 1000)
+    ingestor.flush()
+
+    assert store.partitions() == [partition_name(JUNE_1 - 1000), 'telemetry_20240601', 'telemetry_20240602']
+    assert [s['tC'] for s in store.get_samples('room2', JUNE_1, JUNE_1 + 2 * DAY_MS)] == [21.0, 22.0]
+    assert store.get_samples('room9', JUNE_1, JUNE_1 + DAY_MS) == []
+    store.close()
+
+
+def test_failed_batch_does_not_poison_caches(tmp_path):
+    store = TelemetryStore(str(tmp_path / 't.db'))
+    # flags is NOT NULL, so this batch rolls back after registering room a
+    # and creating the day's partition
+    with pytest.raises(sqlite3.IntegrityError):
+        store.write_batch([('a', (JUNE_1, 246, 41, 80, 920, 120, None, 2, 525))])
+
+    store.write_batch([('b', (JUNE_1 + 1000, 246, 41, 80, 920, 120, 1, 2, 525))])
+    store.write_batch([('a', (JUNE_1 + 2000, 250, 41, 80, 920, 120, 1, 2, 525))])
+    assert store.rooms() == ['a', 'b']
+    assert [s['millisUTC'] for s in store.get_samples('a', JUNE_1, JUNE_1 + DAY_MS)] == [JUNE_1 + 2000]
+    assert [s['millisUTC'] for s in store.get_samples('b', JUNE_1, JUNE_1 + DAY_MS)] == [JUNE_1 + 1000]
+    store.close()
+
+
+def test_hundreds_of_rooms_without_loss(tmp_path):
+    store = TelemetryStore(str(tmp_path / 't.db'))
+    ingestor = TelemetryIngestor(store, batch_size=500, flush_interval=0.05)
+    ingestor.start()
+
+    def room_publisher(offset):
+        for room in range(offset, 500, 4):
+            for step in range(10):
+                ingestor.handle_message(f'sensors/room{room}/telemetry', telemetry(),
+                                        millis=JUNE_1 + step * 5000)
+
+    threads = [threading.Thread(target=room_publisher, args=(i,)) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    ingestor.stop()
+
+    metrics = ingestor.metrics()
+    assert metrics['received'] == metrics['written'] == 5000
+    assert metrics['queue_depth'] == 0
+    assert len(store.rooms()) == 500
+    assert len(store.get_samples('room499', JUNE_1, JUNE_1 + DAY_MS)) == 10
+    store.close()
+
+
+def test_rollups_match_raw_samples(tmp_path):
+    store = TelemetryStore(str(tmp_path / 't.db'))
+    ingestor = TelemetryIngestor(store)
+    # Two hours at 5 s, written in several batches; PIR on for the first hour
+    for step in range(2 * 720):
+        ingestor.handle_message('sensors/room3/telemetry',
+                                telemetry(tC=20 + step % 10, amps=1.0, voltage=120, pir=int(step < 720)),
+                                millis=JUNE_1 + step * 5000)
+        if step % 500 == 0:
+            ingestor.flush()
+    ingestor.flush()
+
+    now = JUNE_1 + DAY_MS
+    day = store.get_history('room3', JUNE_1, JUNE_1 + DAY_MS, max_points=24, now_millis=now)
+    assert day['resolution_seconds'] == 3600
+    first, second = day['points']
+    assert first['samples'] == second['samples'] == 720
+    assert (first['temp_min_c'], first['temp_max_c'], first['temp_avg_c']) == (20.0, 29.0, 24.5)
+    assert first['energy_kwh'] == 0.12          # 120 W for an hour
+    assert (first['occupancy'], second['occupancy']) == (1.0, 0.0)
+
+    minutes = store.get_history('room3', JUNE_1, JUNE_1 + 3600 * 1000, max_points=500, now_millis=now)
+    assert minutes['resolution_seconds'] == 60
+    assert len(minutes['points']) == 60
+    assert sum(p['samples'] for p in minutes['points']) == 720
+
+    # Rollups survive a restart and are rebuilt if they go missing
+    store.close()
+    store = TelemetryStore(str(tmp_path / 't.db'))
+    with store.pool.transaction() as conn:
+        conn.execute('DROP TABLE telemetry_rollup_3600')
+    store.close()
+    store = TelemetryStore(str(tmp_path / 't.db'))
+    assert store.get_history('room3', JUNE_1, JUNE_1 + DAY_MS, max_points=24, now_millis=now) == day
+    store.close()
+
+
+def test_history_resolution_respects_retention(tmp_path):
+    store = TelemetryStore(str(tmp_path / 't.db'))
+    ingestor = TelemetryIngestor(store)
+    ingestor.handle_message('sensors/room4/telemetry', telemetry(), millis=JUNE_1)
+    ingestor.flush()
+
+    # A month later the 1-minute buckets are gone, so an hour window comes from 15-minute ones
+    later = JUNE_1 + 30 * DAY_MS
+    store.prune_rollups(now_millis=later)
+    history = store.get_history('room4', JUNE_1, JUNE_1 + 3600 * 1000, max_points=500, now_millis=later)
+    assert history['source_resolution_seconds'] == 900
+    assert [p['samples'] for p in history['points']] == [1]
+    store.close()
+
@@ -0,0 +1,119 @@
+"""
+Tier policy compilation, bulk classification and hot reload
+"""
+
+import json
+import os
+
+import numpy as np
+import pytest
+
+from tier_policy import PolicyError, PolicyStore, TierPolicy, compile_policies
+
+DEFAULT_CONFIG = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'api', 'tier_policy.json')
+
+
+def load_default():
+    with open(DEFAULT_CONFIG) as f:
+        return json.load(f)
+
+
+def old_tier(price):
+    """The hard-coded thresholds the config replaced"""
+    for name, below in (('very_low', 3.0), ('low', 5.0), ('normal', 8.0), ('high', 12.0), ('very_high', 15.0)):
+        if price < below:
+            return name
+    return 'critical'
+
+
+def write_config(path, config, mtime):
+    path.write_text(json.dumps(config))
+    os.utime(path, ns=(mtime, mtime))
+
+
+def test_default_config_matches_old_thresholds():
+    policy = compile_policies(load_default())[None]
+    prices = [-1.0, 0.0, 2.99, 3.0, 4.99, 5.0, 7.5, 8.0, 11.99, 12.0, 14.99, 15.0, 80.0]
+    assert [policy.classify(p) for p in prices] == [old_tier(p) for p in prices]
+    assert policy.recommendation('high')['control_mode'] == 'eco'
+    assert policy.recommendation('bogus')['action'] == 'normal'
+
+
+def test_classify_many_matches_classify():
+    policy = compile_policies(load_default())[None]
+    prices = np.random.default_rng(3).uniform(-2, 20, 5000).round(1)
+    index = policy.classify_many(prices)
+    assert [policy.names[i] for i in index] == [policy.classify(p) for p in prices]
+
+
+def test_policy_is_immutable():
+    policy = compile_policies(load_default())[None]
+    with pytest.raises(AttributeError):
+        policy.bounds = (1.0,)
+    with pytest.raises(TypeError):
+        policy.recommendation('low')['action'] = 'maximize'
+
+
+def test_get_recommendation_does_not_leak():
+    import comed_pricing_api as api
+    with api.price_lock:
+        api.publish_snapshot(api.current_snapshot().replace(price_cents_per_kwh=4.0))
+    first = api.get_recommendation('low', {'sample_count': 1, 'avg_price': 3.0})
+    assert first['vs_24h_avg'] == 1.0
+    assert 'vs_24h_avg' not in api.get_recommendation('low', None)
+
+
+def test_group_overrides():
+    config = load_default()
+    config['groups'] = {'dorm': {'thresholds': {'high': 10.0}, 'recommendations': {'high': {'suggested_temp_offset': 2}}}}
+    policies = compile_policies(config)
+    assert policies[None].classify(11.0) == 'high'
+    assert policies['dorm'].classify(11.0) == 'very_high'
+    assert policies['dorm'].recommendation('high')['suggested_temp_offset'] == 2
+    assert policies['dorm'].recommendation('high')['action'] == 'reduce'
+
+
+@pytest.mark.parametrize('tiers', [
+    [],
+    [{'name': 'low', 'below': 5, 'action': 'x'}, {'name': 'very_low', 'action': 'x'}],
+    [{'name': 'low', 'below': 5, 'action': 'x'}, {'name': 'high', 'below': 4, 'action': 'x'}, {'name': 'critical', 'action': 'x'}],
+    [{'name': 'low', 'below': 5, 'action': 'x'}, {'name': 'critical', 'below': 9, 'action': 'x'}],
+    [{'name': 'cheap', 'action': 'x'}],
+    [{'name': 'low', 'below': 5}, {'name': 'critical', 'action': 'x'}],
+])
+def test_rejects_invalid_tiers(tiers):
+    with pytest.raises(PolicyError):
+        TierPolicy(tiers)
+
+
+def test_store_hot_reloads(tmp_path):
+    path = tmp_path / 'policy.json'
+    config = load_default()
+    write_config(path, config, 1_000_000_000)
+    store = PolicyStore(str(path), check_interval=0)
+    assert store.policy().classify(9.0) == 'high'
+
+    config['tiers'][2]['below'] = 10.0
+    config['groups'] = {'lab': {'thresholds': {'normal': 6.0}}}
+    write_config(path, config, 2_000_000_000)
+    assert store.policy().classify(9.0) == 'normal'
+    assert store.policy('lab').classify(7.0) == 'high'
+    assert store.policy('unknown').classify(7.0) == 'normal'
+    assert store.groups() == ['lab'] and store.reloads == 1
+
+
+def test_store_keeps_previous_policy_on_bad_edit(tmp_path):
+    path = tmp_path / 'policy.json'
+    write_config(path, load_default(), 1_000_000_000)
+    store = PolicyStore(str(path), check_interval=0)
+
+    path.write_text('{"tiers": [')
+    os.utime(path, ns=(2_000_000_000, 2_000_000_000))
+    assert store.policy().classify(9.0) == 'high'
+    os.remove(path)
+    assert store.policy().classify(9.0) == 'high'
+    assert store.reloads == 0
+
+    write_config(path, load_default(), 3_000_000_000)
+    store.policy()
+    assert store.reloads == 1